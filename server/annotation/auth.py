@@ -14,7 +14,7 @@ from fastapi import Form, HTTPException, Request, Depends
 from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, ExpiredSignatureError
-from jose.exceptions import JWEInvalidAuth, JWEError
+from jose.exceptions import JWEInvalidAuth, JWEError, JOSEError
 
 from exceptions.exception import AuthException, PermissionException
 from models import (
@@ -22,9 +22,12 @@ from models import (
 )
 from utils.casbin import CasbinEnforcer, DataScope
 from utils.config import config
-from utils.get_redis import RedisKeyConfig
+from utils.get_redis import CacheGeneration, RedisKeyConfig
 from utils.log import logger
+from utils.online_session import OnlineSessionRegistry
 from utils.response import HttpStatusConstant
+from utils.single_flight import SingleFlight
+from utils.user_cache import UserInfoCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -392,61 +395,116 @@ class AuthController:
     ):
         """
         获取当前用户
+
+        同一请求内只解析一次：中间件、依赖注入、Auth/Log 装饰器共享 request.state 上的结果，
+        解析失败的异常同样缓存，后续调用直接抛出。
         :param request:
         :param token:
         :return:
         """
+        token = cls._strip_bearer(token)
+        cached = getattr(request.state, "auth_context", None)
+        if cached is not None and cached[0] == token:
+            if isinstance(cached[1], AuthException):
+                raise cached[1]
+            return cached[1]
+
+        try:
+            user_info = await cls._resolve_current_user(request, token)
+        except AuthException as e:
+            request.state.auth_context = (token, e)
+            raise
+        request.state.auth_context = (token, user_info)
+        request.state.user_id = str(user_info.get("id"))
+        request.state.user_type = user_info.get("user_type")
+        return user_info
+
+    @staticmethod
+    def _strip_bearer(token: Optional[str]) -> str:
+        """去除 Authorization 头中的 Bearer 前缀"""
+        if not token:
+            return ""
+        if token.startswith("Bearer"):
+            parts = token.split(" ")
+            return parts[1] if len(parts) > 1 else ""
+        return token
+
+    @classmethod
+    async def _resolve_current_user(cls, request: Request, token: str) -> dict:
+        """
+        解析 token → 会话 → 用户信息
+
+        会话令牌与用户信息缓存代数通过一次 MGET 读取，代数与进程内缓存一致时直接使用本地条目；
+        否则依次读取 Redis 缓存、查询数据库重建并回写。
+        """
+        if not token:
+            logger.warning("用户token不合法")
+            raise AuthException(data="", message="用户token不合法")
         try:
-            if token.startswith("Bearer"):
-                token = token.split(" ")[1]
             payload = jwt.decode(
                 token=token,
                 key=config.jwt().secret_key,
                 algorithms=[config.jwt().algorithm],
             )
-            user_id: str = payload.get("id", "")
-            session_id: str = payload.get("session_id", "")
-            if not user_id:
-                logger.warning("用户token不合法")
-                raise AuthException(data="", message="用户token不合法")
-            if not await SystemUser.get_or_none(id=user_id):
-                logger.warning("用户不存在")
-                raise AuthException(data="", message="用户不存在")
-        except (JWEInvalidAuth, ExpiredSignatureError, JWEError):
+        except (JWEInvalidAuth, ExpiredSignatureError, JWEError, JOSEError):
             logger.warning("用户token已失效，请重新登录")
             raise AuthException(data="", message="用户token已失效，请重新登录")
-        userInfo = await request.app.state.redis.get(
-            f"{RedisKeyConfig.USER_INFO.key}:{user_id}"
-        )
-        if userInfo:
-            try:
-                userInfo = json.loads(userInfo)
-            except (json.JSONDecodeError, ValueError):
-                # 如果JSON解析失败，清除缓存并重新获取
-                await request.app.state.redis.delete(
-                    f"{RedisKeyConfig.USER_INFO.key}:{user_id}"
-                )
-                userInfo = None
-
-        if not userInfo:
-            # 重新获取用户信息（包括最新的下属部门和权限）
-            userInfo = await cls.get_user_info(user_id=user_id)
-            # 缓存用户信息，时间设置为30分钟
-            await request.app.state.redis.set(
-                f"{RedisKeyConfig.USER_INFO.key}:{user_id}",
-                json.dumps(jsonable_encoder(userInfo), ensure_ascii=False, default=str),
-                ex=timedelta(minutes=30),
-            )
-        if not userInfo:
+        user_id: str = payload.get("id", "")
+        session_id: str = payload.get("session_id", "")
+        if not user_id:
             logger.warning("用户token不合法")
             raise AuthException(data="", message="用户token不合法")
-        redis_token = await request.app.state.redis.get(
-            f"{RedisKeyConfig.ACCESS_TOKEN.key}:{session_id}"
+
+        redis = request.app.state.redis
+        request.state.session_id = session_id
+        redis_token, *generations = await redis.mget(
+            f"{RedisKeyConfig.ACCESS_TOKEN.key}:{session_id}",
+            *UserInfoCache.generation_keys(user_id),
         )
         if not redis_token:
             logger.warning("用户token已失效，请重新登录")
             raise AuthException(data="", message="用户token已失效，请重新登录")
-        return userInfo
+
+        generation = CacheGeneration.compose(*generations)
+        userInfo = UserInfoCache.get_local(user_id, generation)
+        if userInfo is not None:
+            return userInfo
+
+        user_info_key = UserInfoCache.redis_key(user_id, generation)
+
+        async def load_cached() -> Optional[dict]:
+            cached = await redis.get(user_info_key)
+            if not cached:
+                return None
+            try:
+                cached = json.loads(cached)
+            except (json.JSONDecodeError, ValueError):
+                # 如果JSON解析失败，清除缓存并重新获取
+                await redis.delete(user_info_key)
+                return None
+            UserInfoCache.redis_hits += 1
+            return cached
+
+        async def rebuild() -> dict:
+            # 重新获取用户信息（包括最新的下属部门和权限），用户不存在或已删除时返回 None
+            user_info = await cls.get_user_info(user_id=user_id)
+            if not user_info:
+                logger.warning("用户不存在")
+                raise AuthException(data="", message="用户不存在")
+            UserInfoCache.rebuilds += 1
+            serialized = json.dumps(jsonable_encoder(user_info), ensure_ascii=False, default=str)
+            # 缓存用户信息，时间设置为30分钟
+            await redis.set(user_info_key, serialized, ex=timedelta(minutes=30))
+            # 本地缓存与 Redis 命中时保持相同的数据形态（均为 JSON 反序列化结果）
+            return json.loads(serialized)
+
+        userInfo = await load_cached()
+        if not userInfo:
+            # 同一用户的并发请求只重建一次，跨进程通过 Redis 锁协调
+            userInfo = await SingleFlight.do(user_info_key, rebuild, redis=redis, fetch=load_cached)
+
+        UserInfoCache.set_local(user_id, generation, userInfo)
+        return dict(userInfo)
 
     @classmethod
     async def get_user_info(cls, user_id: str) -> dict:
@@ -530,8 +588,8 @@ class AuthController:
             f"{RedisKeyConfig.ACCESS_TOKEN.key}:{session_id}"
         )
         if redis_token == token:
-            await request.app.state.redis.delete(
-                f"{RedisKeyConfig.ACCESS_TOKEN.key}:{session_id}"
+            await OnlineSessionRegistry.revoke(
+                request.app.state.redis, session_id, payload.get("id")
             )
             return True
         return False
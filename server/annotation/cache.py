@@ -0,0 +1,128 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : cache.py
+# @Comment : 接口响应缓存装饰器 - 按数据权限范围缓存序列化后的响应，并发未命中只计算一次
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import date
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from utils.config import config
+from utils.get_redis import RedisKeyConfig
+from utils.log import logger
+from utils.single_flight import SingleFlight
+
+
+class ResponseCache:
+    """
+    响应缓存装饰器
+
+    - 缓存键由 路由 + 查询参数 + 数据范围指纹 + 当天日期 组成：
+      超级管理员/管理员共享一份，部门管理员按可访问部门集合共享，普通用户按用户ID区分；
+      per_user=True 时一律按用户ID区分（响应中包含个人数据时使用）
+    - 只缓存 200 响应，Redis 中保存响应体，命中时直接返回，不再反序列化
+    - 同一个键的并发未命中通过 SingleFlight 合并（跨进程加锁），只执行一次查询
+    - 放在 @Log 与 @Auth 之间，命中缓存时操作日志与权限校验照常执行
+
+    使用示例：
+        @dashboardAPI.get("/login-trend")
+        @Log(title="获取登录趋势数据", operation_type=OperationType.SELECT)
+        @ResponseCache(namespace="dashboard")
+        async def get_login_trend(request: Request, current_user: dict = Depends(...)):
+            ...
+    """
+
+    # 本进程的统计：请求数、Redis 命中数、实际执行数（其余为并发合并）
+    requests = 0
+    hits = 0
+    misses = 0
+
+    def __init__(self, namespace: str, ttl: Optional[int] = None, per_user: bool = False):
+        """
+        :param namespace: 缓存命名空间
+        :param ttl: 缓存有效期（秒），默认取配置 dashboard_cache_ttl，0 表示不缓存
+        :param per_user: 是否按用户区分缓存
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.per_user = per_user
+
+    def __call__(self, func):
+        @wraps(func)
+        async def wrapper(request: Request, *args, **kwargs):
+            ttl = self.ttl if self.ttl is not None else config.app().dashboard_cache_ttl
+            current_user = kwargs.get("current_user")
+            if ttl <= 0 or not isinstance(current_user, dict):
+                return await func(request, *args, **kwargs)
+
+            ResponseCache.requests += 1
+            redis = request.app.state.redis
+            cache_key = self.cache_key(request, current_user)
+            try:
+                body = await redis.get(cache_key)
+            except Exception as e:
+                logger.warning(f"读取响应缓存失败: {e}")
+                return await func(request, *args, **kwargs)
+            if body is not None:
+                ResponseCache.hits += 1
+                return self._to_response(body)
+
+            async def build():
+                ResponseCache.misses += 1
+                response = await func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                content = bytes(response.body).decode("utf-8")
+                await redis.set(cache_key, content, ex=ttl)
+                return content
+
+            result = await SingleFlight.do(cache_key, build, redis=redis, fetch=lambda: redis.get(cache_key))
+            if isinstance(result, Response):
+                return result
+            return self._to_response(result)
+
+        return wrapper
+
+    def cache_key(self, request: Request, current_user: Dict[str, Any]) -> str:
+        """生成缓存键：{前缀}:{命名空间}:{路由}:{指纹摘要}"""
+        fingerprint = {
+            "scope": self.scope_fingerprint(current_user),
+            "query": sorted(request.query_params.multi_items()),
+            "date": date.today().isoformat(),
+        }
+        digest = hashlib.sha1(
+            json.dumps(fingerprint, ensure_ascii=False, separators=(",", ":")).encode()
+        ).hexdigest()
+        return f"{RedisKeyConfig.RESPONSE_CACHE.key}:{self.namespace}:{request.url.path}:{digest}"
+
+    def scope_fingerprint(self, current_user: Dict[str, Any]) -> str:
+        """数据范围指纹：结果相同的用户得到相同的指纹"""
+        user_type = current_user.get("user_type", 3)
+        if self.per_user or user_type not in (0, 1, 2):
+            return f"user:{current_user.get('id')}"
+        if user_type in (0, 1):
+            return "all"
+        departments = ",".join(sorted(str(d) for d in current_user.get("sub_departments", [])))
+        return f"dept:{hashlib.sha1(departments.encode()).hexdigest()}"
+
+    @staticmethod
+    def _to_response(body: str) -> Response:
+        return Response(content=body, media_type="application/json")
+
+    @classmethod
+    def stats(cls) -> dict:
+        """本进程的响应缓存统计，命中率 = 未执行查询的请求占比（含并发合并）"""
+        return {
+            "requests": cls.requests,
+            "hits": cls.hits,
+            "coalesced": cls.requests - cls.hits - cls.misses,
+            "misses": cls.misses,
+            "hit_ratio": round(1 - cls.misses / cls.requests, 4) if cls.requests else 0.0,
+        }
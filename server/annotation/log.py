@@ -10,12 +10,11 @@ from __future__ import annotations  # 兼容 Python 3.9 以下泛型
 import json
 import time
 from enum import Enum
-from functools import lru_cache, wraps
+from functools import wraps
 from typing import Any, Dict, Literal
 
 from fastapi import Request
 from fastapi.responses import JSONResponse, ORJSONResponse, UJSONResponse
-from user_agents import parse
 
 # ---------------- 项目内部导入 ----------------
 from annotation.auth import AuthController
@@ -27,8 +26,10 @@ from exceptions.exception import (
 )
 from models import SystemLoginLog, SystemOperationLog
 from utils.config import config
-from utils.ip2region_util import get_ip_location
 from utils.log import logger
+from utils.log_enricher import LogEnricher
+from utils.log_payload import LogPayloadCodec
+from utils.log_writer import LogWriter
 from utils.response import ResponseUtil
 
 
@@ -81,31 +82,17 @@ class OperationType(Enum):
 
 
 # ---------------- 工具函数 ----------------
-@lru_cache(maxsize=1024)
-def _parse_ua(user_agent: str) -> Any:
-    """
-    解析 User-Agent 字符串并缓存结果
-    :param user_agent: 原始 UA 字符串
-    :return: user_agents.parsed 对象
-    """
-    return parse(user_agent)
-
-
 def _request_meta(request: Request) -> Dict[str, Any]:
     """
-    提取请求公共元数据
+    提取请求公共元数据（只取原始值，属地与 UA 解析由 LogEnricher 在写库前完成）
     :param request: FastAPI Request 实例
-    :return: 包含 ip、ua、browser、os、method、path 的字典
+    :return: 包含 ip、ua、method、path 的字典
     """
-    ua_str: str = request.headers.get("User-Agent", "")
-    ua = _parse_ua(ua_str)
     # 优先取 X-Forwarded-For，再取 request.client.host
     host: str = request.headers.get("X-Forwarded-For") or request.client.host
     return {
         "ip": host,
-        "ua": ua_str,
-        "browser": f"{ua.browser.family} {ua.browser.version_string}".strip(),
-        "os": f"{ua.os.family} {ua.os.version_string}".strip(),
+        "ua": request.headers.get("User-Agent", ""),
         "method": request.method,
         "path": str(request.url.path),
     }
@@ -162,14 +149,6 @@ class Log:
                 body = await request.body()
                 if len(body) > 1_048_576:  # 1 MB
                     body = b""
-            params_str: str = body.decode() or "{}"
-
-            # IP 地理位置
-            meta["location"] = (
-                get_ip_location(meta["ip"])
-                if config.app().ip_location_enabled
-                else "内网IP"
-            )
 
             # ---------- 执行原函数 ----------
             try:
@@ -196,12 +175,15 @@ class Log:
             # 耗时（毫秒）
             cost_ms: int = int((time.perf_counter_ns() - start_ns) // 1_000_000)
 
-            # ---------- 序列化响应 ----------
-            resp_dict: Dict[str, Any]
+            # ---------- 捕获响应 ----------
+            # 直接使用已渲染的响应体字节，不做反序列化
+            resp_body: bytes
             if isinstance(result, (JSONResponse, ORJSONResponse, UJSONResponse)):
-                resp_dict = json.loads(result.body.decode())
+                resp_body = bytes(result.body)
             else:
-                resp_dict = {"code": status_code, "message": "success" if success else "failed"}
+                resp_body = json.dumps(
+                    {"code": status_code, "message": "success" if success else "failed"}
+                ).encode()
 
             # ---------- 写日志 ----------
             token: str | None = request.headers.get("Authorization")
@@ -209,20 +191,28 @@ class Log:
                 session_id: str | None = getattr(request.app.state, "session_id", None)
                 user_id: int | None = getattr(request.app.state, "login_user_id", None)
                 if user_id:
-                    await SystemLoginLog.create(
-                        user_id=user_id,
+                    await LogWriter.write(
+                        SystemLoginLog,
+                        user_id_id=getattr(user_id, "id", user_id),
                         login_ip=meta["ip"],
-                        login_location=meta["location"],
-                        browser=meta["browser"],
-                        os=meta["os"],
                         status=int(success),
                         session_id=session_id,
+                        **LogEnricher.raw_fields(meta["ip"], meta["ua"]),
                     )
             else:
                 user: Dict[str, Any] = await AuthController.get_current_user(
                     request, token
                 )
-                await SystemOperationLog.create(
+                app_config = config.app()
+                codec = LogPayloadCodec.resolve_codec(app_config.log_payload_compression)
+                request_payload, request_size = LogPayloadCodec.encode(
+                    body or b"{}", app_config.log_payload_max_bytes, codec
+                )
+                response_payload, response_size = LogPayloadCodec.encode(
+                    resp_body, app_config.log_payload_max_bytes, codec
+                )
+                await LogWriter.write(
+                    SystemOperationLog,
                     operation_name=self.title,
                     operation_type=self.operation_type.value,
                     request_method=meta["method"],
@@ -230,14 +220,15 @@ class Log:
                     operator_id=user["id"],
                     department_id=user.get("department_id"),
                     host=meta["ip"],
-                    location=meta["location"],
                     user_agent=meta["ua"],
-                    browser=meta["browser"],
-                    os=meta["os"],
-                    request_params=params_str,
-                    response_result=json.dumps(resp_dict, ensure_ascii=False),
+                    payload_codec=codec,
+                    request_payload=request_payload,
+                    request_size=request_size,
+                    response_payload=response_payload,
+                    response_size=response_size,
                     status=int(success),
                     cost_time=cost_ms,
+                    **LogEnricher.raw_fields(meta["ip"], meta["ua"]),
                 )
 
             return result
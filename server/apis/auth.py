@@ -5,10 +5,11 @@
 # @File : auth.py
 # @Software : PyCharm
 # @Comment : 本程序
+import asyncio
 import json
 import uuid
 from datetime import timedelta, datetime
-from typing import Optional
+from typing import Optional, Set
 
 from fastapi import APIRouter, Request, Depends
 from starlette.responses import JSONResponse
@@ -32,29 +33,64 @@ from schemas.auth import (
 )
 from schemas.user import RegisterUserParams, GetUserInfoResponse
 from utils.captcha import CaptchaUtil
-from utils.get_redis import RedisKeyConfig
+from utils.get_redis import CacheGeneration, RedisKeyConfig
 from utils.log import logger
 from utils.mail import Email
 from utils.password import PasswordUtil
 from utils.response import ResponseUtil
+from utils.single_flight import SingleFlight
+from utils.user_cache import UserInfoCache
 from annotation.log import _request_meta
-from utils.ip2region_util import get_ip_location
-from utils.config import config
+from utils.log_enricher import LogEnricher
+from utils.log_writer import LogWriter
 from utils.notification import NotificationService
+from utils.online_session import OnlineSessionRegistry
 
 authAPI = APIRouter(prefix="/auth")
 
 
-def get_login_meta(request: Request) -> dict:
-    """获取登录请求的元数据，包括地理位置"""
+# 后台发送中的登录通知任务（持有引用，避免任务被回收）
+_notification_tasks: Set[asyncio.Task] = set()
+
+
+async def write_login_log(request: Request, user_id: Optional[str], status: int, session_id: Optional[str] = None):
+    """记录登录日志：只携带原始 IP / User-Agent 入队，属地与 UA 由日志写入任务解析"""
+    # 登录日志必须关联用户，用户不存在时不记录（否则整批日志写库失败）
+    if user_id is None:
+        return
     meta = _request_meta(request)
-    # 添加地理位置信息
-    meta["location"] = (
-        get_ip_location(meta["ip"])
-        if config.app().ip_location_enabled
-        else "内网IP"
+    await LogWriter.write(
+        SystemLoginLog,
+        user_id_id=user_id,
+        login_ip=meta["ip"],
+        status=status,
+        session_id=session_id,
+        **LogEnricher.raw_fields(meta["ip"], meta["ua"]),
     )
-    return meta
+
+
+def send_login_notification(request: Request, user_id: str, username: str):
+    """后台发送登录通知，属地与 UA 解析不计入登录接口耗时"""
+    meta = _request_meta(request)
+    redis = request.app.state.redis
+
+    async def send():
+        try:
+            resolved = LogEnricher.resolve(meta["ip"], meta["ua"])
+            await NotificationService(redis).send_login_notification(
+                user_id=user_id,
+                username=username,
+                login_ip=meta["ip"],
+                login_location=resolved["location"],
+                browser=resolved["browser"],
+                os=resolved["os"],
+            )
+        except Exception as e:
+            logger.error(f"发送登录通知失败: {e}")
+
+    task = asyncio.create_task(send(), name=f"login-notification-{user_id}")
+    _notification_tasks.add(task)
+    task.add_done_callback(_notification_tasks.discard)
 
 
 @authAPI.get(
@@ -173,16 +209,7 @@ async def login(request: Request, params: CustomOAuth2PasswordRequestForm = Depe
             session_id = uuid.uuid4().__str__()
             
             # 记录登录日志
-            request_meta = get_login_meta(request)
-            await SystemLoginLog.create(
-                user_id=user,
-                login_ip=request_meta["ip"],
-                login_location=request_meta["location"],
-                browser=request_meta["browser"],
-                os=request_meta["os"],
-                status=1,  # 登录成功
-                session_id=session_id
-            )
+            await write_login_log(request, user.id.__str__(), status=1, session_id=session_id)  # 登录成功
             # JWT Token中只存储不变的用户标识信息
             token_data = {
                 "id": user.id.__str__(),
@@ -200,16 +227,19 @@ async def login(request: Request, params: CustomOAuth2PasswordRequestForm = Depe
                 data=token_data,
                 expires_delta=timedelta(minutes=(params.login_days * 24 + 2) * 60),
             )
-            await request.app.state.redis.set(
-                f"{RedisKeyConfig.ACCESS_TOKEN.key}:{session_id}",
+            # 保存会话令牌并登记在线会话
+            await OnlineSessionRegistry.register(
+                request.app.state.redis,
+                session_id,
+                user.id.__str__(),
                 accessToken,
-                ex=timedelta(minutes=params.login_days * 24 * 60),
+                expires_in=params.login_days * 24 * 60 * 60,
             )
             # 将完整的用户信息存储到Redis中，包括动态权限信息
 
             userInfoStr = json.dumps(userInfo, ensure_ascii=False, default=str)
             await request.app.state.redis.set(
-                f"{RedisKeyConfig.USER_INFO.key}:{user.id.__str__()}",
+                await UserInfoCache.resolve_redis_key(request.app.state.redis, user.id.__str__()),
                 userInfoStr,
                 ex=timedelta(
                     minutes=params.login_days * 24 * 60
@@ -217,15 +247,7 @@ async def login(request: Request, params: CustomOAuth2PasswordRequestForm = Depe
             )
             
             # 发送登录通知
-            notification_service = NotificationService(request.app.state.redis)
-            await notification_service.send_login_notification(
-                user_id=user.id.__str__(),
-                username=user.username,
-                login_ip=request_meta["ip"],
-                login_location=request_meta["location"],
-                browser=request_meta["browser"],
-                os=request_meta["os"]
-            )
+            send_login_notification(request, user.id.__str__(), user.username)
             
             if request_from_swagger or request_from_redoc:
                 return {
@@ -239,29 +261,11 @@ async def login(request: Request, params: CustomOAuth2PasswordRequestForm = Depe
                 )
         else:
             # 记录登录失败日志
-            request_meta = get_login_meta(request)
-            await SystemLoginLog.create(
-                user_id=user,
-                login_ip=request_meta["ip"],
-                login_location=request_meta["location"],
-                browser=request_meta["browser"],
-                os=request_meta["os"],
-                status=0,  # 登录失败
-                session_id=None
-            )
+            await write_login_log(request, user.id.__str__(), status=0)  # 登录失败
             return ResponseUtil.error(msg="用户或密码错误！")
     else:
         # 记录登录失败日志（用户不存在的情况）
-        request_meta = get_login_meta(request)
-        await SystemLoginLog.create(
-            user_id=None,
-            login_ip=request_meta["ip"],
-            login_location=request_meta["location"],
-            browser=request_meta["browser"],
-            os=request_meta["os"],
-            status=0,  # 登录失败
-            session_id=None
-        )
+        await write_login_log(request, None, status=0)  # 登录失败
         return ResponseUtil.error(msg="用户或密码错误！")
 
 
@@ -384,11 +388,40 @@ async def info(
 async def get_user_routes(
     request: Request, current_user: dict = Depends(AuthController.get_current_user)
 ):
-    permission_cache = await request.app.state.redis.get(
-        f"{RedisKeyConfig.USER_ROUTES.key}:{current_user['id']}"
+    redis = request.app.state.redis
+    # 路由缓存键带有缓存代数，角色/权限变更时递增代数即可使其失效
+    user_routes_key = await CacheGeneration.resolve_key(
+        redis,
+        RedisKeyConfig.USER_ROUTES,
+        current_user["id"],
+        CacheGeneration.user_scope(current_user["id"]),
     )
-    if permission_cache:
-        return ResponseUtil.success(data=json.loads(permission_cache))
+
+    async def load_cached() -> Optional[list]:
+        permission_cache = await redis.get(user_routes_key)
+        return json.loads(permission_cache) if permission_cache else None
+
+    async def rebuild() -> list:
+        all_routes = await build_user_routes(current_user)
+        await redis.set(
+            user_routes_key,
+            json.dumps(all_routes, ensure_ascii=False, default=str),
+            ex=timedelta(minutes=30),
+        )
+        return all_routes
+
+    all_routes = await load_cached()
+    if all_routes is None:
+        # 同一用户的并发请求只重建一次，跨进程通过 Redis 锁协调
+        all_routes = await SingleFlight.do(user_routes_key, rebuild, redis=redis, fetch=load_cached)
+    return ResponseUtil.success(code=200, data=all_routes)
+
+
+async def build_user_routes(current_user: dict) -> list:
+    """
+    构建用户路由（菜单树 + 基础公共路由）
+    :param current_user: 当前用户信息
+    """
     uid = current_user.get("id")
     # 获取用户身份等级
     user_type = current_user.get("user_type", 3)
@@ -532,14 +565,7 @@ async def get_user_routes(
     
     # 添加基础公共路由（所有用户都可以访问）
     base_routes = await get_base_public_routes()
-    all_routes = base_routes + permissions
-    
-    await request.app.state.redis.set(
-        f"{RedisKeyConfig.USER_ROUTES.key}:{current_user['id']}",
-        json.dumps(all_routes,ensure_ascii=False,default=str),
-        ex=timedelta(minutes=30),
-    )
-    return ResponseUtil.success(code=200, data=all_routes)
+    return base_routes + permissions
 
 
 async def get_base_public_routes() -> list:
@@ -711,7 +737,8 @@ async def logout(request: Request, status: bool = Depends(AuthController.logout)
 async def refresh_token(
     request: Request, current_user: dict = Depends(AuthController.get_current_user)
 ):
-    session_id = uuid.uuid4().__str__()
+    # 沿用当前会话，登录日志中的会话在线状态与强退保持有效
+    session_id = getattr(request.state, "session_id", None) or uuid.uuid4().__str__()
     accessToken = await AuthController.create_token(
         data={
             "user": current_user,
@@ -720,6 +747,14 @@ async def refresh_token(
         },
         expires_delta=timedelta(minutes=2 * 24 * 60),
     )
+    # 新令牌写入会话并刷新在线索引中的过期时间
+    await OnlineSessionRegistry.register(
+        request.app.state.redis,
+        session_id,
+        current_user.get("id"),
+        accessToken,
+        expires_in=2 * 24 * 60 * 60,
+    )
     expiresTime = (datetime.now() + timedelta(minutes=2 * 24 * 60)).timestamp()
     refreshToken = await AuthController.create_token(
         data={
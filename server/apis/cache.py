@@ -9,6 +9,7 @@ from fastapi import APIRouter, Depends, Path, Request
 from fastapi.responses import JSONResponse
 
 from annotation.auth import Auth, AuthController
+from annotation.cache import ResponseCache
 from annotation.log import Log, OperationType
 from schemas.common import BaseResponse
 from schemas.cache import (
@@ -16,7 +17,12 @@ from schemas.cache import (
     UpdateCacheValueParams
 )
 from utils.get_redis import RedisKeyConfig
+from utils.ip2region_util import ip_location_stats
+from utils.log_enricher import LogEnricher
+from utils.notification import ws_manager
 from utils.response import ResponseUtil
+from utils.single_flight import SingleFlight
+from utils.user_cache import UserInfoCache
 
 cacheAPI = APIRouter(
     prefix="/cache",
@@ -103,7 +109,16 @@ async def get_cache_info(request: Request):
         memory_stats=memory_stats,
         connection_stats=connection_stats,
         performance_stats=performance_stats,
-        key_space_stats=key_space_stats
+        key_space_stats=key_space_stats,
+        local_cache_stats={
+            "user_info": UserInfoCache.stats(),
+            "single_flight": SingleFlight.stats(),
+            "response_cache": ResponseCache.stats(),
+            "log_enrich": LogEnricher.stats(),
+            "ip_location": ip_location_stats(),
+            "dynamic_config": request.app.state.dynamic_config.snapshot_stats(),
+            "websocket": ws_manager.connection_stats(),
+        },
     )
     return ResponseUtil.success(data=cache_info)
 
@@ -203,6 +218,9 @@ async def update_cache_value(
 ):
     try:
         await request.app.state.redis.set(f'{cacheName}:{cacheKey}', params.cache_value)
+        if cacheName == RedisKeyConfig.USER_INFO.key:
+            # 手动修改了用户信息缓存，丢弃本进程内的副本（其他进程的副本在本地 TTL 内过期）
+            UserInfoCache.forget_local(cacheKey.rsplit(':', 1)[-1])
         return ResponseUtil.success(msg="更新缓存值成功")
     except Exception as e:
         return ResponseUtil.error(msg=f"更新缓存值失败: {str(e)}")
@@ -218,6 +236,8 @@ async def delete_cache(request: Request, name: str = Path(description="缓存名
     cache_keys = await request.app.state.redis.keys(f'{name}*')
     if cache_keys:
         await request.app.state.redis.delete(*cache_keys)
+    # 同步使各进程内的用户信息缓存失效
+    await UserInfoCache.invalidate_all(request.app.state.redis)
     return ResponseUtil.success(msg=f"删除{name}缓存成功！")
 
 
@@ -230,6 +250,7 @@ async def delete_cache_key(request: Request, key: str = Path(description="缓存
     cache_keys = await request.app.state.redis.keys(f'*{key}')
     if cache_keys:
         await request.app.state.redis.delete(*cache_keys)
+    await UserInfoCache.invalidate_all(request.app.state.redis)
     return ResponseUtil.success(msg=f"删除{key}缓存成功！")
 
 
@@ -241,4 +262,5 @@ async def delete_all_cache(request: Request):
     cache_keys = await request.app.state.redis.keys()
     if cache_keys:
         await request.app.state.redis.delete(*cache_keys)
+    await UserInfoCache.invalidate_all(request.app.state.redis)
     return ResponseUtil.success(msg="删除所有缓存成功！")
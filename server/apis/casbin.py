@@ -317,6 +317,16 @@ async def reload_policy(current_user: dict = Depends(AuthController.get_current_
     return ResponseUtil.success(msg="策略重新加载成功")
 
 
+@casbinAPI.get(
+    "/sync-status",
+    response_class=JSONResponse,
+    summary="获取策略同步状态"
+)
+async def get_sync_status(current_user: dict = Depends(AuthController.get_current_user)):
+    """获取当前进程的跨进程策略同步状态（版本号、广播/应用/全量重载次数）及最近一次策略加载统计"""
+    return ResponseUtil.success(data=CasbinEnforcer.get_sync_status())
+
+
 @casbinAPI.delete(
     "/role/{role_code}",
     response_class=JSONResponse,
@@ -65,12 +65,12 @@ async def update_group_configs(
 ):
     """批量更新指定分组的配置"""
     dynamic_config = request.app.state.dynamic_config
-    
-    for cfg in params.configs:
-        key = cfg.get("key")
-        value = cfg.get("value")
-        if key and value is not None:
-            await dynamic_config.set(key, str(value))
+    # 全部写入后只广播一次配置变更
+    await dynamic_config.set_many(
+        (cfg.get("key"), str(cfg.get("value")))
+        for cfg in params.configs
+        if cfg.get("key") and cfg.get("value") is not None
+    )
     
     return ResponseUtil.success(msg="配置更新成功")
 
@@ -103,9 +103,9 @@ async def add_config(request: Request, params: AddConfigParams):
         type=params.type,
     )
     if config:
-        # 同步到 Redis
+        # 同步到 Redis 并通知其他进程
         dynamic_config = request.app.state.dynamic_config
-        await dynamic_config.load_all_to_redis()
+        await dynamic_config.refresh_from_db()
         return ResponseUtil.success(msg="新增成功")
     else:
         return ResponseUtil.error(msg="新增失败")
@@ -4,23 +4,57 @@
 # @File : dashboard.py
 # @Comment : 工作台数据统计API
 
-from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, Request
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import JSONResponse
-from tortoise.functions import Count
 
 from annotation.auth import AuthController
+from annotation.cache import ResponseCache
 from annotation.log import Log, OperationType
-from models import SystemLoginLog, SystemOperationLog, UserNotification
-from models.notification import NotificationStatus
+from models import SystemLoginLog, SystemOperationLog
 from schemas.common import BaseResponse
+from utils.log_rollup import LOGIN, OPERATION, LogRollup
+from utils.notification_feed import NotificationFeed
 from utils.response import ResponseUtil
 
 dashboardAPI = APIRouter(prefix="/dashboard")
 
+# 趋势统计可选的天数
+TREND_WINDOWS = (7, 30, 90)
+
+
+def get_trend_window(days: int) -> Tuple[date, List[str]]:
+    """
+    计算趋势统计的时间范围
+
+    :param days: 天数（含今天）
+    :return: (开始日期, 日期列表)
+    """
+    start = date.today() - timedelta(days=days - 1)
+    dates = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+    return start, dates
+
+
+def get_stat_scope(current_user: dict) -> Dict[str, Any]:
+    """
+    根据用户身份确定统计范围
+    - 超级管理员和管理员：所有数据
+    - 部门管理员：本部门及下属部门数据
+    - 普通用户：个人数据
+    """
+    user_type = current_user.get("user_type", 3)
+    if user_type in [0, 1]:
+        return {}
+    if user_type == 2:
+        return {"department_ids": current_user.get("sub_departments", [])}
+    return {"user_id": current_user.get("id")}
+
 
 @dashboardAPI.get("/statistics", response_class=JSONResponse, response_model=BaseResponse, summary="获取工作台统计数据")
 @Log(title="获取工作台统计数据", operation_type=OperationType.SELECT)
+@ResponseCache(namespace="dashboard", per_user=True)
 # @Auth(permission_list=["dashboard:btn:statistics", "GET:/dashboard/statistics"])
 async def get_dashboard_statistics(
     request: Request,
@@ -38,19 +72,9 @@ async def get_dashboard_statistics(
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     today_end = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
     
-    # 获取用户通知统计
-    unread_notifications = await UserNotification.filter(
-        user_id=user_id,
-        is_read=False,
-        notification__is_del=False,
-        notification__status=NotificationStatus.PUBLISHED
-    ).count()
-    
-    total_notifications = await UserNotification.filter(
-        user_id=user_id,
-        notification__is_del=False,
-        notification__status=NotificationStatus.PUBLISHED
-    ).count()
+    # 获取用户通知统计（含读时合并的全局/部门通知）
+    unread_notifications = await NotificationFeed.unread_count(user_id)
+    total_notifications = await NotificationFeed.total_count(user_id)
     
     # 根据用户身份获取统计数据
     if user_type in [0, 1]:
@@ -107,6 +131,7 @@ async def get_dashboard_statistics(
 
 @dashboardAPI.get("/login-statistics", response_class=JSONResponse, response_model=BaseResponse, summary="获取登录统计数据")
 @Log(title="获取登录统计数据", operation_type=OperationType.SELECT)
+@ResponseCache(namespace="dashboard")
 # @Auth(permission_list=["dashboard:btn:statistics", "GET:/dashboard/login-statistics"])
 async def get_login_statistics(
     request: Request,
@@ -116,168 +141,73 @@ async def get_login_statistics(
     获取登录统计数据
     - 操作系统分布
     - 浏览器分布
-    - 登录地区分布
+    - 登录地区分布（前10）
+    历史数据读取每日汇总表，仅当天数据聚合原始日志
     """
-    user_type = current_user.get("user_type", 3)
-    user_id = current_user.get("id")
-    sub_departments = current_user.get("sub_departments", [])
+    scope = get_stat_scope(current_user)
     
-    # 根据用户权限过滤数据
-    if user_type in [0, 1]:
-        # 超级管理员和管理员：查看所有数据
-        login_logs = SystemLoginLog.filter(is_del=False, status=1)
-    elif user_type == 2:
-        # 部门管理员：查看本部门及下属部门数据
-        login_logs = SystemLoginLog.filter(
-            is_del=False,
-            status=1,
-            user_id__department__id__in=sub_departments
+    distributions = {}
+    for dim, limit in (("os", None), ("browser", None), ("location", 10)):
+        stats = await LogRollup.aggregate(LOGIN, [dim], status=1, exclude_empty=True, limit=limit, **scope)
+        distributions[dim] = sorted(
+            ({"name": stat[dim], "value": stat["count"]} for stat in stats),
+            key=lambda x: x["value"],
+            reverse=True
         )
-    else:
-        # 普通用户：只查看个人数据
-        login_logs = SystemLoginLog.filter(
-            is_del=False,
-            status=1,
-            user_id=user_id
-        )
-    
-    # 统计操作系统分布
-    os_stats = await login_logs.annotate(count=Count('id')).group_by('os').values('os', 'count')
-    os_distribution = []
-    for stat in os_stats:
-        if stat['os']:
-            os_distribution.append({
-                "name": stat['os'],
-                "value": stat['count']
-            })
-    
-    # 统计浏览器分布
-    browser_stats = await login_logs.annotate(count=Count('id')).group_by('browser').values('browser', 'count')
-    browser_distribution = []
-    for stat in browser_stats:
-        if stat['browser']:
-            browser_distribution.append({
-                "name": stat['browser'],
-                "value": stat['count']
-            })
-    
-    # 统计登录地区分布（取前10）
-    location_stats = await login_logs.annotate(count=Count('id')).group_by('login_location').values('login_location', 'count')
-    location_distribution = []
-    for stat in location_stats:
-        if stat['login_location']:
-            location_distribution.append({
-                "name": stat['login_location'],
-                "value": stat['count']
-            })
-    # 按数量排序，取前10
-    location_distribution.sort(key=lambda x: x['value'], reverse=True)
-    location_distribution = location_distribution[:10]
     
     return ResponseUtil.success(data={
-        "osDistribution": os_distribution,
-        "browserDistribution": browser_distribution,
-        "locationDistribution": location_distribution
+        "osDistribution": distributions["os"],
+        "browserDistribution": distributions["browser"],
+        "locationDistribution": distributions["location"]
     })
 
 
 @dashboardAPI.get("/login-trend", response_class=JSONResponse, response_model=BaseResponse, summary="获取登录趋势数据")
 @Log(title="获取登录趋势数据", operation_type=OperationType.SELECT)
+@ResponseCache(namespace="dashboard")
 # @Auth(permission_list=["dashboard:btn:statistics", "GET:/dashboard/login-trend"])
 async def get_login_trend(
     request: Request,
+    days: int = Query(default=7, description="统计天数，可选 7/30/90"),
     current_user: dict = Depends(AuthController.get_current_user)
 ):
     """
-    获取近7天登录趋势数据
+    获取近 N 天登录趋势数据
     - 每日登录次数
-    - 每日登录地区分布
-    - 每日操作统计
+    - 每日登录地区分布（前5个活跃地区）
+    按天、地区聚合，历史数据读取每日汇总表，仅当天数据聚合原始日志
     """
-    user_type = current_user.get("user_type", 3)
-    user_id = current_user.get("id")
-    sub_departments = current_user.get("sub_departments", [])
-    
-    # 计算近7天的日期范围
-    today = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
-    seven_days_ago = today - timedelta(days=6)
-    seven_days_ago = seven_days_ago.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # 根据用户权限过滤数据
-    if user_type in [0, 1]:
-        # 超级管理员和管理员：查看所有数据
-        login_logs = SystemLoginLog.filter(
-            is_del=False,
-            status=1,
-            created_at__range=[seven_days_ago, today]
-        )
-    elif user_type == 2:
-        # 部门管理员：查看本部门及下属部门数据
-        login_logs = SystemLoginLog.filter(
-            is_del=False,
-            status=1,
-            user_id__department__id__in=sub_departments,
-            created_at__range=[seven_days_ago, today]
-        )
-    else:
-        # 普通用户：只查看个人数据
-        login_logs = SystemLoginLog.filter(
-            is_del=False,
-            status=1,
-            user_id=user_id,
-            created_at__range=[seven_days_ago, today]
-        )
-    
-    # 获取所有登录记录
-    all_logs = await login_logs.all()
+    if days not in TREND_WINDOWS:
+        return ResponseUtil.failure(msg=f"统计天数仅支持 {'/'.join(map(str, TREND_WINDOWS))}")
     
-    # 初始化7天的数据结构
-    date_dict = {}
-    for i in range(7):
-        date = seven_days_ago + timedelta(days=i)
-        date_str = date.strftime('%Y-%m-%d')
-        date_dict[date_str] = {
-            "date": date_str,
-            "count": 0,
-            "locations": {}
-        }
+    start, dates = get_trend_window(days)
+    scope = get_stat_scope(current_user)
     
-    # 统计每天的登录次数和地区分布
-    for log in all_logs:
-        date_str = log.created_at.strftime('%Y-%m-%d')
-        if date_str in date_dict:
-            date_dict[date_str]["count"] += 1
-            location = log.login_location or "未知"
-            if location in date_dict[date_str]["locations"]:
-                date_dict[date_str]["locations"][location] += 1
-            else:
-                date_dict[date_str]["locations"][location] = 1
+    # 每日登录次数
+    daily_stats = await LogRollup.aggregate(LOGIN, ["day"], start=start, status=1, **scope)
+    daily_counts = {stat["day"]: stat["count"] for stat in daily_stats}
+    login_counts = [daily_counts.get(date_str, 0) for date_str in dates]
     
-    # 转换为列表格式
-    dates = []
-    login_counts = []
-    location_trend = {}
+    # 前5个活跃地区（空地区计为"未知"）
+    top_stats = await LogRollup.aggregate(LOGIN, ["location"], start=start, status=1, limit=5, **scope)
+    top_locations = [stat["location"] for stat in top_stats]
     
-    for date_str in sorted(date_dict.keys()):
-        data = date_dict[date_str]
-        dates.append(date_str)
-        login_counts.append(data["count"])
-        
-        # 收集每个地区的趋势
-        for location, count in data["locations"].items():
-            if location not in location_trend:
-                location_trend[location] = [0] * 7
-            day_index = dates.index(date_str)
-            location_trend[location][day_index] = count
+    # 前5个地区的每日登录次数
+    location_trend: Dict[str, List[int]] = {location: [0] * days for location in top_locations}
+    if top_locations:
+        date_index = {date_str: index for index, date_str in enumerate(dates)}
+        location_stats = await LogRollup.aggregate(
+            LOGIN, ["day", "location"], start=start, status=1, values={"location": top_locations}, **scope
+        )
+        for stat in location_stats:
+            index = date_index.get(stat["day"])
+            if index is not None:
+                location_trend[stat["location"]][index] += stat["count"]
     
-    # 只取前5个活跃地区
-    top_locations = sorted(location_trend.items(), key=lambda x: sum(x[1]), reverse=True)[:5]
-    location_series = []
-    for location, values in top_locations:
-        location_series.append({
-            "name": location,
-            "data": values
-        })
+    location_series = [
+        {"name": location or "未知", "data": location_trend[location]}
+        for location in top_locations
+    ]
     
     return ResponseUtil.success(data={
         "dates": dates,
@@ -288,51 +218,28 @@ async def get_login_trend(
 
 @dashboardAPI.get("/operation-statistics", response_class=JSONResponse, response_model=BaseResponse, summary="获取操作统计数据")
 @Log(title="获取操作统计数据", operation_type=OperationType.SELECT)
+@ResponseCache(namespace="dashboard")
 # @Auth(permission_list=["dashboard:btn:statistics", "GET:/dashboard/operation-statistics"])
 async def get_operation_statistics(
     request: Request,
+    days: int = Query(default=7, description="统计天数，可选 7/30/90"),
     current_user: dict = Depends(AuthController.get_current_user)
 ):
     """
     获取操作统计数据
     - 操作类型分布
-    - 模块分布
-    - 近7天操作趋势
+    - 模块分布（前10）
+    - 近 N 天操作趋势
+    历史数据读取每日汇总表，仅当天数据聚合原始日志
     """
-    user_type = current_user.get("user_type", 3)
-    user_id = current_user.get("id")
-    sub_departments = current_user.get("sub_departments", [])
+    if days not in TREND_WINDOWS:
+        return ResponseUtil.failure(msg=f"统计天数仅支持 {'/'.join(map(str, TREND_WINDOWS))}")
     
-    # 计算近7天的日期范围
-    today = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
-    seven_days_ago = today - timedelta(days=6)
-    seven_days_ago = seven_days_ago.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # 根据用户权限过滤数据
-    if user_type in [0, 1]:
-        # 超级管理员和管理员：查看所有数据
-        operation_logs = SystemOperationLog.filter(
-            is_del=False,
-            created_at__range=[seven_days_ago, today]
-        )
-    elif user_type == 2:
-        # 部门管理员：查看本部门及下属部门数据
-        operation_logs = SystemOperationLog.filter(
-            is_del=False,
-            operator__department__id__in=sub_departments,
-            created_at__range=[seven_days_ago, today]
-        )
-    else:
-        # 普通用户：只查看个人数据
-        operation_logs = SystemOperationLog.filter(
-            is_del=False,
-            operator_id=user_id,
-            created_at__range=[seven_days_ago, today]
-        )
+    start, dates = get_trend_window(days)
+    scope = get_stat_scope(current_user)
     
     # 统计操作类型分布
-    type_stats = await operation_logs.annotate(count=Count('id')).group_by('operation_type').values('operation_type', 'count')
-    type_distribution = []
+    type_stats = await LogRollup.aggregate(OPERATION, ["operation_type"], start=start, **scope)
     # 与 OperationType 枚举对应: OTHER=0, INSERT=1, DELETE=2, UPDATE=3, SELECT=4, IMPORT=5, EXPORT=6, GRANT=7
     type_names = {
         0: "其他",
@@ -344,45 +251,27 @@ async def get_operation_statistics(
         6: "导出",
         7: "授权"
     }
-    for stat in type_stats:
-        if stat['operation_type'] is not None:
-            type_distribution.append({
-                "name": type_names.get(stat['operation_type'], f"类型{stat['operation_type']}"),
-                "value": stat['count']
-            })
-    
-    # 统计模块分布
-    module_stats = await operation_logs.annotate(count=Count('id')).group_by('operation_name').values('operation_name', 'count')
-    module_distribution = []
-    for stat in module_stats:
-        if stat['operation_name']:
-            module_distribution.append({
-                "name": stat['operation_name'],
-                "value": stat['count']
-            })
-    # 按数量排序，取前10
-    module_distribution.sort(key=lambda x: x['value'], reverse=True)
-    module_distribution = module_distribution[:10]
-    
-    # 获取所有操作记录用于计算每日趋势
-    all_logs = await operation_logs.all()
-    
-    # 初始化7天的数据结构
-    date_dict = {}
-    for i in range(7):
-        date = seven_days_ago + timedelta(days=i)
-        date_str = date.strftime('%Y-%m-%d')
-        date_dict[date_str] = 0
+    type_distribution = [
+        {
+            "name": type_names.get(stat['operation_type'], f"类型{stat['operation_type']}"),
+            "value": stat['count']
+        }
+        for stat in type_stats if stat['operation_type'] is not None
+    ]
     
-    # 统计每天的操作次数
-    for log in all_logs:
-        date_str = log.created_at.strftime('%Y-%m-%d')
-        if date_str in date_dict:
-            date_dict[date_str] += 1
+    # 统计模块分布（取前10）
+    module_stats = await LogRollup.aggregate(
+        OPERATION, ["operation_name"], start=start, exclude_empty=True, limit=10, **scope
+    )
+    module_distribution = [
+        {"name": stat['operation_name'], "value": stat['count']}
+        for stat in module_stats
+    ]
     
-    # 转换为列表格式
-    dates = sorted(date_dict.keys())
-    daily_trend = [date_dict[d] for d in dates]
+    # 每日操作次数
+    daily_stats = await LogRollup.aggregate(OPERATION, ["day"], start=start, **scope)
+    daily_counts = {stat['day']: stat['count'] for stat in daily_stats}
+    daily_trend = [daily_counts.get(date_str, 0) for date_str in dates]
     
     return ResponseUtil.success(data={
         "dates": dates,
@@ -9,6 +9,7 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, Query, Path, Request
 from fastapi.responses import JSONResponse
+from tortoise.transactions import in_transaction
 
 from annotation.auth import Auth, AuthController
 from annotation.log import Log, OperationType
@@ -19,21 +20,17 @@ from schemas.department import (
     GetDepartmentInfoResponse,
     GetDepartmentListResponse
 )
-from utils.casbin import CasbinEnforcer, DataScope
-from utils.get_redis import RedisKeyConfig
+from utils.casbin import CasbinEnforcer, DataScope, DepartmentHelper
+from utils.pagination import Pagination
 from utils.response import ResponseUtil
+from utils.user_cache import UserInfoCache
 
 departmentAPI = APIRouter(prefix="/department")
 
 
 async def clear_department_cache(request: Request):
-    """清除部门相关缓存"""
-    userInfos = await request.app.state.redis.keys(f"{RedisKeyConfig.USER_INFO.key}:*")
-    if userInfos:
-        await request.app.state.redis.delete(*userInfos)
-    userRoutes = await request.app.state.redis.keys(f"{RedisKeyConfig.USER_ROUTES.key}:*")
-    if userRoutes:
-        await request.app.state.redis.delete(*userRoutes)
+    """清除部门相关缓存（递增用户信息与用户路由缓存代数，旧缓存由 TTL 自然过期）"""
+    await UserInfoCache.invalidate_all(request.app.state.redis)
 
 
 @departmentAPI.post(
@@ -59,16 +56,19 @@ async def add_department(
         if not can_access:
             return ResponseUtil.error(msg="添加失败，无权限在该部门下创建子部门！")
     
-    department = await SystemDepartment.create(
-        name=params.name,
-        parent_id=params.parent_id,
-        principal=params.principal,
-        phone=params.phone,
-        email=params.email,
-        remark=params.remark,
-        sort=params.sort,
-        status=params.status,
-    )
+    # 部门与闭包记录在同一事务中写入，新部门立即参与数据权限与子树查询
+    async with in_transaction():
+        department = await SystemDepartment.create(
+            name=params.name,
+            parent_id=params.parent_id,
+            principal=params.principal,
+            phone=params.phone,
+            email=params.email,
+            remark=params.remark,
+            sort=params.sort,
+            status=params.status,
+        )
+        await DepartmentHelper.on_department_created(department.id, params.parent_id)
     if department:
         await clear_department_cache(request)
         return ResponseUtil.success(msg="添加成功！")
@@ -150,16 +150,11 @@ async def delete_department_list(
 
 async def delete_department_recursive(department_id: str):
     """
-    递归删除部门及其附属部门
+    删除部门及其附属部门（基于闭包表一次性软删除整棵子树）
     :param department_id: 部门ID
     :return:
     """
-    await SystemDepartment.filter(id=department_id, is_del=False).update(is_del=True)
-    sub_departments = await SystemDepartment.filter(
-        parent_id=department_id, is_del=False
-    ).all()
-    for sub_department in sub_departments:
-        await delete_department_recursive(sub_department.id)
+    await DepartmentHelper.delete_department_subtree(department_id)
     return True
 
 
@@ -199,15 +194,21 @@ async def update_department(
         if not can_access_parent:
             return ResponseUtil.error(msg="修改失败,无权限操作目标父部门！")
     
-    department.name = params.name
-    department.parent_id = params.parent_id
-    department.principal = params.principal
-    department.phone = params.phone
-    department.email = params.email
-    department.remark = params.remark
-    department.sort = params.sort
-    department.status = params.status
-    await department.save()
+    # 上级部门变更时同步移动闭包表中的整棵子树，与 parent_id 在同一事务中提交
+    async with in_transaction():
+        if str(params.parent_id or "") != str(department.parent_id or ""):
+            if not await DepartmentHelper.move_department(department.id, params.parent_id):
+                return ResponseUtil.error(msg="修改失败,不能将部门移动到自身或下级部门下！")
+        
+        department.name = params.name
+        department.parent_id = params.parent_id
+        department.principal = params.principal
+        department.phone = params.phone
+        department.email = params.email
+        department.remark = params.remark
+        department.sort = params.sort
+        department.status = params.status
+        await department.save()
     
     await clear_department_cache(request)
     return ResponseUtil.success(msg="修改成功！")
@@ -275,6 +276,7 @@ async def get_department_list(
     email: Optional[str] = Query(default=None, description="邮箱"),
     remark: Optional[str] = Query(default=None, description="备注"),
     sort: Optional[int] = Query(default=None, description="排序权重"),
+    cursor: Optional[str] = Query(default=None, description="分页游标（上一页返回的 nextCursor）"),
     current_user: dict = Depends(AuthController.get_current_user),
 ):
     user_id = current_user.get("id")
@@ -311,13 +313,14 @@ async def get_department_list(
                 data={"result": [], "total": 0, "page": page, "pageSize": pageSize}
             )
 
-    total = await SystemDepartment.filter(**filterArgs, is_del=False).count()
-    data = (
-        await SystemDepartment.filter(**filterArgs, is_del=False)
-        .order_by("sort", "created_at")
-        .offset((page - 1) * pageSize)
-        .limit(pageSize)
-        .values(
+    data = await Pagination.paginate(
+        SystemDepartment.filter(**filterArgs, is_del=False),
+        page=page,
+        page_size=pageSize,
+        cursor=cursor,
+        order_by=("sort", "created_at", "id"),
+        redis=request.app.state.redis,
+        values=dict(
             id="id",
             name="name",
             parent_id="parent_id",
@@ -329,11 +332,9 @@ async def get_department_list(
             status="status",
             created_at="created_at",
             updated_at="updated_at",
-        )
-    )
-    return ResponseUtil.success(
-        data={"result": data, "total": total, "page": page, "pageSize": pageSize}
+        ),
     )
+    return ResponseUtil.success(data=data)
 
 
 @departmentAPI.get(
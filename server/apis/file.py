@@ -15,6 +15,7 @@ from annotation.auth import Auth, AuthController
 from annotation.log import Log, OperationType
 from models.file import SystemFile, get_file_type
 from schemas.common import BaseResponse, DeleteListParams
+from utils.pagination import Pagination
 from utils.response import ResponseUtil
 from utils.storage import StorageFactory
 from utils.log import logger
@@ -69,6 +70,7 @@ async def get_file_list(
     file_type: Optional[str] = Query(default=None, description="文件类型"),
     folder: Optional[str] = Query(default=None, description="文件夹"),
     storage_type: Optional[str] = Query(default=None, description="存储类型"),
+    cursor: Optional[str] = Query(default=None, description="分页游标（上一页返回的 nextCursor）"),
 ):
     """获取文件列表"""
     filter_args = {"is_del": False}
@@ -82,21 +84,19 @@ async def get_file_list(
     if storage_type:
         filter_args["storage_type"] = storage_type
     
-    total = await SystemFile.filter(**filter_args).count()
-    files = await SystemFile.filter(**filter_args).order_by("-created_at").offset(
-        (page - 1) * pageSize
-    ).limit(pageSize).values(
-        "id", "name", "key", "url", "size", "file_type", "mime_type",
-        "extension", "hash", "storage_type", "folder", "uploader_id",
-        "uploader_name", "remark", "created_at", "updated_at"
+    data = await Pagination.paginate(
+        SystemFile.filter(**filter_args),
+        page=page,
+        page_size=pageSize,
+        cursor=cursor,
+        redis=request.app.state.redis,
+        values=[
+            "id", "name", "key", "url", "size", "file_type", "mime_type",
+            "extension", "hash", "storage_type", "folder", "uploader_id",
+            "uploader_name", "remark", "created_at", "updated_at"
+        ],
     )
-    
-    return ResponseUtil.success(data={
-        "total": total,
-        "result": files,
-        "page": page,
-        "pageSize": pageSize
-    })
+    return ResponseUtil.success(data=data)
 
 
 @authFileAPI.post("/upload", response_class=JSONResponse, response_model=BaseResponse, summary="上传文件")
@@ -10,74 +10,54 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, Path, Query, Request
 from fastapi.responses import JSONResponse
-from jose import jwt
 
 from annotation.auth import Auth,AuthController
 from annotation.log import Log, OperationType
 from models import SystemLoginLog, SystemOperationLog
 from schemas.common import BaseResponse, DeleteListParams
-from schemas.log import GetLoginLogResponse, GetOperationLogResponse
-from utils.config import config
-from utils.get_redis import RedisKeyConfig
+from schemas.log import GetLoginLogResponse, GetOperationLogResponse, GetOperationLogPayloadResponse
+from utils.export import FORMAT_CSV, MEDIA_TYPES, ExportUtil
+from utils.log_partition import LogPartition
+from utils.log_payload import LogPayloadCodec
+from utils.log_rollup import LogRollup
+from utils.online_session import OnlineSessionRegistry
+from utils.pagination import Pagination
 from utils.response import ResponseUtil
 
 logAPI = APIRouter(
     prefix="/log",
 )
 
+# 导出时的操作类型名称
+OPERATION_TYPE_LABELS = {
+    OperationType.OTHER.value: "其他",
+    OperationType.INSERT.value: "新增",
+    OperationType.DELETE.value: "删除",
+    OperationType.UPDATE.value: "修改",
+    OperationType.SELECT.value: "查询",
+    OperationType.IMPORT.value: "导入",
+    OperationType.EXPORT.value: "导出",
+    OperationType.GRANT.value: "授权",
+}
+
+
+def _login_log_filters(
+    current_user: dict,
+    username: Optional[str],
+    nickname: Optional[str],
+    department_id: Optional[str],
+    startTime: Optional[str],
+    endTime: Optional[str],
+    status: Optional[str],
+) -> Optional[dict]:
+    """
+    按查询参数与用户数据权限构造登录日志过滤条件（列表与导出共用）
 
-@logAPI.get(
-    "/login",
-    response_class=JSONResponse,
-    response_model=GetLoginLogResponse,
-    summary="用户获取登录日志",
-)
-@Log(title="用户获取登录日志", operation_type=OperationType.SELECT)
-@Auth(permission_list=["login:btn:list", "GET:/log/login"])
-async def get_login_log(
-    request: Request,
-    page: int = Query(default=1, description="页码"),
-    pageSize: int = Query(default=10, description="每页数量"),
-    username: Optional[str] = Query(default=None, description="用户账号"),
-    nickname: Optional[str] = Query(default=None, description="用户昵称"),
-    department_id: Optional[str] = Query(default=None, description="部门ID"),
-    startTime: Optional[str] = Query(default=None, description="开始时间"),
-    endTime: Optional[str] = Query(default=None, description="结束时间"),
-    status: Optional[str] = Query(default=None, description="登录状态"),
-    current_user: dict = Depends(AuthController.get_current_user),
-):
-    async def get_online_session_ids() -> list:
-        """
-        获取所有在线用户的 session_id 列表
-        """
-        access_token_keys = await request.app.state.redis.keys(
-            f"{RedisKeyConfig.ACCESS_TOKEN.key}:*"
-        )
-        if not access_token_keys:
-            return []
-        
-        session_ids = []
-        for key in access_token_keys:
-            token = await request.app.state.redis.get(key)
-            if token:
-                try:
-                    payload = jwt.decode(
-                        token, config.jwt().secret_key, algorithms=[config.jwt().algorithm]
-                    )
-                    session_id = payload.get("session_id")
-                    if session_id:
-                        session_ids.append(session_id)
-                except Exception:
-                    # Token 解析失败，跳过
-                    pass
-        return session_ids
-
+    :return: 过滤条件，部门管理员没有可访问的部门时返回 None
+    """
     sub_departments = current_user.get("sub_departments", [])
     user_id = current_user.get("id")
     user_type = current_user.get("user_type", 3)
-    
-    # 获取所有在线的 session_id
-    online_session_ids = await get_online_session_ids()
 
     filterArgs = {
         f"{k}__contains": v
@@ -92,7 +72,10 @@ async def get_login_log(
     if startTime and endTime:
         startTime = datetime.fromtimestamp(float(startTime) / 1000)
         endTime = datetime.fromtimestamp(float(endTime) / 1000)
-        filterArgs["created_at__range"] = [startTime, endTime]
+    else:
+        startTime = endTime = None
+    # 时间下限不早于日志保留期起点，分区表只扫描相关分区
+    filterArgs.update(LogPartition.date_filter(startTime, endTime))
 
     # 根据用户身份过滤数据
     if user_type in [0, 1]:
@@ -109,25 +92,117 @@ async def get_login_log(
         elif sub_departments:
             filterArgs["user_id__department__id__in"] = sub_departments
         else:
-            # 如果没有可访问的部门，返回空结果
-            return ResponseUtil.success(
-                data={
-                    "total": 0,
-                    "result": [],
-                    "page": page,
-                    "pageSize": pageSize,
-                }
-            )
+            # 没有可访问的部门
+            return None
     else:
         # 普通用户只能查看自己的登录日志
         filterArgs["user_id"] = user_id
+    return filterArgs
+
+
+def _operation_log_filters(
+    current_user: dict,
+    name: Optional[str],
+    type: Optional[str],
+    username: Optional[str],
+    nickname: Optional[str],
+    department_id: Optional[str],
+    startTime: Optional[str],
+    endTime: Optional[str],
+    status: Optional[str],
+) -> Optional[dict]:
+    """
+    按查询参数与用户数据权限构造操作日志过滤条件（列表与导出共用）
+
+    :return: 过滤条件，部门管理员没有可访问的部门时返回 None
+    """
+    sub_departments = current_user.get("sub_departments", [])
+    user_id = current_user.get("id")
+    user_type = current_user.get("user_type", 3)
+
+    filterArgs = {
+        f"{k}__contains": v
+        for k, v in {
+            "operation_name": name,
+            "operation_type": type,
+            "operator__username": username,
+            "operator__nickname": nickname,
+        }.items()
+        if v is not None
+    }
+    if status is not None:
+        filterArgs["status"] = status
+    if startTime and endTime:
+        startTime = datetime.fromtimestamp(float(startTime) / 1000)
+        endTime = datetime.fromtimestamp(float(endTime) / 1000)
+    else:
+        startTime = endTime = None
+    # 时间下限不早于日志保留期起点，分区表只扫描相关分区
+    filterArgs.update(LogPartition.date_filter(startTime, endTime))
+
+    # 根据用户身份过滤数据
+    if user_type in [0, 1]:
+        # 超级管理员和管理员可以查看所有用户的操作日志
+        if department_id:
+            filterArgs["operator__department__id"] = department_id
+        elif sub_departments:
+            filterArgs["operator__department__id__in"] = sub_departments
+        # 如果 sub_departments 为空，超管/管理员不加部门过滤，可以看所有
+    elif user_type == 2:
+        # 部门管理员可以查看本部门及下属部门的操作日志
+        if department_id:
+            filterArgs["operator__department__id"] = department_id
+        elif sub_departments:
+            filterArgs["operator__department__id__in"] = sub_departments
+        else:
+            # 没有可访问的部门
+            return None
+    else:
+        # 普通用户只能查看自己的操作日志
+        filterArgs["operator_id"] = user_id
+    return filterArgs
+
+
+@logAPI.get(
+    "/login",
+    response_class=JSONResponse,
+    response_model=GetLoginLogResponse,
+    summary="用户获取登录日志",
+)
+@Log(title="用户获取登录日志", operation_type=OperationType.SELECT)
+@Auth(permission_list=["login:btn:list", "GET:/log/login"])
+async def get_login_log(
+    request: Request,
+    page: int = Query(default=1, description="页码"),
+    pageSize: int = Query(default=10, description="每页数量"),
+    username: Optional[str] = Query(default=None, description="用户账号"),
+    nickname: Optional[str] = Query(default=None, description="用户昵称"),
+    department_id: Optional[str] = Query(default=None, description="部门ID"),
+    startTime: Optional[str] = Query(default=None, description="开始时间"),
+    endTime: Optional[str] = Query(default=None, description="结束时间"),
+    status: Optional[str] = Query(default=None, description="登录状态"),
+    cursor: Optional[str] = Query(default=None, description="分页游标（上一页返回的 nextCursor）"),
+    current_user: dict = Depends(AuthController.get_current_user),
+):
+    filterArgs = _login_log_filters(current_user, username, nickname, department_id, startTime, endTime, status)
+    if filterArgs is None:
+        # 没有可访问的部门，返回空结果
+        return ResponseUtil.success(
+            data={
+                "total": 0,
+                "result": [],
+                "page": page,
+                "pageSize": pageSize,
+            }
+        )
         
-    result = (
-        await SystemLoginLog.filter(**filterArgs, user_id__is_del=False, is_del=False)
-        .order_by("-created_at")
-        .offset((page - 1) * pageSize)
-        .limit(pageSize)
-        .values(
+    data = await Pagination.paginate(
+        SystemLoginLog.filter(**filterArgs, user_id__is_del=False, is_del=False),
+        page=page,
+        page_size=pageSize,
+        cursor=cursor,
+        redis=request.app.state.redis,
+        values=dict(
             id="id",
             user_id="user_id_id",
             username="user_id__username",
@@ -142,22 +217,81 @@ async def get_login_log(
             session_id="session_id",
             created_at="created_at",
             updated_at="updated_at",
-        )
+        ),
     )
+    result = data["result"]
 
-    # 判断每条记录是否在线
+    # 只查询当前页会话的在线状态
+    online_flags = await OnlineSessionRegistry.online_flags(
+        request.app.state.redis, (log["session_id"] for log in result)
+    )
     for log in result:
-        log["online"] = log["session_id"] in online_session_ids
-        
-    return ResponseUtil.success(
-        data={
-            "total": await SystemLoginLog.filter(
-                **filterArgs, user_id__is_del=False, is_del=False
-            ).count(),
-            "result": result,
-            "page": page,
-            "pageSize": pageSize,
-        }
+        log["online"] = online_flags.get(log["session_id"], False)
+
+    return ResponseUtil.success(data=data)
+
+
+@logAPI.get(
+    "/login/export",
+    summary="导出登录日志",
+)
+@Log(title="导出登录日志", operation_type=OperationType.EXPORT)
+@Auth(permission_list=["login:btn:list", "GET:/log/login/export"])
+async def export_login_log(
+    request: Request,
+    export_format: str = Query(default=FORMAT_CSV, alias="format", description="导出格式：csv / xlsx"),
+    username: Optional[str] = Query(default=None, description="用户账号"),
+    nickname: Optional[str] = Query(default=None, description="用户昵称"),
+    department_id: Optional[str] = Query(default=None, description="部门ID"),
+    startTime: Optional[str] = Query(default=None, description="开始时间"),
+    endTime: Optional[str] = Query(default=None, description="结束时间"),
+    status: Optional[str] = Query(default=None, description="登录状态"),
+    current_user: dict = Depends(AuthController.get_current_user),
+):
+    """
+    按列表的查询条件导出全部登录日志，边查询边下载
+    """
+    if export_format not in MEDIA_TYPES:
+        return ResponseUtil.failure(msg="导出格式只支持 csv 或 xlsx")
+    filterArgs = _login_log_filters(current_user, username, nickname, department_id, startTime, endTime, status)
+    if filterArgs is None:
+        # 没有可访问的部门，只导出表头
+        filterArgs = {"id__in": []}
+
+    batches = Pagination.iterate(
+        SystemLoginLog.filter(**filterArgs, user_id__is_del=False, is_del=False),
+        values=dict(
+            username="user_id__username",
+            user_nickname="user_id__nickname",
+            department_name="user_id__department__name",
+            login_ip="login_ip",
+            login_location="login_location",
+            browser="browser",
+            os="os",
+            status="status",
+            created_at="created_at",
+        ),
+    )
+    return ResponseUtil.streaming(
+        ExportUtil.stream(
+            export_format,
+            batches,
+            columns=[
+                ("username", "用户账号"),
+                ("user_nickname", "用户昵称"),
+                ("department_name", "所属部门"),
+                ("login_ip", "登录IP"),
+                ("login_location", "登录地点"),
+                ("browser", "浏览器"),
+                ("os", "操作系统"),
+                ("status", "登录状态"),
+                ("created_at", "登录时间"),
+            ],
+            formatters={"status": lambda value: "成功" if value == 1 else "失败"},
+            sheet_name="登录日志",
+        ),
+        media_type=MEDIA_TYPES[export_format],
+        filename=f"登录日志_{datetime.now():%Y%m%d%H%M%S}.{export_format}",
     )
 
 
@@ -195,12 +329,10 @@ async def logout_user(
             user_id=current_user.get("id"), session_id=id, is_del=False
         )
 
-    if log:
-        if await request.app.state.redis.get(f"{RedisKeyConfig.ACCESS_TOKEN.key}:{id}"):
-            await request.app.state.redis.delete(
-                f"{RedisKeyConfig.ACCESS_TOKEN.key}:{id}"
-            )
-            return ResponseUtil.success(msg="强退成功！")
+    if log and await OnlineSessionRegistry.revoke(
+        request.app.state.redis, id, log.user_id_id
+    ):
+        return ResponseUtil.success(msg="强退成功！")
 
     return ResponseUtil.failure(msg="会话不存在！")
 
@@ -240,12 +372,8 @@ async def logout_user_list(
                 user_id=current_user.get("id"), session_id=id, is_del=False
             )
 
-        if log and await request.app.state.redis.get(
-            f"{RedisKeyConfig.ACCESS_TOKEN.key}:{id}"
-        ):
-            await request.app.state.redis.delete(
-                f"{RedisKeyConfig.ACCESS_TOKEN.key}:{id}"
-            )
+        if log:
+            await OnlineSessionRegistry.revoke(request.app.state.redis, id, log.user_id_id)
 
     return ResponseUtil.success(msg="批量强退成功！")
 
@@ -287,11 +415,10 @@ async def delete_login_log(
     if log:
         log.is_del = True
         await log.save()
-        if await request.app.state.redis.get(
-            f"{RedisKeyConfig.ACCESS_TOKEN.key}:{log.session_id}"
-        ):
-            await request.app.state.redis.delete(
-                f"{RedisKeyConfig.ACCESS_TOKEN.key}:{log.session_id}"
+        await LogRollup.rebuild_days(SystemLoginLog, [log.created_at.date()])
+        if log.session_id:
+            await OnlineSessionRegistry.revoke(
+                request.app.state.redis, log.session_id, log.user_id_id
             )
         return ResponseUtil.success(msg="删除成功")
     else:
@@ -320,6 +447,7 @@ async def delete_login_log_list(
     user_type = current_user.get("user_type", 3)
     sub_departments = current_user.get("sub_departments", [])
 
+    deleted_days = set()
     for id in set(params.ids):
         # 根据用户身份验证权限
         if user_type in [0, 1, 2]:
@@ -336,13 +464,13 @@ async def delete_login_log_list(
         if log:
             log.is_del = True
             await log.save()
-            if await request.app.state.redis.get(
-                f"{RedisKeyConfig.ACCESS_TOKEN.key}:{log.session_id}"
-            ):
-                await request.app.state.redis.delete(
-                    f"{RedisKeyConfig.ACCESS_TOKEN.key}:{log.session_id}"
+            deleted_days.add(log.created_at.date())
+            if log.session_id:
+                await OnlineSessionRegistry.revoke(
+                    request.app.state.redis, log.session_id, log.user_id_id
                 )
 
+    await LogRollup.rebuild_days(SystemLoginLog, deleted_days)
     return ResponseUtil.success(msg="删除成功")
 
 
@@ -365,63 +493,29 @@ async def get_operation_log(
     startTime: Optional[str] = Query(default=None, description="开始时间"),
     endTime: Optional[str] = Query(default=None, description="结束时间"),
     status: Optional[str] = Query(default=None, description="登录状态"),
+    cursor: Optional[str] = Query(default=None, description="分页游标（上一页返回的 nextCursor）"),
     current_user: dict = Depends(AuthController.get_current_user),
 ):
-    sub_departments = current_user.get("sub_departments", [])
-    user_id = current_user.get("id")
-    user_type = current_user.get("user_type", 3)
-
-    filterArgs = {
-        f"{k}__contains": v
-        for k, v in {
-            "operation_name": name,
-            "operation_type": type,
-            "operator__username": username,
-            "operator__nickname": nickname,
-        }.items()
-        if v is not None
-    }
-    if status is not None:
-        filterArgs["status"] = status
-    if startTime and endTime:
-        startTime = datetime.fromtimestamp(float(startTime) / 1000)
-        endTime = datetime.fromtimestamp(float(endTime) / 1000)
-        filterArgs["created_at__range"] = [startTime, endTime]
-
-    # 根据用户身份过滤数据
-    if user_type in [0, 1]:
-        # 超级管理员和管理员可以查看所有用户的操作日志
-        if department_id:
-            filterArgs["operator__department__id"] = department_id
-        elif sub_departments:
-            filterArgs["operator__department__id__in"] = sub_departments
-        # 如果 sub_departments 为空，超管/管理员不加部门过滤，可以看所有
-    elif user_type == 2:
-        # 部门管理员可以查看本部门及下属部门的操作日志
-        if department_id:
-            filterArgs["operator__department__id"] = department_id
-        elif sub_departments:
-            filterArgs["operator__department__id__in"] = sub_departments
-        else:
-            # 如果没有可访问的部门，返回空结果
-            return ResponseUtil.success(
-                data={
-                    "total": 0,
-                    "result": [],
-                    "page": page,
-                    "pageSize": pageSize,
-                }
-            )
-    else:
-        # 普通用户只能查看自己的操作日志
-        filterArgs["operator_id"] = user_id
-    result = (
-        await SystemOperationLog.filter(
-            **filterArgs, operator__is_del=False, is_del=False
+    filterArgs = _operation_log_filters(
+        current_user, name, type, username, nickname, department_id, startTime, endTime, status
+    )
+    if filterArgs is None:
+        # 没有可访问的部门，返回空结果
+        return ResponseUtil.success(
+            data={
+                "total": 0,
+                "result": [],
+                "page": page,
+                "pageSize": pageSize,
+            }
         )
-        .offset((page - 1) * pageSize)
-        .limit(pageSize)
-        .values(
+    data = await Pagination.paginate(
+        SystemOperationLog.filter(**filterArgs, operator__is_del=False, is_del=False),
+        page=page,
+        page_size=pageSize,
+        cursor=cursor,
+        redis=request.app.state.redis,
+        values=dict(
             id="id",
             created_at="created_at",
             updated_at="updated_at",
@@ -429,8 +523,6 @@ async def get_operation_log(
             operation_type="operation_type",
             request_path="request_path",
             request_method="request_method",
-            request_params="request_params",
-            response_result="response_result",
             host="host",
             location="location",
             browser="browser",
@@ -443,18 +535,122 @@ async def get_operation_log(
             department_name="operator__department__name",
             status="status",
             cost_time="cost_time",
-        )
+        ),
     )
-    return ResponseUtil.success(
-        data={
-            "total": await SystemOperationLog.filter(
-                **filterArgs, is_del=False, operator__is_del=False
-            ).count(),
-            "result": result,
-            "page": page,
-            "pageSize": pageSize,
-        }
+    return ResponseUtil.success(data=data)
+
+
+@logAPI.get(
+    "/operation/export",
+    summary="导出操作日志",
+)
+@Log(title="导出操作日志", operation_type=OperationType.EXPORT)
+@Auth(permission_list=["operation:btn:list", "GET:/log/operation/export"])
+async def export_operation_log(
+    request: Request,
+    export_format: str = Query(default=FORMAT_CSV, alias="format", description="导出格式：csv / xlsx"),
+    name: Optional[str] = Query(default=None, description="操作名称"),
+    type: Optional[str] = Query(default=None, description="操作类型"),
+    username: Optional[str] = Query(default=None, description="用户账号"),
+    nickname: Optional[str] = Query(default=None, description="用户昵称"),
+    department_id: Optional[str] = Query(default=None, description="部门ID"),
+    startTime: Optional[str] = Query(default=None, description="开始时间"),
+    endTime: Optional[str] = Query(default=None, description="结束时间"),
+    status: Optional[str] = Query(default=None, description="操作状态"),
+    current_user: dict = Depends(AuthController.get_current_user),
+):
+    """
+    按列表的查询条件导出全部操作日志（不含请求与响应载荷），边查询边下载
+    """
+    if export_format not in MEDIA_TYPES:
+        return ResponseUtil.failure(msg="导出格式只支持 csv 或 xlsx")
+    filterArgs = _operation_log_filters(
+        current_user, name, type, username, nickname, department_id, startTime, endTime, status
     )
+    if filterArgs is None:
+        # 没有可访问的部门，只导出表头
+        filterArgs = {"id__in": []}
+
+    batches = Pagination.iterate(
+        SystemOperationLog.filter(**filterArgs, operator__is_del=False, is_del=False),
+        values=dict(
+            operation_name="operation_name",
+            operation_type="operation_type",
+            request_method="request_method",
+            request_path="request_path",
+            operator_name="operator__username",
+            operator_nickname="operator__nickname",
+            department_name="operator__department__name",
+            host="host",
+            location="location",
+            browser="browser",
+            os="os",
+            status="status",
+            cost_time="cost_time",
+            created_at="created_at",
+        ),
+    )
+    return ResponseUtil.streaming(
+        ExportUtil.stream(
+            export_format,
+            batches,
+            columns=[
+                ("operation_name", "操作名称"),
+                ("operation_type", "操作类型"),
+                ("request_method", "请求方法"),
+                ("request_path", "请求路径"),
+                ("operator_name", "操作人账号"),
+                ("operator_nickname", "操作人昵称"),
+                ("department_name", "所属部门"),
+                ("host", "操作IP"),
+                ("location", "操作地点"),
+                ("browser", "浏览器"),
+                ("os", "操作系统"),
+                ("status", "操作状态"),
+                ("cost_time", "耗时(ms)"),
+                ("created_at", "操作时间"),
+            ],
+            formatters={
+                "operation_type": lambda value: OPERATION_TYPE_LABELS.get(value, value),
+                "status": lambda value: "成功" if value == 1 else "失败",
+            },
+            sheet_name="操作日志",
+        ),
+        media_type=MEDIA_TYPES[export_format],
+        filename=f"操作日志_{datetime.now():%Y%m%d%H%M%S}.{export_format}",
+    )
+
+
+@logAPI.get(
+    "/operation/payload/{id}",
+    response_class=JSONResponse,
+    response_model=GetOperationLogPayloadResponse,
+    summary="用户获取操作日志载荷",
+)
+@Auth(permission_list=["operation:btn:list", "GET:/log/operation/payload/*"])
+async def get_operation_log_payload(
+    request: Request,
+    id: str = Path(..., description="操作日志id"),
+    current_user: dict = Depends(AuthController.get_current_user),
+):
+    user_type = current_user.get("user_type", 3)
+    sub_departments = current_user.get("sub_departments", [])
+
+    # 与列表相同的可见范围
+    if user_type in [0, 1]:
+        log = await SystemOperationLog.get_or_none(id=id, is_del=False)
+    elif user_type == 2:
+        log = await SystemOperationLog.get_or_none(
+            id=id, operator__department__id__in=sub_departments, is_del=False
+        )
+    else:
+        log = await SystemOperationLog.get_or_none(
+            id=id, operator_id=current_user.get("id"), is_del=False
+        )
+
+    if not log:
+        return ResponseUtil.failure(msg="操作日志不存在！")
+    return ResponseUtil.success(data=LogPayloadCodec.to_detail(log))
 
 
 @logAPI.delete(
@@ -494,6 +690,7 @@ async def delete_operation_log(
     if log:
         log.is_del = True
         await log.save()
+        await LogRollup.rebuild_days(SystemOperationLog, [log.created_at.date()])
         return ResponseUtil.success(msg="删除成功")
     else:
         return ResponseUtil.failure(msg="删除失败,操作日志不存在！")
@@ -524,18 +721,18 @@ async def delete_operation_log_list(
     # 根据用户身份过滤可删除的日志
     if user_type in [0, 1, 2]:
         # 超级管理员、管理员、部门管理员：可以删除其可访问范围内的日志
-        await SystemOperationLog.filter(
+        await LogRollup.delete_logs(SystemOperationLog.filter(
             id__in=list(set(params.ids)),
             operator__department__id__in=sub_departments,
             is_del=False,
-        ).update(is_del=True)
+        ))
     else:
         # 普通用户：只能删除自己的日志
-        await SystemOperationLog.filter(
+        await LogRollup.delete_logs(SystemOperationLog.filter(
             id__in=list(set(params.ids)),
             operator_id=current_user.get("id"),
             is_del=False,
-        ).update(is_del=True)
+        ))
 
     return ResponseUtil.success(msg="删除成功")
 
@@ -556,30 +753,6 @@ async def get_personal_login_log(
     status: Optional[str] = Query(default=None, description="登录状态"),
     current_user: dict = Depends(AuthController.get_current_user),
 ):
-    async def get_online_user() -> list:
-        """
-        获取在线用户
-        """
-        access_token_keys = await request.app.state.redis.keys(
-            f"{RedisKeyConfig.ACCESS_TOKEN.key}*"
-        )
-        if not access_token_keys:
-            access_token_keys = []
-        online_users = []
-        for access_token_key in access_token_keys:
-            token = await request.app.state.redis.get(access_token_key)
-            if token:
-                try:
-                    payload = jwt.decode(
-                        token,
-                        config.jwt().secret_key,
-                        algorithms=[config.jwt().algorithm],
-                    )
-                    online_users.append(payload.get("session_id"))
-                except Exception as e:
-                    print(e)
-        return online_users
-
     user_id = current_user.get("id")
     filterArgs = {}
 
@@ -591,7 +764,10 @@ async def get_personal_login_log(
     if startTime and endTime:
         start_time = datetime.fromisoformat(startTime.replace("Z", "+00:00"))
         end_time = datetime.fromisoformat(endTime.replace("Z", "+00:00"))
-        filterArgs["created_at__range"] = (start_time, end_time)
+    else:
+        start_time = end_time = None
+    # 时间下限不早于日志保留期起点，分区表只扫描相关分区
+    filterArgs.update(LogPartition.date_filter(start_time, end_time))
 
     result = (
         await SystemLoginLog.filter(**filterArgs, user_id__is_del=False, is_del=False)
@@ -616,8 +792,10 @@ async def get_personal_login_log(
         )
     )
 
-    # 获取在线用户列表
-    online_users = await get_online_user()
+    # 当前用户的在线会话（每用户集合，数量很小）
+    online_users = set(
+        await OnlineSessionRegistry.user_sessions(request.app.state.redis, user_id)
+    )
 
     data = []
     for item in result:
@@ -661,10 +839,7 @@ async def personal_logout_user(
 ):
     user_id = current_user.get("id")
     if await SystemLoginLog.get_or_none(user_id=user_id, session_id=id, is_del=False):
-        if await request.app.state.redis.get(f"{RedisKeyConfig.ACCESS_TOKEN.key}:{id}"):
-            await request.app.state.redis.delete(
-                f"{RedisKeyConfig.ACCESS_TOKEN.key}:{id}"
-            )
+        if await OnlineSessionRegistry.revoke(request.app.state.redis, id, user_id):
             return ResponseUtil.success(msg="强退成功！")
         else:
             return ResponseUtil.failure(msg="强退失败,会话不存在！")
@@ -713,7 +888,10 @@ async def get_personal_operation_log(
     if startTime and endTime:
         startTime = datetime.fromtimestamp(float(startTime) / 1000)
         endTime = datetime.fromtimestamp(float(endTime) / 1000)
-        filterArgs["created_at__range"] = [startTime, endTime]
+    else:
+        startTime = endTime = None
+    # 时间下限不早于日志保留期起点，分区表只扫描相关分区
+    filterArgs.update(LogPartition.date_filter(startTime, endTime))
     
     result = (
         await SystemOperationLog.filter(**filterArgs, operator__is_del=False, is_del=False)
@@ -728,8 +906,6 @@ async def get_personal_operation_log(
             operation_type="operation_type",
             request_path="request_path",
             request_method="request_method",
-            request_params="request_params",
-            response_result="response_result",
             host="host",
             location="location",
             browser="browser",
@@ -765,3 +941,22 @@ async def get_personal_operation_log(
             "todayCount": today_count,
         }
     )
+
+
+@logAPI.get(
+    "/personal/operation/payload/{id}",
+    response_class=JSONResponse,
+    response_model=GetOperationLogPayloadResponse,
+    summary="获取个人操作日志载荷",
+)
+async def get_personal_operation_log_payload(
+    request: Request,
+    id: str = Path(..., description="操作日志id"),
+    current_user: dict = Depends(AuthController.get_current_user),
+):
+    log = await SystemOperationLog.get_or_none(
+        id=id, operator_id=current_user.get("id"), is_del=False
+    )
+    if not log:
+        return ResponseUtil.failure(msg="操作日志不存在！")
+    return ResponseUtil.success(data=LogPayloadCodec.to_detail(log))
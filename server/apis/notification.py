@@ -14,11 +14,13 @@ from tortoise.models import Q
 
 from annotation.auth import AuthController, Auth
 from annotation.log import Log, OperationType
-from models import SystemNotification, UserNotification, SystemUser
+from models import SystemNotification, SystemUser
 from models.notification import NotificationScope, NotificationStatus
 from schemas.notification import CreateNotificationParams, UpdateNotificationParams
 from utils.casbin import DepartmentHelper, UserType
 from utils.notification import ws_manager, NotificationService
+from utils.notification_feed import NotificationFeed
+from utils.notification_publisher import NotificationPublisher
 from utils.response import ResponseUtil
 
 notificationAPI = APIRouter(prefix="/notification")
@@ -58,32 +60,18 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
             await websocket.close(code=4001, reason="会话已过期")
             return
         
+        # 连接成功消息由 connect 入队；之后所有下行消息都经该连接的发送队列发出
         await ws_manager.connect(websocket, user_id)
         
-        # 获取通知服务
-        notification_service = NotificationService(redis)
-        
-        # 发送连接成功消息
-        await websocket.send_json({
-            "type": "connected",
-            "data": {"message": "WebSocket 连接成功"}
-        })
-        
-        # 发送待推送的通知
-        pending = await notification_service.get_pending_notifications(user_id)
-        if pending:
-            for notification in pending:
-                await websocket.send_json(notification)
+        # 发送待推送的通知（含读时合并的全局/部门通知）
+        pending = await NotificationFeed.pending(redis, user_id)
+        for notification in pending:
+            ws_manager.send_to_socket(websocket, user_id, notification)
         
         # 从数据库查询实际未读数量
-        unread_count = await UserNotification.filter(
-            user_id=user_id,
-            is_read=False,
-            notification__is_del=False,
-            notification__status=NotificationStatus.PUBLISHED
-        ).count()
+        unread_count = await NotificationFeed.unread_count(user_id)
         
-        await websocket.send_json({
+        ws_manager.send_to_socket(websocket, user_id, {
             "type": "unread_count",
             "data": {"count": unread_count}
         })
@@ -93,7 +81,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
             data = await websocket.receive_text()
             # 处理心跳
             if data == "ping":
-                await websocket.send_text("pong")
+                ws_manager.send_to_socket(websocket, user_id, "pong")
                 continue
             
             # 处理请求-响应模式
@@ -106,10 +94,10 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
     
     except WebSocketDisconnect:
         if user_id:
-            ws_manager.disconnect(websocket, user_id)
+            await ws_manager.disconnect(websocket, user_id)
     except Exception as e:
         if user_id:
-            ws_manager.disconnect(websocket, user_id)
+            await ws_manager.disconnect(websocket, user_id)
         try:
             await websocket.close(code=4001, reason=str(e))
         except Exception:
@@ -117,9 +105,10 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
 
 
 async def handle_ws_request(websocket: WebSocket, message: dict, user_id: str, redis):
-    """处理 WebSocket 请求"""
+    """处理 WebSocket 请求（响应经该连接的发送队列发出）"""
     import json
-    from utils.get_redis import RedisKeyConfig
+    from utils.get_redis import CacheGeneration, RedisKeyConfig
+    from utils.user_cache import UserInfoCache
     
     action = message.get("action")
     request_id = message.get("requestId")
@@ -127,55 +116,38 @@ async def handle_ws_request(websocket: WebSocket, message: dict, user_id: str, r
     if not action or not request_id:
         return
     
+    def reply(data):
+        ws_manager.send_to_socket(websocket, user_id, {
+            "type": "response",
+            "requestId": request_id,
+            "data": data
+        })
+    
     try:
         if action == "getUserInfo":
             # 从 Redis 获取用户信息
-            user_info_str = await redis.get(f"{RedisKeyConfig.USER_INFO.key}:{user_id}")
+            user_info_str = await redis.get(await UserInfoCache.resolve_redis_key(redis, user_id))
             if user_info_str:
-                user_info = json.loads(user_info_str)
-                await websocket.send_json({
-                    "type": "response",
-                    "requestId": request_id,
-                    "data": user_info
-                })
+                reply(json.loads(user_info_str))
             else:
-                await websocket.send_json({
-                    "type": "response",
-                    "requestId": request_id,
-                    "data": {"success": False, "msg": "用户信息不存在"}
-                })
+                reply({"success": False, "msg": "用户信息不存在"})
         
         elif action == "getUserRoutes":
             # 从 Redis 获取用户路由
-            routes_str = await redis.get(f"{RedisKeyConfig.USER_ROUTES.key}:{user_id}")
+            routes_str = await redis.get(await CacheGeneration.resolve_key(
+                redis, RedisKeyConfig.USER_ROUTES, user_id, CacheGeneration.user_scope(user_id)
+            ))
             if routes_str:
-                routes = json.loads(routes_str)
-                await websocket.send_json({
-                    "type": "response",
-                    "requestId": request_id,
-                    "data": routes
-                })
+                reply(json.loads(routes_str))
             else:
                 # 路由缓存不存在，返回空让前端回退到 HTTP
-                await websocket.send_json({
-                    "type": "response",
-                    "requestId": request_id,
-                    "data": {"success": False, "msg": "路由缓存不存在"}
-                })
+                reply({"success": False, "msg": "路由缓存不存在"})
         
         else:
-            await websocket.send_json({
-                "type": "response",
-                "requestId": request_id,
-                "data": {"success": False, "msg": f"未知操作: {action}"}
-            })
+            reply({"success": False, "msg": f"未知操作: {action}"})
     
     except Exception as e:
-        await websocket.send_json({
-            "type": "response",
-            "requestId": request_id,
-            "data": {"success": False, "msg": str(e)}
-        })
+        reply({"success": False, "msg": str(e)})
 
 
 # ==================== 通知管理 API ====================
@@ -301,49 +273,61 @@ async def publish_notification(
     if notification.status != NotificationStatus.DRAFT:
         return ResponseUtil.error(msg="只有草稿状态的通知可以发布")
     
+    redis = request.app.state.redis
+    if NotificationPublisher.fanout_on_read(notification):
+        # 全局 / 部门通知读取时合并，发布开销与受众规模无关
+        result = await NotificationPublisher.publish_fanout_on_read(redis, notification)
+        return ResponseUtil.success(msg="发布成功", data={**result, "async": False})
+    
     # 获取目标用户列表
     target_user_ids = await _get_target_users(notification)
     
     if not target_user_ids:
         return ResponseUtil.error(msg="没有符合条件的目标用户")
     
-    # 更新通知状态
-    notification.status = NotificationStatus.PUBLISHED
-    notification.publish_time = datetime.now()
-    await notification.save()
-    
-    # 创建用户通知关联
-    for user_id in target_user_ids:
-        await UserNotification.get_or_create(
-            notification_id=notification.id,
-            user_id=user_id
+    if NotificationPublisher.should_run_async(len(target_user_ids)):
+        # 目标用户较多，后台创建用户通知关联并推送
+        progress = await NotificationPublisher.start_job(redis, notification, target_user_ids)
+        if progress is None:
+            return ResponseUtil.error(msg="该通知正在发布中")
+        return ResponseUtil.success(
+            msg="通知正在后台发布",
+            data={
+                "total_users": len(target_user_ids),
+                "online_count": 0,
+                "offline_count": 0,
+                "async": True,
+                "progress": progress
+            }
         )
     
-    # 推送通知
-    notification_service = NotificationService(request.app.state.redis)
-    creator = await SystemUser.get_or_none(id=notification.creator_id)
-    creator_name = creator.nickname if creator else "系统"
-    
-    result = await notification_service.push_notification(
-        notification_id=str(notification.id),
-        title=notification.title,
-        content=notification.content,
-        notification_type=notification.type,
-        priority=notification.priority,
-        target_user_ids=target_user_ids,
-        creator_name=creator_name
-    )
+    result = await NotificationPublisher.publish(redis, notification, target_user_ids)
     
     return ResponseUtil.success(
         msg="发布成功",
         data={
-            "total_users": len(target_user_ids),
+            "total_users": result["total_users"],
             "online_count": result["online_count"],
-            "offline_count": result["offline_count"]
+            "offline_count": result["offline_count"],
+            "async": False
         }
     )
 
 
+@notificationAPI.get("/publish/progress/{id}", response_class=JSONResponse, summary="获取通知发布进度")
+@Auth(permission_list=["notification:btn:publish", "GET:/notification/publish/progress/*"])
+async def get_publish_progress(
+    request: Request,
+    id: str = Path(description="通知ID"),
+    current_user: dict = Depends(AuthController.get_current_user)
+):
+    """获取后台发布任务的进度"""
+    progress = await NotificationPublisher.get_progress(request.app.state.redis, id)
+    if progress is None:
+        return ResponseUtil.error(msg="没有该通知的发布任务")
+    return ResponseUtil.success(data=progress)
+
+
 @notificationAPI.post("/revoke/{id}", response_class=JSONResponse, summary="撤回通知")
 @Log(title="撤回通知", operation_type=OperationType.UPDATE)
 @Auth(permission_list=["notification:btn:revoke", "POST:/notification/revoke/*"])
@@ -582,8 +566,7 @@ async def get_notification_info(
         return ResponseUtil.error(msg="无权查看此通知")
     
     # 获取已读统计
-    total_count = await UserNotification.filter(notification_id=id).count()
-    read_count = await UserNotification.filter(notification_id=id, is_read=True).count()
+    statistics = await NotificationFeed.statistics(notification)
     
     return ResponseUtil.success(data={
         "id": str(notification.id),
@@ -600,11 +583,7 @@ async def get_notification_info(
         "updated_at": notification.updated_at,
         "creator_id": str(notification.creator_id) if notification.creator_id else None,
         "creator_name": notification.creator.nickname if notification.creator else None,
-        "statistics": {
-            "total": total_count,
-            "read": read_count,
-            "unread": total_count - read_count
-        }
+        "statistics": statistics
     })
 
 
@@ -619,45 +598,12 @@ async def get_my_notifications(
     type: Optional[int] = Query(default=None, description="通知类型"),
     current_user: dict = Depends(AuthController.get_current_user)
 ):
-    """获取当前用户的通知列表"""
+    """获取当前用户的通知列表（个人通知与读时合并的全局/部门通知按时间合并）"""
     user_id = current_user.get("id")
     
-    # 基础过滤条件
-    base_filter = Q(user_id=user_id) & Q(notification__is_del=False) & Q(notification__status=NotificationStatus.PUBLISHED)
-    
-    if is_read is not None:
-        base_filter &= Q(is_read=is_read)
-    if type is not None:
-        base_filter &= Q(notification__type=type)
-    
-    # 过期时间条件：未过期 或 没有设置过期时间
-    expire_filter = Q(notification__expire_time__isnull=True) | Q(notification__expire_time__gt=datetime.now())
-    
-    final_filter = base_filter & expire_filter
-    
-    total = await UserNotification.filter(final_filter).count()
-    
-    result = await UserNotification.filter(final_filter).order_by(
-        "-created_at"
-    ).offset((page - 1) * pageSize).limit(pageSize).prefetch_related(
-        "notification", "notification__creator"
-    ).values(
-        "id", "is_read", "read_time", "created_at",
-        notification_id="notification_id",
-        title="notification__title",
-        content="notification__content",
-        notification_type="notification__type",
-        priority="notification__priority",
-        publish_time="notification__publish_time",
-        creator_name="notification__creator__nickname"
-    )
+    data = await NotificationFeed.list(user_id, page=page, page_size=pageSize, is_read=is_read, type=type)
     
-    return ResponseUtil.success(data={
-        "result": result,
-        "total": total,
-        "page": page,
-        "pageSize": pageSize
-    })
+    return ResponseUtil.success(data=data)
 
 
 @notificationAPI.post("/my/read/{id}", response_class=JSONResponse, summary="标记通知已读")
@@ -666,21 +612,14 @@ async def mark_notification_read(
     id: str = Path(description="用户通知ID"),
     current_user: dict = Depends(AuthController.get_current_user)
 ):
-    """标记通知为已读"""
+    """标记通知为已读（id 为用户通知ID，读时合并的通知为通知ID）"""
     user_id = current_user.get("id")
     
-    user_notification = await UserNotification.get_or_none(
-        id=id, user_id=user_id
-    )
-    
-    if not user_notification:
+    changed = await NotificationFeed.mark_read(user_id, id)
+    if changed is None:
         return ResponseUtil.error(msg="通知不存在")
     
-    if not user_notification.is_read:
-        user_notification.is_read = True
-        user_notification.read_time = datetime.now()
-        await user_notification.save()
-        
+    if changed:
         # 减少未读计数
         notification_service = NotificationService(request.app.state.redis)
         await notification_service.decrement_unread_count(user_id)
@@ -696,9 +635,7 @@ async def mark_all_read(
     """全部标记为已读"""
     user_id = current_user.get("id")
     
-    count = await UserNotification.filter(
-        user_id=user_id, is_read=False
-    ).update(is_read=True, read_time=datetime.now())
+    count = await NotificationFeed.mark_all_read(user_id)
     
     # 重置未读计数
     notification_service = NotificationService(request.app.state.redis)
@@ -716,24 +653,11 @@ async def get_unread_count(
     user_id = current_user.get("id")
     
     # 从数据库查询实际未读数量
-    count = await UserNotification.filter(
-        user_id=user_id,
-        is_read=False,
-        notification__is_del=False,
-        notification__status=NotificationStatus.PUBLISHED
-    ).count()
+    count = await NotificationFeed.unread_count(user_id)
     
     # 同步更新 Redis 缓存
     notification_service = NotificationService(request.app.state.redis)
-    if count > 0:
-        await request.app.state.redis.set(
-            f"{notification_service.UNREAD_COUNT_KEY}:{user_id}",
-            count
-        )
-    else:
-        await request.app.state.redis.delete(
-            f"{notification_service.UNREAD_COUNT_KEY}:{user_id}"
-        )
+    await notification_service.set_unread_count(user_id, count)
     
     return ResponseUtil.success(data={"count": count})
 
@@ -743,11 +667,10 @@ async def get_pending_notifications(
     request: Request,
     current_user: dict = Depends(AuthController.get_current_user)
 ):
-    """获取待推送的通知（用于 HTTP 轮询方式）"""
+    """获取待推送的通知（用于 HTTP 轮询方式，含读时合并的全局/部门通知）"""
     user_id = current_user.get("id")
     
-    notification_service = NotificationService(request.app.state.redis)
-    notifications = await notification_service.get_pending_notifications(user_id)
+    notifications = await NotificationFeed.pending(request.app.state.redis, user_id)
     
     return ResponseUtil.success(data={"notifications": notifications})
 
@@ -18,8 +18,9 @@ from models.permission import PermissionType
 from schemas.common import BaseResponse
 from schemas.permission import AddPermissionParams, GetPermissionInfoResponse, GetPermissionListResponse
 from utils.casbin import CasbinEnforcer
-from utils.get_redis import RedisKeyConfig
+from utils.pagination import Pagination
 from utils.response import ResponseUtil
+from utils.user_cache import UserInfoCache
 
 def normalize_api_method(api_method) -> str:
     """
@@ -187,6 +188,7 @@ async def get_permission_list(
         auth_mark: Optional[str] = Query(default=None, description="权限标识"),
         api_path: Optional[str] = Query(default=None, description="接口路径"),
         api_method: Optional[str] = Query(default=None, description="请求方法"),
+        cursor: Optional[str] = Query(default=None, description="分页游标（上一页返回的 nextCursor）"),
         current_user: dict = Depends(AuthController.get_current_user)
 ):
     # 获取当前用户类型，根据用户类型过滤权限
@@ -212,45 +214,46 @@ async def get_permission_list(
     # 例如: 管理员(user_type=1)只能看到 min_user_type >= 1 的权限
     filterArgs["min_user_type__gte"] = user_type
     
-    total = await SystemPermission.filter(**filterArgs, is_del=False).count()
-    result = await SystemPermission.filter(**filterArgs, is_del=False).offset((page - 1) * pageSize).limit(
-        pageSize).order_by(
-        'order').values(
-        "id",
-        "created_at",
-        "updated_at",
-        "menu_type",
-        "parent_id",
-        "component",
-        "name",
-        "title",
-        "path",
-        "icon",
-        "showBadge",
-        "showTextBadge",
-        "isHide",
-        "isHideTab",
-        "link",
-        "isIframe",
-        "keepAlive",
-        "isFirstLevel",
-        "fixedTab",
-        "activePath",
-        "isFullPage",
-        "order",
-        "authTitle",
-        "authMark",
-        "min_user_type",
-        "api_path",
-        "api_method",
-        "data_scope",
-        "remark",
+    data = await Pagination.paginate(
+        SystemPermission.filter(**filterArgs, is_del=False),
+        page=page,
+        page_size=pageSize,
+        cursor=cursor,
+        order_by=("order", "id"),
+        redis=request.app.state.redis,
+        values=[
+            "id",
+            "created_at",
+            "updated_at",
+            "menu_type",
+            "parent_id",
+            "component",
+            "name",
+            "title",
+            "path",
+            "icon",
+            "showBadge",
+            "showTextBadge",
+            "isHide",
+            "isHideTab",
+            "link",
+            "isIframe",
+            "keepAlive",
+            "isFirstLevel",
+            "fixedTab",
+            "activePath",
+            "isFullPage",
+            "order",
+            "authTitle",
+            "authMark",
+            "min_user_type",
+            "api_path",
+            "api_method",
+            "data_scope",
+            "remark",
+        ],
     )
-    return ResponseUtil.success(data={
-        "total": total,
-        "result": result,
-        "page": page,
-    })
+    return ResponseUtil.success(data=data)
 
 
 @permissionAPI.get("/tree", response_model=GetPermissionListResponse, response_class=JSONResponse,
@@ -443,14 +446,8 @@ async def update_button_permission(
 
 
 async def clear_user_cache(request: Request):
-    """清除用户相关缓存"""
-    # 清除用户信息缓存
-    if user_infos := await request.app.state.redis.keys(f'{RedisKeyConfig.USER_INFO.key}:*'):
-        await request.app.state.redis.delete(*user_infos)
-    
-    # 清除用户路由缓存
-    if user_routes := await request.app.state.redis.keys(f'{RedisKeyConfig.USER_ROUTES.key}:*'):
-        await request.app.state.redis.delete(*user_routes)
+    """清除用户相关缓存（递增用户信息与用户路由缓存代数，旧缓存由 TTL 自然过期）"""
+    await UserInfoCache.invalidate_all(request.app.state.redis)
 
 
 # ==================== 接口权限 API ====================
@@ -485,6 +482,7 @@ async def get_api_permission_list(
         api_path: Optional[str] = Query(default=None, description="接口路径"),
         api_method: Optional[str] = Query(default=None, description="请求方法"),
         title: Optional[str] = Query(default=None, description="权限名称"),
+        cursor: Optional[str] = Query(default=None, description="分页游标（上一页返回的 nextCursor）"),
         current_user: dict = Depends(AuthController.get_current_user)
 ):
     """获取所有接口类型的权限"""
@@ -500,21 +498,20 @@ async def get_api_permission_list(
     if title:
         filterArgs["title__icontains"] = title
     
-    total = await SystemPermission.filter(**filterArgs, is_del=False).count()
-    result = await SystemPermission.filter(**filterArgs, is_del=False).offset(
-        (page - 1) * pageSize
-    ).limit(pageSize).order_by("order", "created_at").values(
-        "id", "title", "api_path", "api_method", "data_scope",
-        "min_user_type", "authMark", "remark", "parent_id",
-        "created_at", "updated_at"
+    data = await Pagination.paginate(
+        SystemPermission.filter(**filterArgs, is_del=False),
+        page=page,
+        page_size=pageSize,
+        cursor=cursor,
+        order_by=("order", "created_at", "id"),
+        redis=request.app.state.redis,
+        values=[
+            "id", "title", "api_path", "api_method", "data_scope",
+            "min_user_type", "authMark", "remark", "parent_id",
+            "created_at", "updated_at"
+        ],
     )
-    
-    return ResponseUtil.success(data={
-        "result": result,
-        "total": total,
-        "page": page,
-        "pageSize": pageSize
-    })
+    return ResponseUtil.success(data=data)
 
 
 @permissionAPI.post("/api/add", response_class=JSONResponse, summary="添加接口权限")
@@ -607,9 +604,6 @@ async def delete_api_permission(
     permission.is_del = True
     await permission.save()
     
-    # 重新加载 Casbin 策略
-    await CasbinEnforcer.reload_policy()
-    
     return ResponseUtil.success(msg="删除接口权限成功")
 
 
@@ -18,8 +18,10 @@ from schemas.common import BaseResponse, DeleteListParams
 from schemas.role import AddRoleParams, UpdateRoleParams, UpdateRoleResponse, AddRolePermissionParams, \
     GetRolePermissionInfoResponse, GetRolePermissionListResponse, GetRoleInfoResponse, GetRoleListResponse
 from utils.casbin import CasbinEnforcer, DataScope
-from utils.get_redis import RedisKeyConfig
+from utils.log import logger
+from utils.pagination import Pagination
 from utils.response import ResponseUtil
+from utils.user_cache import UserInfoCache
 
 
 def normalize_api_method(api_method) -> str:
@@ -48,25 +50,11 @@ roleAPI = APIRouter(
 async def clear_role_cache(request: Request):
     """清除角色相关缓存"""
     try:
-        # 清除用户信息缓存
-        userInfos = await request.app.state.redis.keys(f'{RedisKeyConfig.USER_INFO.key}*')
-        if userInfos:
-            await request.app.state.redis.delete(*userInfos)
-        
-        # 清除用户路由缓存
-        userRoutes = await request.app.state.redis.keys(f'{RedisKeyConfig.USER_ROUTES.key}*')
-        if userRoutes:
-            await request.app.state.redis.delete(*userRoutes)
-        
-        # 清除角色相关缓存
-        roleKeys = await request.app.state.redis.keys('role_*')
-        if roleKeys:
-            await request.app.state.redis.delete(*roleKeys)
-            
-        print(f"清除缓存完成: 用户信息({len(userInfos)}), 用户路由({len(userRoutes)}), 角色({len(roleKeys)})")
-        
+        # 递增用户信息与用户路由缓存代数，旧缓存由 TTL 自然过期
+        await UserInfoCache.invalidate_all(request.app.state.redis)
+        logger.info("角色变更，已失效用户信息与用户路由缓存")
     except Exception as e:
-        print(f"清除缓存失败: {e}")
+        logger.error(f"清除角色相关缓存失败: {e}")
         # 不抛出异常，避免影响主要业务流程
 
 
@@ -342,6 +330,7 @@ async def get_role_list(
         department_id: Optional[str] = Query(None, description="所属部门ID"),
         department_ids: Optional[str] = Query(None, description="多个部门ID，逗号分隔"),
         status: Optional[int] = Query(None, description="状态"),
+        cursor: Optional[str] = Query(None, description="分页游标（上一页返回的 nextCursor）"),
         current_user: dict = Depends(AuthController.get_current_user)
 ):
     user_id = current_user.get("id")
@@ -402,30 +391,28 @@ async def get_role_list(
                     "pageSize": pageSize
                 })
     
-    total = await SystemRole.filter(**filterArgs, is_del=False).count()
-    data = await SystemRole.filter(**filterArgs, is_del=False).offset(
-        (page - 1) * pageSize).limit(
-        pageSize).values(
-        id="id",
-        created_at="created_at",
-        updated_at="updated_at",
-        code="code",
-        name="name",
-        status="status",
-        description="description",
-        department_id="department__id",
-        department_name="department__name",
-        department_principal="department__principal",
-        department_phone="department__phone",
-        department_email="department__email",
+    data = await Pagination.paginate(
+        SystemRole.filter(**filterArgs, is_del=False),
+        page=page,
+        page_size=pageSize,
+        cursor=cursor,
+        redis=request.app.state.redis,
+        values=dict(
+            id="id",
+            created_at="created_at",
+            updated_at="updated_at",
+            code="code",
+            name="name",
+            status="status",
+            description="description",
+            department_id="department__id",
+            department_name="department__name",
+            department_principal="department__principal",
+            department_phone="department__phone",
+            department_email="department__email",
+        ),
     )
-
-    return ResponseUtil.success(data={
-        "result": data,
-        "total": total,
-        "page": page,
-        "pageSize": pageSize
-    })
+    return ResponseUtil.success(data=data)
 
 
 @roleAPI.post("/addPermission/{id}", response_model=BaseResponse, response_class=JSONResponse, summary="新增角色权限")
@@ -589,8 +576,6 @@ async def update_role_permission(request: Request, params: AddRolePermissionPara
     if not params.permission_ids:
         # 删除角色的所有权限
         await CasbinEnforcer.delete_role(role.code)
-        # 重新加载 Casbin 策略
-        await CasbinEnforcer.reload_policy()
         await clear_role_cache(request)
         return ResponseUtil.success(msg="修改角色权限成功！")
     
@@ -652,9 +637,7 @@ async def update_role_permission(request: Request, params: AddRolePermissionPara
                         method_str = normalize_api_method(perm.api_method)
                         await CasbinEnforcer.remove_api_permission_for_role(role.code, api_path, method_str)
     
-    # 重新加载 Casbin 策略以确保缓存更新
-    await CasbinEnforcer.reload_policy()
-    
+    # 增量变更已通过策略同步广播到其他进程，无需全量重载
     await clear_role_cache(request)
     return ResponseUtil.success(msg="修改角色权限成功！")
 
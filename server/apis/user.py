@@ -18,8 +18,10 @@ from schemas.user import AddUserParams, UpdateUserParams, GetUserInfoResponse, G
     AddUserRoleParams, UpdateUserRoleParams, GetUserRoleInfoResponse, GetUserPermissionListResponse, \
     ResetPasswordParams, UpdateBaseUserInfoParams, UploadFileResponse, GetUserRoleListResponse
 from utils.casbin import CasbinEnforcer, DataScope
-from utils.get_redis import RedisKeyConfig
+from utils.log_rollup import LogRollup
+from utils.pagination import Pagination
 from utils.response import ResponseUtil
+from utils.user_cache import UserInfoCache
 from annotation.auth import Auth, AuthController
 from annotation.log import Log, OperationType
 from exceptions.exception import ServiceException
@@ -90,19 +92,15 @@ async def delete_user(
     # 移除用户角色
     await SystemUserRole.filter(user_id=user.id, is_del=False).update(is_del=True)
     # 移除用户登录日志
-    await SystemLoginLog.filter(user_id=user.id, is_del=False).update(is_del=True)
+    await LogRollup.delete_logs(SystemLoginLog.filter(user_id=user.id, is_del=False))
     # 移除用户操作日志
-    await SystemOperationLog.filter(operator_id=user.id, is_del=False).update(is_del=True)
+    await LogRollup.delete_logs(SystemOperationLog.filter(operator_id=user.id, is_del=False))
     
     # 删除 Casbin 中该用户的所有角色关联
     await CasbinEnforcer.delete_user(id)
     
-    # 更新用户信息缓存
-    if await request.app.state.redis.get(f'{RedisKeyConfig.USER_INFO.key}:{id}'):
-        await request.app.state.redis.delete(f'{RedisKeyConfig.USER_INFO.key}:{id}')
-    # 更新用户路由缓存
-    if await request.app.state.redis.get(f'{RedisKeyConfig.USER_ROUTES.key}:{id}'):
-        await request.app.state.redis.delete(f'{RedisKeyConfig.USER_ROUTES.key}:{id}')
+    # 更新用户信息与路由缓存
+    await UserInfoCache.invalidate(request.app.state.redis, id)
     
     return ResponseUtil.success(msg="删除成功！")
 
@@ -172,8 +170,7 @@ async def update_user(
     else:
         user.department = None
     await user.save()
-    if await request.app.state.redis.get(f'{RedisKeyConfig.USER_INFO.key}:{id}'):
-        await request.app.state.redis.delete(f'{RedisKeyConfig.USER_INFO.key}:{id}')
+    await UserInfoCache.invalidate(request.app.state.redis, id)
     return ResponseUtil.success(msg="更新成功！")
 
 
@@ -218,6 +215,7 @@ async def get_user_list(
         status: Optional[str] = Query(default=None, description="状态"),
         department_id: Optional[str] = Query(default=None, description="部门ID"),
         department_ids: Optional[str] = Query(default=None, description="多个部门ID，逗号分隔"),
+        cursor: Optional[str] = Query(default=None, description="分页游标（上一页返回的 nextCursor）"),
         current_user: dict = Depends(AuthController.get_current_user)
 ):
     operator_id = current_user.get("id")
@@ -269,28 +267,29 @@ async def get_user_list(
             # 仅本人数据权限，只能看自己
             filterArgs["id"] = operator_id
     
-    total = await SystemUser.filter(**filterArgs, is_del=False).count()
-    result = await SystemUser.filter(**filterArgs, is_del=False).offset((page - 1) * pageSize).limit(pageSize).values(
-        id="id",
-        created_at="created_at",
-        updated_at="updated_at",
-        username="username",
-        email="email",
-        phone="phone",
-        nickname="nickname",
-        avatar="avatar",
-        gender="gender",
-        status="status",
-        user_type="user_type",
-        department_id="department__id",
-        department_name="department__name",
+    data = await Pagination.paginate(
+        SystemUser.filter(**filterArgs, is_del=False),
+        page=page,
+        page_size=pageSize,
+        cursor=cursor,
+        redis=request.app.state.redis,
+        values=dict(
+            id="id",
+            created_at="created_at",
+            updated_at="updated_at",
+            username="username",
+            email="email",
+            phone="phone",
+            nickname="nickname",
+            avatar="avatar",
+            gender="gender",
+            status="status",
+            user_type="user_type",
+            department_id="department__id",
+            department_name="department__name",
+        ),
     )
-    return ResponseUtil.success(data={
-        "result": result,
-        "total": total,
-        "page": page,
-        "pageSize": pageSize
-    })
+    return ResponseUtil.success(data=data)
 
 
 @userAPI.post("/addRole", response_model=BaseResponse, response_class=JSONResponse, summary="分配用户角色")
@@ -356,12 +355,7 @@ async def add_user_role(request: Request, params: AddUserRoleParams,
         if role:
             await CasbinEnforcer.remove_role_for_user(params.user_id, role.code)
     
-    if await request.app.state.redis.get(
-        f"{RedisKeyConfig.USER_INFO.key}:{params.user_id}"
-    ):
-        await request.app.state.redis.delete(
-            f"{RedisKeyConfig.USER_INFO.key}:{params.user_id}"
-        )
+    await UserInfoCache.invalidate(request.app.state.redis, params.user_id)
     return ResponseUtil.success(msg="修改成功！")
 
 @userAPI.delete("/deleteRole/{id}", response_model=BaseResponse, response_class=JSONResponse,
@@ -394,8 +388,7 @@ async def delete_user_role(request: Request, id: str = Path(description="用户
     if role:
         await CasbinEnforcer.remove_role_for_user(str(user.id), role.code)
     
-    if await request.app.state.redis.get(f'{RedisKeyConfig.USER_INFO.key}:{user.id}'):
-        await request.app.state.redis.delete(f'{RedisKeyConfig.USER_INFO.key}:{user.id}')
+    await UserInfoCache.invalidate(request.app.state.redis, user.id)
     
     return ResponseUtil.success(msg="删除成功！")
 
@@ -463,8 +456,7 @@ async def update_user_role(request: Request, params: UpdateUserRoleParams,
         if role:
             await CasbinEnforcer.remove_role_for_user(params.user_id, role.code)
     
-    if await request.app.state.redis.get(f'{RedisKeyConfig.USER_INFO.key}:{params.user_id}'):
-        await request.app.state.redis.delete(f'{RedisKeyConfig.USER_INFO.key}:{params.user_id}')
+    await UserInfoCache.invalidate(request.app.state.redis, params.user_id)
     return ResponseUtil.success(msg="修改成功！")
 
 
@@ -756,8 +748,7 @@ async def upload_user_avatar(
         await user.save()
         
         # 清除用户信息缓存
-        if await request.app.state.redis.get(f'{RedisKeyConfig.USER_INFO.key}:{user.id}'):
-            await request.app.state.redis.delete(f'{RedisKeyConfig.USER_INFO.key}:{user.id}')
+        await UserInfoCache.invalidate(request.app.state.redis, user.id)
         
         return ResponseUtil.success(data={
             "id": str(user.id),
@@ -796,8 +787,7 @@ async def reset_user_password(request: Request, params: ResetPasswordParams, id:
     await user.save()
     
     # 清除用户信息缓存
-    if await request.app.state.redis.get(f'{RedisKeyConfig.USER_INFO.key}:{user.id}'):
-        await request.app.state.redis.delete(f'{RedisKeyConfig.USER_INFO.key}:{user.id}')
+    await UserInfoCache.invalidate(request.app.state.redis, user.id)
         
     return ResponseUtil.success(msg="重置密码成功！")
 
@@ -818,8 +808,7 @@ async def update_base_userinfo(params: UpdateBaseUserInfoParams, request: Reques
         await user.save()
         
         # 清除用户信息缓存
-        if await request.app.state.redis.get(f'{RedisKeyConfig.USER_INFO.key}:{user.id}'):
-            await request.app.state.redis.delete(f'{RedisKeyConfig.USER_INFO.key}:{user.id}')
+        await UserInfoCache.invalidate(request.app.state.redis, user.id)
             
         return ResponseUtil.success(msg="更新成功！")
     
@@ -843,8 +832,7 @@ async def update_user_password(request: Request, oldPassword: str = Form(descrip
         await user.save()
         
         # 清除用户信息缓存
-        if await request.app.state.redis.get(f'{RedisKeyConfig.USER_INFO.key}:{user.id}'):
-            await request.app.state.redis.delete(f'{RedisKeyConfig.USER_INFO.key}:{user.id}')
+        await UserInfoCache.invalidate(request.app.state.redis, user.id)
             
         return ResponseUtil.success(msg="更新成功！")
     
@@ -873,8 +861,7 @@ async def update_user_phone(request: Request, password: str = Form(description="
         await user.save()
         
         # 清除用户信息缓存
-        if await request.app.state.redis.get(f'{RedisKeyConfig.USER_INFO.key}:{user.id}'):
-            await request.app.state.redis.delete(f'{RedisKeyConfig.USER_INFO.key}:{user.id}')
+        await UserInfoCache.invalidate(request.app.state.redis, user.id)
             
         return ResponseUtil.success(msg="更新成功！")
     
@@ -903,8 +890,7 @@ async def update_user_email(request: Request, password: str = Form(description="
         await user.save()
         
         # 清除用户信息缓存
-        if await request.app.state.redis.get(f'{RedisKeyConfig.USER_INFO.key}:{user.id}'):
-            await request.app.state.redis.delete(f'{RedisKeyConfig.USER_INFO.key}:{user.id}')
+        await UserInfoCache.invalidate(request.app.state.redis, user.id)
             
         return ResponseUtil.success(msg="更新成功！")
     
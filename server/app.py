@@ -20,8 +20,15 @@ from utils.config import config
 from utils.database import init_db, close_db
 from utils.get_redis import RedisUtil
 from utils.log import logger
-from utils.casbin import CasbinEnforcer
+from utils.casbin import CasbinEnforcer, DepartmentHelper
 from utils.dynamic_config import init_dynamic_config
+from utils.log_partition import LogPartition
+from utils.log_rollup import LogRollup
+from utils.log_writer import LogWriter
+from utils.notification import NotificationService, ws_manager
+from utils.notification_publisher import NotificationPublisher
+from utils.online_session import OnlineSessionRegistry
+from models import SystemLoginLog, SystemOperationLog
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -34,12 +41,49 @@ async def lifespan(app: FastAPI):
     # 初始化动态配置服务
     dynamic_config = init_dynamic_config(app.state.redis)
     await dynamic_config.init_default_configs()  # 初始化默认配置
-    await dynamic_config.load_all_to_redis()     # 加载配置到 Redis
+    await dynamic_config.load_all_to_redis()     # 加载配置到 Redis 与本地快照
+    dynamic_config.start()                       # 订阅配置变更广播
     app.state.dynamic_config = dynamic_config
     
+    # 首次升级时按现有会话令牌重建在线会话索引
+    await OnlineSessionRegistry.ensure_index(app.state.redis)
+    # 旧版按用户存储的通知未读计数合并到哈希
+    await NotificationService(app.state.redis).migrate_unread_counts()
+
+    # 校验部门闭包表（首次升级或数据导入后自动重建）
+    await DepartmentHelper.ensure_closure()
+    
     # 初始化 Casbin（传入 Redis 实例）
     await CasbinEnforcer.init(app.state.redis)
+
+    # 日志每日汇总：写入后累加，汇总表为空时后台回填
+    if config.app().log_rollup_enabled:
+        LogWriter.add_listener(LogRollup.record)
+        await LogRollup.ensure_backfilled(app.state.redis)
+
+    # 启动日志批量写入
+    if config.app().log_batch_enabled:
+        await LogWriter.start(
+            [SystemLoginLog, SystemOperationLog],
+            batch_size=config.app().log_batch_size,
+            flush_interval_ms=config.app().log_flush_interval_ms,
+            queue_size=config.app().log_queue_size,
+            overflow=config.app().log_overflow_policy,
+        )
+
+    # 日志分区维护与过期归档（未启用分区且未设置保留期时不启动）
+    LogPartition.start(app.state.redis)
+
+    # WebSocket 跨进程消息转发与在线状态心跳
+    ws_manager.start(app.state.redis)
     yield
+    await NotificationPublisher.shutdown()
+    await ws_manager.stop()
+    await LogPartition.shutdown()
+    # 先写完缓冲的日志再关闭数据库连接
+    await LogWriter.shutdown()
+    await CasbinEnforcer.shutdown()
+    await dynamic_config.stop()
     await close_db()
     await RedisUtil.close_redis_connection(app.state.redis)
 
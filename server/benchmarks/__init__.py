@@ -0,0 +1,5 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : __init__.py
+# @Comment : 性能基准脚本
@@ -0,0 +1,202 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : bench_ip2region.py
+# @Comment : IP 属地查询基准 - 对比 xdb 整体读入内存与 mmap 映射的查询速度、LRU 缓存与批量接口收益，以及多工作进程的内存占用
+#
+# 运行方式（在 server 目录下）：
+#     python -m benchmarks.bench_ip2region                 # 使用 assets 下的 xdb，缺失时生成同格式的模拟数据
+#     python -m benchmarks.bench_ip2region --synthetic --workers 8
+import argparse
+import ipaddress
+import multiprocessing
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import psutil
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR))
+
+from utils import ip2region_util  # noqa: E402
+from utils.config import config  # noqa: E402
+
+HEADER_LENGTH = 256
+VECTOR_INDEX_LENGTH = 256 * 256 * 8
+
+
+def _write_xdb(path: Path, ip_version: int, segments_per_bucket: int, regions: int, seed: int = 7):
+    """
+    生成模拟 xdb 文件（xdb 3.0 结构，与官方生成器布局一致：头部 + 向量索引 + region 数据 + 段索引）
+
+    地址空间按前两个字节分为 65536 个桶，每个桶随机切分为若干段，段的 region 从 region 池中随机选取
+    """
+    rng = random.Random(seed)
+    byte_num = 4 if ip_version == 4 else 16
+    pool = [f"中国|省份{i % 34}|城市{i}|{('电信', '联通', '移动')[i % 3]}".encode("utf-8") for i in range(regions)]
+
+    data = bytearray()
+    data_ptrs = []
+    data_start = HEADER_LENGTH + VECTOR_INDEX_LENGTH
+    for region in pool:
+        data_ptrs.append((data_start + len(data), len(region)))
+        data.extend(region)
+
+    index = bytearray()
+    vector = bytearray(VECTOR_INDEX_LENGTH)
+    index_start = data_start + len(data)
+    entry_size = 14 if ip_version == 4 else 38
+    tail_bits = (byte_num - 2) * 8
+    for bucket in range(65536):
+        cuts = sorted(rng.sample(range(1, 1 << min(tail_bits, 24)), segments_per_bucket - 1))
+        shift = tail_bits - min(tail_bits, 24)
+        bounds = [0] + [cut << shift for cut in cuts] + [1 << tail_bits]
+        first = index_start + len(index)
+        for low, high in zip(bounds, bounds[1:]):
+            start = (bucket << tail_bits) | low
+            end = (bucket << tail_bits) | (high - 1)
+            ptr, length = data_ptrs[rng.randrange(regions)]
+            if ip_version == 4:
+                index.extend(struct.pack("<IIHI", start, end, length, ptr))
+            else:
+                index.extend(start.to_bytes(16, "big") + end.to_bytes(16, "big") + struct.pack("<HI", length, ptr))
+        last = index_start + len(index) - entry_size
+        struct.pack_into("<II", vector, bucket * 8, first, last)
+
+    header = bytearray(HEADER_LENGTH)
+    struct.pack_into(
+        "<HHIIIHH", header, 0, 3, 1, int(time.time()), index_start, index_start + len(index) - entry_size,
+        ip_version, 4,
+    )
+    path.write_bytes(bytes(header) + bytes(vector) + bytes(data) + bytes(index))
+
+
+def _random_ips(rng: random.Random, count: int, version: int):
+    ips = []
+    while len(ips) < count:
+        if version == 4:
+            ip = ipaddress.IPv4Address(rng.getrandbits(32))
+        else:
+            ip = ipaddress.IPv6Address((0x2000 << 112) | rng.getrandbits(125 - 12))
+        if not ip.is_private and not ip.is_multicast and not ip.is_reserved:
+            ips.append(str(ip))
+    return ips
+
+
+def _reset(load_mode: str, cache_size: int = 10000):
+    ip2region_util._close_searcher()
+    app_config = config.app()
+    app_config.ip2region_load_mode = load_mode
+    app_config.ip_location_cache_size = cache_size
+    ip2region_util._init_searcher()
+
+
+def _rate(count: int, func) -> float:
+    start = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - start)
+
+
+def _throughput(lookups: int):
+    rng = random.Random(1)
+    unique_v4 = _random_ips(rng, lookups, 4)
+    unique_v6 = _random_ips(rng, lookups // 4, 6)
+    # 偏斜访问：少量活跃客户端贡献大部分请求
+    hot = _random_ips(rng, 2000, 4)
+    skewed = [hot[min(int(rng.paretovariate(1.2)) - 1, len(hot) - 1)] if rng.random() < 0.9
+              else unique_v4[rng.randrange(len(unique_v4))] for _ in range(lookups)]
+
+    print(f"{'mode':<7} | {'workload':<28} | {'lookups/s':>11}")
+    print("-" * 54)
+    for load_mode in (ip2region_util.LOAD_MEMORY, ip2region_util.LOAD_MMAP):
+        _reset(load_mode)
+        rows = [
+            ("v4 random, no cache", _rate(len(unique_v4), lambda: [ip2region_util._lookup(ip) for ip in unique_v4])),
+            ("v6 random, no cache", _rate(len(unique_v6), lambda: [ip2region_util._lookup(ip) for ip in unique_v6])),
+        ]
+        _reset(load_mode)
+        rows.append((
+            "v4 skewed, get_ip_location",
+            _rate(len(skewed), lambda: [ip2region_util.get_ip_location(ip) for ip in skewed]),
+        ))
+        hit_rate = ip2region_util.ip_location_stats()["cache"]["hit_rate"]
+        _reset(load_mode)
+        rows.append((
+            "v4 skewed, get_ip_locations",
+            _rate(len(skewed), lambda: [
+                ip2region_util.get_ip_locations(skewed[i:i + 200]) for i in range(0, len(skewed), 200)
+            ]),
+        ))
+        for workload, rate in rows:
+            print(f"{load_mode:<7} | {workload:<28} | {rate:>11,.0f}")
+        print(f"{load_mode:<7} | {'(skewed cache hit rate)':<28} | {hit_rate:>10.1f}%")
+    ip2region_util._close_searcher()
+
+
+def _worker(directory: str, load_mode: str, lookups: int, result_queue):
+    """子进程：加载 xdb 并查询，报告相对加载前的 RSS 与私有内存（USS）增量"""
+    os.chdir(directory)
+    process = psutil.Process()
+    before = process.memory_full_info()
+    _reset(load_mode, cache_size=1)
+    rng = random.Random(os.getpid())
+    for ip in _random_ips(rng, lookups, 4) + _random_ips(rng, lookups // 4, 6):
+        ip2region_util._lookup(ip)
+    after = process.memory_full_info()
+    result_queue.put((load_mode, (after.rss - before.rss) / 1024 / 1024, (after.uss - before.uss) / 1024 / 1024))
+
+
+def _memory(directory: str, workers: int, lookups: int):
+    context = multiprocessing.get_context("spawn")
+    print(f"\n{workers} workers, {lookups:,} v4 + {lookups // 4:,} v6 lookups each")
+    print(f"{'mode':<7} | {'RSS/worker (MB)':>15} | {'private/worker (MB)':>19} | {'private total (MB)':>18}")
+    print("-" * 70)
+    results = {}
+    for load_mode in (ip2region_util.LOAD_MEMORY, ip2region_util.LOAD_MMAP):
+        queue = context.Queue()
+        processes = [context.Process(target=_worker, args=(directory, load_mode, lookups, queue)) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        samples = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+        rss = sum(sample[1] for sample in samples) / workers
+        uss = sum(sample[2] for sample in samples) / workers
+        results[load_mode] = uss
+        print(f"{load_mode:<7} | {rss:>15.1f} | {uss:>19.1f} | {uss * workers:>18.1f}")
+    saved = results[ip2region_util.LOAD_MEMORY] - results[ip2region_util.LOAD_MMAP]
+    print(f"private memory saved by mmap: {saved:.1f} MB per worker, {saved * workers:.1f} MB in total")
+
+
+def run(synthetic: bool, workers: int, lookups: int):
+    assets = SERVER_DIR / "assets"
+    with tempfile.TemporaryDirectory() as directory:
+        target = Path(directory) / "assets"
+        target.mkdir()
+        for version, (name, _) in ip2region_util._XDB_FILES.items():
+            source = assets / name
+            if source.exists() and not synthetic:
+                shutil.copyfile(source, target / name)
+            else:
+                _write_xdb(target / name, version, segments_per_bucket=12 if version == 4 else 4, regions=4000)
+            print(f"{name}: {(target / name).stat().st_size / 1024 / 1024:.1f} MB"
+                  f"{'' if source.exists() and not synthetic else ' (synthetic)'}")
+        print()
+        os.chdir(directory)
+        _throughput(lookups)
+        _memory(directory, workers, lookups // 4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IP 属地查询基准")
+    parser.add_argument("--synthetic", action="store_true", help="始终使用模拟 xdb 数据")
+    parser.add_argument("--workers", type=int, default=4, help="模拟的工作进程数")
+    parser.add_argument("--lookups", type=int, default=200_000, help="单进程查询次数")
+    args = parser.parse_args()
+    run(args.synthetic, args.workers, args.lookups)
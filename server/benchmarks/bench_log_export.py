@@ -0,0 +1,174 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : bench_log_export.py
+# @Comment : 操作日志导出基准 - 对比一次性查询全部再序列化与键集分批流式导出的耗时和内存峰值（SQLite 临时库）
+#
+# 运行方式（在 server 目录下）：
+#     python -m benchmarks.bench_log_export                   # 默认 10 万行与 100 万行
+#     python -m benchmarks.bench_log_export --rows 1000000 --skip-naive
+import argparse
+import asyncio
+import csv
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import psutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tortoise import Tortoise  # noqa: E402
+
+from models import SystemOperationLog  # noqa: E402
+from utils.database import _ensure_added_indexes  # noqa: E402
+from utils.export import FORMAT_CSV, FORMAT_XLSX, ExportUtil  # noqa: E402
+from utils.pagination import Pagination  # noqa: E402
+
+VALUES = dict(
+    operation_name="operation_name",
+    operation_type="operation_type",
+    request_method="request_method",
+    request_path="request_path",
+    operator_name="operator__username",
+    operator_nickname="operator__nickname",
+    department_name="operator__department__name",
+    host="host",
+    location="location",
+    browser="browser",
+    os="os",
+    status="status",
+    cost_time="cost_time",
+    created_at="created_at",
+)
+COLUMNS = [(key, key) for key in VALUES]
+# 超过该行数不再运行一次性导出（内存占用过大）
+NAIVE_MAX_ROWS = 200_000
+
+
+def _seed(path: str, rows: int):
+    """直接用 sqlite3 批量写入测试数据（表结构已由 Tortoise 生成）"""
+    conn = sqlite3.connect(path)
+    department_id = str(uuid.uuid4())
+    # 与 Tortoise SQLite 后端写入的时间格式一致（带时区后缀），保证键集比较正确
+    now = datetime.now(timezone.utc).isoformat(" ")
+    conn.execute(
+        "INSERT INTO system_department (id, is_del, created_at, updated_at, name, parent_id, sort, phone, "
+        "principal, email, status) VALUES (?, 0, ?, ?, '研发部', NULL, 0, '1', 'p', 'e@x.com', 1)",
+        (department_id, now, now),
+    )
+    user_ids = [str(uuid.uuid4()) for _ in range(20)]
+    conn.executemany(
+        "INSERT INTO system_user (id, is_del, created_at, updated_at, username, password, nickname, email, "
+        "phone, gender, status, user_type, department_id) VALUES (?, 0, ?, ?, ?, 'x', ?, ?, '1', 0, 1, 3, ?)",
+        [(user_id, now, now, f"user{i}", f"用户{i}", f"u{i}@x.com", department_id) for i, user_id in enumerate(user_ids)],
+    )
+    start = datetime.now(timezone.utc)
+    batch = []
+    for i in range(rows):
+        created_at = (start - timedelta(seconds=i)).isoformat(" ")
+        batch.append((
+            str(uuid.uuid4()), created_at, created_at, f"操作{i % 50}", i % 8, f"/api/module{i % 30}/action",
+            "GET", user_ids[i % len(user_ids)], "10.0.0.1", "内网IP", "Mozilla/5.0", "Chrome", "Windows",
+            i % 2, 12.5,
+        ))
+        if len(batch) == 50_000:
+            conn.executemany(
+                "INSERT INTO system_operation_log (id, is_del, created_at, updated_at, operation_name, "
+                "operation_type, request_path, request_method, operator_id, host, location, user_agent, browser, "
+                "os, status, cost_time) VALUES (?, 0, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+            batch.clear()
+    if batch:
+        conn.executemany(
+            "INSERT INTO system_operation_log (id, is_del, created_at, updated_at, operation_name, "
+            "operation_type, request_path, request_method, operator_id, host, location, user_agent, browser, "
+            "os, status, cost_time) VALUES (?, 0, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            batch,
+        )
+    conn.commit()
+    conn.close()
+
+
+class _RssMeter:
+    """采样进程常驻内存，记录相对基线的峰值"""
+
+    def __init__(self):
+        self.process = psutil.Process()
+        self.baseline = self.process.memory_info().rss
+        self.peak = self.baseline
+
+    def sample(self):
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+    @property
+    def peak_mb(self) -> float:
+        return (self.peak - self.baseline) / 1024 / 1024
+
+
+async def _export_streaming(export_format: str):
+    meter = _RssMeter()
+    start = time.perf_counter()
+    size = 0
+    batches = Pagination.iterate(SystemOperationLog.filter(is_del=False), values=VALUES)
+    async for chunk in ExportUtil.stream(export_format, batches, COLUMNS):
+        size += len(chunk)
+        meter.sample()
+    return time.perf_counter() - start, size, meter.peak_mb
+
+
+async def _export_naive():
+    """原分页接口的思路：一次取出全部行，再整体序列化"""
+    meter = _RssMeter()
+    start = time.perf_counter()
+    rows = await SystemOperationLog.filter(is_del=False).order_by("-created_at", "-id").values(**VALUES)
+    meter.sample()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(list(VALUES))
+    writer.writerows([row[key] for key in VALUES] for row in rows)
+    data = buffer.getvalue().encode("utf-8")
+    meter.sample()
+    return time.perf_counter() - start, len(data), meter.peak_mb
+
+
+async def run(sizes, skip_naive: bool = False):
+    print(f"{'rows':>9} | {'method':<14} | {'time (s)':>8} | {'rows/s':>9} | {'output (MB)':>11} | {'peak RSS (MB)':>13}")
+    print("-" * 80)
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.sqlite3")
+            await Tortoise.init(db_url=f"sqlite://{path}", modules={"system": ["models"]})
+            await Tortoise.generate_schemas()
+            # 与 init_db 一致，补建日志表 (created_at, id) 索引
+            await _ensure_added_indexes("sqlite")
+            _seed(path, rows)
+
+            results = [
+                ("stream csv", await _export_streaming(FORMAT_CSV)),
+                ("stream xlsx", await _export_streaming(FORMAT_XLSX)),
+            ]
+            # 一次性导出会抬高进程内存基线，放在最后执行
+            if not skip_naive and rows <= NAIVE_MAX_ROWS:
+                results.append(("naive csv", await _export_naive()))
+            for method, (elapsed, size, peak_mb) in results:
+                print(
+                    f"{rows:>9} | {method:<14} | {elapsed:>8.1f} | {rows / elapsed:>9.0f} | "
+                    f"{size / 1024 / 1024:>11.1f} | {peak_mb:>13.1f}"
+                )
+            await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="操作日志导出基准")
+    parser.add_argument("--rows", type=int, nargs="*", default=[100_000, 1_000_000], help="数据行数")
+    parser.add_argument("--skip-naive", action="store_true", help="不运行一次性导出对比")
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.skip_naive))
@@ -0,0 +1,116 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : bench_route_index.py
+# @Comment : API 路由索引微基准 - 对比原中间件逐角色逐策略正则匹配与预编译索引单次查找
+#
+# 运行方式（在 server 目录下）：
+#     python -m benchmarks.bench_route_index
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.route_index import ApiRouteIndex  # noqa: E402
+
+ROLES = ["user", "auditor", "operator"]
+METHODS = ["GET", "POST", "PUT,POST", "DELETE,POST", "GET,POST"]
+MODULES = ["user", "role", "department", "permission", "log", "file", "config", "notification", "cache"]
+
+
+def _make_policies(count: int, seed: int = 42) -> List[List[str]]:
+    """生成 count 条 API 策略，约三分之一为通配符路径"""
+    rng = random.Random(seed)
+    policies = []
+    for i in range(count):
+        module = rng.choice(MODULES)
+        if i % 3 == 0:
+            path = f"/{module}/action{i}/*"
+        else:
+            path = f"/{module}/action{i}"
+        policies.append([ROLES[i % len(ROLES)], path, rng.choice(METHODS)])
+    return policies
+
+
+def _legacy_match_path(request_path: str, policy_path: str) -> bool:
+    """原 CasbinMiddleware._match_path 实现"""
+    if request_path == policy_path:
+        return True
+    if "*" in policy_path:
+        pattern = policy_path.replace("*", ".*")
+        pattern = f"^{pattern}$"
+        try:
+            return bool(re.match(pattern, request_path))
+        except Exception:
+            return False
+    return False
+
+
+def _legacy_check(policies_by_role: Dict[str, List[List[str]]], roles: List[str], path: str, method: str) -> bool:
+    """原中间件逐角色获取 API 权限并逐条匹配的流程"""
+    for role in roles:
+        # 对应 get_api_permissions_for_role：每次请求重新遍历并拆分方法
+        api_permissions = []
+        for p in policies_by_role.get(role, []):
+            if len(p) >= 3 and p[2] not in ("menu", "button"):
+                method_list = p[2].split(",") if "," in p[2] else [p[2]]
+                api_permissions.append({"path": p[1], "method": method_list})
+        for api_perm in api_permissions:
+            if _legacy_match_path(path, api_perm["path"]):
+                if method in api_perm["method"] or "*" in api_perm["method"]:
+                    return True
+    return False
+
+
+def _timeit(func, requests, repeat: int) -> float:
+    """返回单次检查的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path, method in requests:
+            func(path, method)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(requests)) * 1_000_000
+
+
+def run(sizes=(10, 1_000, 50_000)):
+    print(f"{'policies':>10} | {'legacy (us)':>12} | {'index (us)':>11} | {'build (ms)':>10} | {'speedup':>8}")
+    print("-" * 64)
+    for size in sizes:
+        policies = _make_policies(size)
+        policies_by_role: Dict[str, List[List[str]]] = {}
+        for p in policies:
+            policies_by_role.setdefault(p[0], []).append(p)
+
+        rng = random.Random(size)
+        requests = []
+        for _ in range(200):
+            p = rng.choice(policies)
+            path = p[1].replace("*", "123")
+            requests.append((path, p[2].split(",")[0]))
+        # 混入未命中的请求（最坏情况：需要扫描全部策略）
+        requests.extend((f"/missing/path{i}", "GET") for i in range(50))
+
+        build_start = time.perf_counter()
+        index = ApiRouteIndex.from_casbin_policies(policies, roles=ROLES)
+        build_ms = (time.perf_counter() - build_start) * 1000
+
+        # 原实现在大规模策略下极慢，只取部分请求计时
+        legacy_requests = requests if size <= 1_000 else requests[:15] + requests[-5:]
+        legacy_repeat = max(1, 2_000 // size)
+        legacy_us = _timeit(lambda path, method: _legacy_check(policies_by_role, ROLES, path, method),
+                            legacy_requests, legacy_repeat)
+        index_us = _timeit(lambda path, method: index.match(path, method), requests, 20)
+
+        # 两种实现结果必须一致
+        for path, method in legacy_requests:
+            assert _legacy_check(policies_by_role, ROLES, path, method) == index.match(path, method), (path, method)
+
+        print(f"{size:>10} | {legacy_us:>12.2f} | {index_us:>11.2f} | {build_ms:>10.1f} | {legacy_us / index_us:>7.0f}x")
+
+
+if __name__ == "__main__":
+    run()
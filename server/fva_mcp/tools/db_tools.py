@@ -12,8 +12,10 @@ from typing import Optional
 
 import yaml
 from tortoise import Tortoise
+from tortoise.transactions import in_transaction
 
 from models import SystemRole, SystemDepartment, SystemPermission, SystemConfig, SystemOperationLog, SystemLoginLog
+from utils.casbin import DepartmentHelper
 
 
 def get_db_url() -> str:
@@ -369,17 +371,20 @@ def register(mcp):
             操作结果
         """
         async with get_db_connection():
-            dept = await SystemDepartment.create(
-                id=str(uuid.uuid4()),
-                name=name,
-                principal=principal,
-                parent_id=parent_id,
-                phone=phone,
-                email=email,
-                sort=sort,
-                status=status,
-                remark=remark
-            )
+            # 部门与闭包记录在同一事务中写入，新部门立即参与数据权限与子树查询
+            async with in_transaction():
+                dept = await SystemDepartment.create(
+                    id=str(uuid.uuid4()),
+                    name=name,
+                    principal=principal,
+                    parent_id=parent_id,
+                    phone=phone,
+                    email=email,
+                    sort=sort,
+                    status=status,
+                    remark=remark
+                )
+                await DepartmentHelper.on_department_created(dept.id, parent_id)
             
             return json.dumps({
                 "success": True,
@@ -459,8 +464,8 @@ def register(mcp):
             if children > 0:
                 return json.dumps({"success": False, "msg": "该部门下有子部门，无法删除"}, ensure_ascii=False)
             
-            dept.is_del = True
-            await dept.save()
+            # 同时移除闭包记录，已删除部门不再出现在上级部门的子树中
+            await DepartmentHelper.delete_department_subtree(dept_id)
             
             return json.dumps({"success": True, "msg": "部门删除成功"}, ensure_ascii=False)
 
@@ -4,17 +4,15 @@
 # @File : casbin.py
 # @Comment : Casbin 权限验证中间件 - RBAC + 部门层级数据权限
 
-from typing import List
+from typing import List, Optional
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
-from jose import jwt, ExpiredSignatureError
-from jose.exceptions import JWEInvalidAuth, JWEError
 
+from annotation.auth import AuthController
+from exceptions.exception import AuthException
 from utils.casbin import CasbinEnforcer, UserType
-from utils.config import config
 from utils.log import logger
-from utils.get_redis import RedisKeyConfig
 
 
 # 白名单路径 - 不需要权限验证
@@ -100,39 +98,10 @@ class CasbinMiddleware(BaseHTTPMiddleware):
         if user_type in (UserType.SUPER_ADMIN, UserType.ADMIN):
             return await call_next(request)
         
-        # 5. 使用 Casbin 检查 API 权限
+        # 5. 使用 Casbin 检查 API 权限（按角色集合预编译的路由索引，单次查找）
         try:
             user_id = str(user_info.get("user_id"))
-            
-            # 获取用户角色
-            roles = await CasbinEnforcer.get_roles_for_user(user_id)
-            has_permission = False
-            
-            # 检查用户角色的 API 权限
-            for role in roles:
-                try:
-                    # 获取角色的 API 权限列表
-                    api_permissions = await CasbinEnforcer.get_api_permissions_for_role(role)
-                    for api_perm in api_permissions:
-                        api_path = api_perm.get("path", "")
-                        api_methods = api_perm.get("method", [])
-                        
-                        # 检查路径匹配（支持通配符）
-                        if self._match_path(path, api_path):
-                            # 检查方法匹配
-                            if isinstance(api_methods, list):
-                                if method in api_methods or "*" in api_methods:
-                                    has_permission = True
-                                    break
-                            elif method == api_methods or api_methods == "*":
-                                has_permission = True
-                                break
-                    
-                    if has_permission:
-                        break
-                except Exception as role_err:
-                    logger.debug(f"检查角色 {role} 权限时出错: {role_err}")
-                    continue
+            has_permission = await CasbinEnforcer.check_api_access(user_id, path, method)
             
             if not has_permission:
                 logger.warning(f"权限拒绝: user={user_id}, path={path}, method={method}")
@@ -152,75 +121,29 @@ class CasbinMiddleware(BaseHTTPMiddleware):
             # 出错时放行，避免阻塞正常请求
             return await call_next(request)
     
-    def _match_path(self, request_path: str, policy_path: str) -> bool:
-        """路径匹配，支持通配符"""
-        import re
-        
-        # 精确匹配
-        if request_path == policy_path:
-            return True
+    async def _get_user_from_token(self, request: Request) -> Optional[dict]:
+        """
+        从 Token 解析用户信息
         
-        # 通配符匹配 - 将 * 转换为正则
-        if "*" in policy_path:
-            # /api/user/* -> /api/user/.*
-            pattern = policy_path.replace("*", ".*")
-            pattern = f"^{pattern}$"
-            try:
-                return bool(re.match(pattern, request_path))
-            except Exception:
-                return False
-        
-        return False
-    
-    async def _get_user_from_token(self, request: Request) -> dict:
-        """从 Token 解析用户信息"""
+        与 AuthController.get_current_user 共用同一请求级上下文，后续依赖注入和装饰器不再重复解析。
+        """
+        auth_header = request.headers.get("Authorization")
+        if not auth_header:
+            return None
         try:
-            auth_header = request.headers.get("Authorization")
-            if not auth_header:
-                return None
-            
-            token = auth_header
-            if token.startswith("Bearer "):
-                token = token.split(" ")[1]
-            
-            payload = jwt.decode(
-                token=token,
-                key=config.jwt().secret_key,
-                algorithms=[config.jwt().algorithm],
-            )
-            
-            user_id = payload.get("id")
-            session_id = payload.get("session_id")
-            
-            if not user_id:
-                return None
-            
-            # 验证 session 是否有效
-            redis = request.app.state.redis
-            redis_token = await redis.get(
-                f"{RedisKeyConfig.ACCESS_TOKEN.key}:{session_id}"
-            )
-            if not redis_token:
-                return None
-            
-            # 获取用户类型
-            from models import SystemUser
-            user = await SystemUser.filter(id=user_id, is_del=False).first()
-            if not user:
-                return None
-            
-            return {
-                "user_id": user_id,
-                "user_type": user.user_type,
-                "session_id": session_id,
-                "department_id": str(user.department_id) if user.department_id else None
-            }
-            
-        except (JWEInvalidAuth, ExpiredSignatureError, JWEError):
+            user = await AuthController.get_current_user(request, auth_header)
+        except AuthException:
             return None
         except Exception as e:
             logger.error(f"解析 Token 异常: {e}")
             return None
+        
+        return {
+            "user_id": str(user.get("id")),
+            "user_type": user.get("user_type"),
+            "session_id": getattr(request.state, "session_id", None),
+            "department_id": str(user.get("department_id")) if user.get("department_id") else None
+        }
 
 
 def add_casbin_middleware(app):
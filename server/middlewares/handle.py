@@ -10,6 +10,7 @@ from fastapi import FastAPI
 from middlewares.cors import add_cors_middleware
 from middlewares.gzip import add_gzip_middleware
 from middlewares.casbin import add_casbin_middleware
+from middlewares.request_stats import add_request_stats_middleware
 
 
 def handle_middleware(app: FastAPI):
@@ -22,3 +23,5 @@ def handle_middleware(app: FastAPI):
     add_gzip_middleware(app)
     # 加载Casbin权限中间件
     add_casbin_middleware(app)
+    # 加载请求调用统计中间件（最后加载即最外层，统计包含鉴权在内的全部调用）
+    add_request_stats_middleware(app)
@@ -0,0 +1,46 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : request_stats.py
+# @Comment : 请求级调用统计中间件 - 在响应头中返回本次请求的 Redis 命令数与数据库查询数
+import time
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from utils.config import config
+from utils.log import logger
+from utils.request_stats import begin_request_stats
+
+
+class RequestStatsMiddleware(BaseHTTPMiddleware):
+    """
+    请求级调用统计中间件
+
+    需作为最外层中间件加载，才能统计到鉴权中间件内的调用。
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        stats = begin_request_stats()
+        start = time.perf_counter()
+        response = await call_next(request)
+        cost_ms = (time.perf_counter() - start) * 1000
+        response.headers["X-Redis-Calls"] = str(stats.redis_calls)
+        response.headers["X-DB-Queries"] = str(stats.db_queries)
+        logger.debug(
+            f"{request.method} {request.url.path} redis={stats.redis_calls} "
+            f"db={stats.db_queries} cost={cost_ms:.1f}ms"
+        )
+        return response
+
+
+def add_request_stats_middleware(app: FastAPI):
+    """
+    添加请求级调用统计中间件（仅在 app.request_stats_enabled 开启时生效）
+
+    :param app: FastAPI对象
+    :return:
+    """
+    if config.app().request_stats_enabled:
+        app.add_middleware(RequestStatsMiddleware)
+        logger.info("请求调用统计中间件已加载")
@@ -8,18 +8,20 @@
 
 # 导出系统模型
 from models.config import SystemConfig
-from models.department import SystemDepartment
+from models.department import SystemDepartment, SystemDepartmentClosure
 from models.file import SystemFile
 from models.log import SystemLoginLog, SystemOperationLog
 from models.permission import SystemPermission
 from models.role import SystemRole
 from models.user import SystemUser, SystemUserRole
 from models.casbin import CasbinRule
-from models.notification import SystemNotification, UserNotification
+from models.notification import NotificationTarget, SystemNotification, UserNotification, UserNotificationWatermark
+from models.stats import SystemLoginDailyStat, SystemOperationDailyStat
 
 __all__ = [
     'SystemConfig',
     'SystemDepartment',
+    'SystemDepartmentClosure',
     'SystemFile',
     'SystemLoginLog',
     'SystemOperationLog',
@@ -29,4 +31,8 @@ __all__ = [
     'SystemUserRole',
     'CasbinRule',
     'SystemNotification',
-    'UserNotification',]
\ No newline at end of file
+    'UserNotification',
+    'NotificationTarget',
+    'UserNotificationWatermark',
+    'SystemLoginDailyStat',
+    'SystemOperationDailyStat',]
\ No newline at end of file
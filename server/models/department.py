@@ -115,3 +115,50 @@ class SystemDepartment(BaseModel):
         table = "system_department"
         table_description = "系统部门表"
         ordering = ["sort", "-created_at"]
+
+
+class SystemDepartmentClosure(BaseModel):
+    """
+    部门闭包表
+
+    为每一对 (祖先部门, 后代部门) 保存一行记录（含 depth=0 的自身记录），
+    子树查询、子树删除均可通过 ancestor_id 单次索引查询完成。
+    """
+
+    ancestor_id = fields.CharField(
+        max_length=50,
+        description="祖先部门ID",
+        source_field="ancestor_id"
+    )
+    """
+    祖先部门ID。
+    - 映射到数据库字段 ancestor_id。
+    """
+
+    descendant_id = fields.CharField(
+        max_length=50,
+        description="后代部门ID",
+        source_field="descendant_id"
+    )
+    """
+    后代部门ID。
+    - 映射到数据库字段 descendant_id。
+    """
+
+    depth = fields.IntField(
+        default=0,
+        description="层级距离（0表示自身）",
+        source_field="depth"
+    )
+    """
+    层级距离。
+    - 0 表示自身，1 表示直接下级，依此类推。
+    - 映射到数据库字段 depth。
+    """
+
+    class Meta:
+        table = "system_department_closure"
+        table_description = "系统部门闭包表"
+        unique_together = (("ancestor_id", "descendant_id"),)
+        indexes = (("descendant_id",),)
+        ordering = ["depth"]
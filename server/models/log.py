@@ -266,6 +266,64 @@ class SystemOperationLog(BaseModel):
     - 映射到数据库字段 response_result。
     """
 
+    payload_codec = fields.CharField(
+        max_length=10,
+        null=True,
+        description="载荷编码（none/zlib/zstd）",
+        source_field="payload_codec"
+    )
+    """
+    载荷编码。
+    - 为空表示旧记录，请求参数与返回结果保存在 request_params / response_result 文本字段。
+    - 非空时请求参数与返回结果保存在 request_payload / response_payload 二进制字段。
+    - 映射到数据库字段 payload_codec。
+    """
+
+    request_payload = fields.BinaryField(
+        null=True,
+        description="请求参数（截断、压缩后的原始字节）",
+        source_field="request_payload"
+    )
+    """
+    请求参数原始字节。
+    - 超过上限时截断，再按 payload_codec 压缩。
+    - 映射到数据库字段 request_payload。
+    """
+
+    request_size = fields.IntField(
+        null=True,
+        description="请求参数原始大小（字节）",
+        source_field="request_size"
+    )
+    """
+    请求参数原始大小。
+    - 截断前的字节数，用于判断是否被截断。
+    - 映射到数据库字段 request_size。
+    """
+
+    response_payload = fields.BinaryField(
+        null=True,
+        description="返回结果（截断、压缩后的原始字节）",
+        source_field="response_payload"
+    )
+    """
+    返回结果原始字节。
+    - 直接取响应体字节，不再反序列化与重新序列化。
+    - 超过上限时截断，再按 payload_codec 压缩。
+    - 映射到数据库字段 response_payload。
+    """
+
+    response_size = fields.IntField(
+        null=True,
+        description="返回结果原始大小（字节）",
+        source_field="response_size"
+    )
+    """
+    返回结果原始大小。
+    - 截断前的字节数，用于判断是否被截断。
+    - 映射到数据库字段 response_size。
+    """
+
     status = fields.SmallIntField(
         default=1,
         description="操作状态（1成功，0失败）",
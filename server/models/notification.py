@@ -30,6 +30,12 @@ class NotificationStatus(IntEnum):
     REVOKED = 2     # 已撤回
 
 
+class NotificationDelivery(IntEnum):
+    """通知投递方式"""
+    FANOUT_ON_WRITE = 0  # 发布时为每个目标用户创建用户通知记录
+    FANOUT_ON_READ = 1   # 只保存一份通知，读取时按范围合并，用户通知记录只表示已读
+
+
 class SystemNotification(BaseModel):
     """系统通知表"""
     
@@ -42,6 +48,7 @@ class SystemNotification(BaseModel):
     priority = fields.SmallIntField(default=0, description="优先级：0普通 1重要 2紧急")
     publish_time = fields.DatetimeField(null=True, description="发布时间")
     expire_time = fields.DatetimeField(null=True, description="过期时间")
+    delivery = fields.SmallIntField(default=0, description="投递方式：0发布时写入用户通知 1读取时合并")
     creator = fields.ForeignKeyField(
         "system.SystemUser",
         related_name="created_notifications",
@@ -79,3 +86,37 @@ class UserNotification(BaseModel):
         table_description = "用户通知关联表"
         unique_together = [("notification", "user")]
         ordering = ["-created_at"]
+
+
+class NotificationTarget(BaseModel):
+    """读时合并通知的目标部门表（部门范围通知每个指定部门一行，含下属部门的匹配在读取时按闭包表完成）"""
+    
+    notification = fields.ForeignKeyField(
+        "system.SystemNotification",
+        related_name="targets",
+        on_delete=fields.CASCADE,
+        description="通知"
+    )
+    department_id = fields.CharField(max_length=36, description="目标部门ID")
+    
+    class Meta:
+        table = "notification_target"
+        table_description = "通知目标部门表"
+        unique_together = [("notification", "department_id")]
+        indexes = [("department_id",)]
+
+
+class UserNotificationWatermark(BaseModel):
+    """用户读时合并通知的已读水位线（发布时间不晚于 read_at 的读时合并通知均视为已读）"""
+    
+    user = fields.OneToOneField(
+        "system.SystemUser",
+        related_name="notification_watermark",
+        on_delete=fields.CASCADE,
+        description="用户"
+    )
+    read_at = fields.DatetimeField(description="已读水位线")
+    
+    class Meta:
+        table = "user_notification_watermark"
+        table_description = "用户通知已读水位线表"
@@ -0,0 +1,193 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : stats.py
+# @Comment : 日志每日汇总表模型 - 工作台统计读取汇总数据，无需扫描全部日志
+from tortoise import fields
+
+from models.common import BaseModel
+
+
+class SystemLoginDailyStat(BaseModel):
+    """
+    登录日志每日汇总表
+
+    每个 (日期, 部门, 用户, 操作系统, 浏览器, 地区, 状态) 组合一行，count 为登录次数。
+    维度取值为空时保存空字符串，保证唯一约束生效。
+    """
+
+    stat_date = fields.DateField(
+        description="统计日期",
+        source_field="stat_date"
+    )
+    """
+    统计日期。
+    - 映射到数据库字段 stat_date。
+    """
+
+    department_id = fields.CharField(
+        max_length=36,
+        default="",
+        description="部门ID（写入时用户所属部门）",
+        source_field="department_id"
+    )
+    """
+    部门ID。
+    - 日志写入时用户所属的部门，用于部门数据权限过滤。
+    - 映射到数据库字段 department_id。
+    """
+
+    user_id = fields.CharField(
+        max_length=36,
+        description="用户ID",
+        source_field="user_id"
+    )
+    """
+    用户ID。
+    - 映射到数据库字段 user_id。
+    """
+
+    os = fields.CharField(
+        max_length=64,
+        default="",
+        description="操作系统",
+        source_field="os"
+    )
+    """
+    操作系统。
+    - 映射到数据库字段 os。
+    """
+
+    browser = fields.CharField(
+        max_length=64,
+        default="",
+        description="浏览器类型",
+        source_field="browser"
+    )
+    """
+    浏览器类型。
+    - 映射到数据库字段 browser。
+    """
+
+    location = fields.CharField(
+        max_length=128,
+        default="",
+        description="登录地点",
+        source_field="location"
+    )
+    """
+    登录地点。
+    - 映射到数据库字段 location。
+    """
+
+    status = fields.SmallIntField(
+        default=1,
+        description="登录状态（1成功，0失败）",
+        source_field="status"
+    )
+    """
+    登录状态。
+    - 映射到数据库字段 status。
+    """
+
+    count = fields.IntField(
+        default=0,
+        description="登录次数",
+        source_field="count"
+    )
+    """
+    登录次数。
+    - 映射到数据库字段 count。
+    """
+
+    class Meta:
+        table = "system_login_daily_stat"
+        table_description = "登录日志每日汇总表"
+        unique_together = (("stat_date", "department_id", "user_id", "os", "browser", "location", "status"),)
+        ordering = ["-stat_date"]
+
+
+class SystemOperationDailyStat(BaseModel):
+    """
+    操作日志每日汇总表
+
+    每个 (日期, 部门, 用户, 操作类型, 操作名称, 状态) 组合一行，count 为操作次数。
+    """
+
+    stat_date = fields.DateField(
+        description="统计日期",
+        source_field="stat_date"
+    )
+    """
+    统计日期。
+    - 映射到数据库字段 stat_date。
+    """
+
+    department_id = fields.CharField(
+        max_length=36,
+        default="",
+        description="部门ID（写入时用户所属部门）",
+        source_field="department_id"
+    )
+    """
+    部门ID。
+    - 日志写入时操作人所属的部门，用于部门数据权限过滤。
+    - 映射到数据库字段 department_id。
+    """
+
+    user_id = fields.CharField(
+        max_length=36,
+        default="",
+        description="操作人ID",
+        source_field="user_id"
+    )
+    """
+    操作人ID。
+    - 映射到数据库字段 user_id。
+    """
+
+    operation_type = fields.SmallIntField(
+        description="操作类型",
+        source_field="operation_type"
+    )
+    """
+    操作类型。
+    - 映射到数据库字段 operation_type。
+    """
+
+    operation_name = fields.CharField(
+        max_length=128,
+        default="",
+        description="操作名称",
+        source_field="operation_name"
+    )
+    """
+    操作名称。
+    - 映射到数据库字段 operation_name。
+    """
+
+    status = fields.SmallIntField(
+        default=1,
+        description="操作状态（1成功，0失败）",
+        source_field="status"
+    )
+    """
+    操作状态。
+    - 映射到数据库字段 status。
+    """
+
+    count = fields.IntField(
+        default=0,
+        description="操作次数",
+        source_field="count"
+    )
+    """
+    操作次数。
+    - 映射到数据库字段 count。
+    """
+
+    class Meta:
+        table = "system_operation_daily_stat"
+        table_description = "操作日志每日汇总表"
+        unique_together = (("stat_date", "department_id", "user_id", "operation_type", "operation_name", "status"),)
+        ordering = ["-stat_date"]
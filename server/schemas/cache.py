@@ -25,6 +25,7 @@ class CacheMonitor(BaseModel):
     connection_stats: Optional[dict] = Field(default={}, description='连接统计')
     performance_stats: Optional[dict] = Field(default={}, description='性能统计')
     key_space_stats: Optional[List] = Field(default=[], description='键空间统计')
+    local_cache_stats: Optional[dict] = Field(default={}, description='进程内缓存统计（当前工作进程）')
 
 
 class CacheInfo(BaseModel):
@@ -5,7 +5,7 @@
 # @File : common.py
 # @Software : PyCharm
 # @Comment : 本程序
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field, ConfigDict
 from pydantic.alias_generators import to_snake
@@ -32,6 +32,9 @@ class ListQueryResult(BaseModel):
     total: int = Field(default=0, description="总条数")
     page: int = Field(default=1, description="当前页码")
     pageSize: int = Field(default=10, description="每页数量")
+    nextCursor: Optional[str] = Field(default=None, description="下一页游标，无下一页时为空")
+    hasMore: bool = Field(default=False, description="是否有下一页")
+    totalExact: bool = Field(default=True, description="总条数是否为精确值")
 
 
 class DeleteListParams(BaseModel):
@@ -5,7 +5,7 @@
 # @File : log.py
 # @Software : PyCharm
 # @Comment : 本程序
-from pydantic import Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict
 
 from schemas.common import BaseResponse, ListQueryResult, DataBaseModel
 
@@ -55,8 +55,6 @@ class OperationLogInfo(DataBaseModel):
     operation_type: int = Field(default=1, description="操作类型")
     request_path: str = Field(default="", description="请求路径")
     request_method: str = Field(default="", description="请求方法")
-    request_params: str = Field(default="", description="请求参数")
-    request_result: str = Field(default="", description="请求结果")
     host: str = Field(default="", description="请求主机")
     location: str = Field(default="", description="请求地址")
     browser: str = Field(default="", description="请求浏览器")
@@ -83,3 +81,22 @@ class GetOperationLogResponse(BaseResponse):
     获取操作日志响应
     """
     data: OperationLogResult = Field(default=[], description="操作日志查询结果")
+
+
+class OperationLogPayload(BaseModel):
+    """
+    操作日志载荷
+    """
+    model_config = ConfigDict()
+    id: str = Field(default="", description="操作日志ID")
+    request_params: str = Field(default="", description="请求参数")
+    response_result: str = Field(default="", description="返回结果")
+    request_truncated: bool = Field(default=False, description="请求参数是否被截断")
+    response_truncated: bool = Field(default=False, description="返回结果是否被截断")
+
+
+class GetOperationLogPayloadResponse(BaseResponse):
+    """
+    获取操作日志载荷响应
+    """
+    data: OperationLogPayload = Field(default=None, description="操作日志载荷")
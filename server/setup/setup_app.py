@@ -245,6 +245,8 @@ async def init_database_tables(db_config: DatabaseConfig):
     tables_to_drop = [
         "system_user_role",
         "user_notification",
+        "user_notification_watermark",
+        "notification_target",
         "system_login_log",
         "system_operation_log",
         "system_user", 
@@ -6,16 +6,22 @@
 
 import os
 import tempfile
+import time
 import casbin
-from typing import List, Optional, Set, Dict
+from typing import List, Optional, Set, Dict, Tuple
 from enum import IntEnum
 
 from redis.asyncio import Redis as AsyncRedis
+from tortoise.transactions import in_transaction
 
-from models import SystemConfig, SystemDepartment, SystemUser
+from models import SystemConfig, SystemDepartment, SystemDepartmentClosure, SystemUser
 from models.casbin import CasbinRule
+from utils.casbin_adapter import BulkPolicyAdapter
+from utils.casbin_watcher import CasbinPolicyWatcher
+from utils.config import config
 from utils.get_redis import RedisKeyConfig
 from utils.log import logger
+from utils.route_index import ApiRouteIndex
 
 
 class UserType(IntEnum):
@@ -61,27 +67,36 @@ m = g(r.sub, p.sub) && (r.obj == p.obj || keyMatch2(r.obj, p.obj)) && (r.act ==
 
 
 class DepartmentHelper:
-    """部门层级辅助类"""
+    """
+    部门层级辅助类
+    
+    层级关系维护在闭包表 system_department_closure 中（每对祖先/后代一行），
+    子树、祖先查询均为单次索引查询；部门新增、移动、删除时同步维护。
+    """
     
     @classmethod
     async def get_child_department_ids(cls, dept_id: str, include_self: bool = True) -> Set[str]:
         """获取部门及其所有下属部门ID（不过滤状态）"""
-        result = set()
+        dept_id = str(dept_id)
+        query = SystemDepartmentClosure.filter(ancestor_id=dept_id)
+        if not include_self:
+            query = query.filter(depth__gt=0)
+        result = {str(d) for d in await query.values_list("descendant_id", flat=True)}
         if include_self:
             result.add(dept_id)
-        
-        async def get_children(parent_id: str):
-            children = await SystemDepartment.filter(
-                parent_id=parent_id,
-                is_del=False
-            ).values_list("id", flat=True)
-            
-            for child_id in children:
-                child_id_str = str(child_id)
-                result.add(child_id_str)
-                await get_children(child_id_str)
-        
-        await get_children(dept_id)
+        return result
+    
+    @classmethod
+    async def get_ancestor_department_ids(cls, dept_id: str, include_self: bool = True) -> List[str]:
+        """获取部门的所有上级部门ID，按层级由近及远排序"""
+        dept_id = str(dept_id)
+        query = SystemDepartmentClosure.filter(descendant_id=dept_id)
+        if not include_self:
+            query = query.filter(depth__gt=0)
+        rows = await query.order_by("depth").values_list("ancestor_id", flat=True)
+        result = [str(a) for a in rows]
+        if include_self and dept_id not in result:
+            result.insert(0, dept_id)
         return result
     
     @classmethod
@@ -91,6 +106,127 @@ class DepartmentHelper:
             is_del=False
         ).values_list("id", flat=True)
         return {str(d) for d in depts}
+    
+    # ==================== 闭包表维护 ====================
+    
+    @classmethod
+    async def on_department_created(cls, dept_id: str, parent_id: Optional[str] = None):
+        """新增部门后写入闭包记录：自身 + 父部门的全部祖先"""
+        dept_id = str(dept_id)
+        rows = [SystemDepartmentClosure(ancestor_id=dept_id, descendant_id=dept_id, depth=0)]
+        if parent_id:
+            ancestors = await SystemDepartmentClosure.filter(
+                descendant_id=str(parent_id)
+            ).values_list("ancestor_id", "depth")
+            rows.extend(
+                SystemDepartmentClosure(ancestor_id=ancestor_id, descendant_id=dept_id, depth=depth + 1)
+                for ancestor_id, depth in ancestors
+            )
+        await SystemDepartmentClosure.bulk_create(rows)
+    
+    @classmethod
+    async def move_department(cls, dept_id: str, new_parent_id: Optional[str]) -> bool:
+        """
+        移动部门（连同整棵子树）到新的上级部门下
+        
+        :param dept_id: 部门ID
+        :param new_parent_id: 新上级部门ID，为空表示移动为顶级部门
+        :return: 目标上级为自身或下级部门时返回 False，不做任何修改
+        """
+        dept_id = str(dept_id)
+        new_parent_id = str(new_parent_id) if new_parent_id else None
+        subtree = await SystemDepartmentClosure.filter(
+            ancestor_id=dept_id
+        ).values_list("descendant_id", "depth")
+        subtree_ids = [str(d) for d, _ in subtree]
+        if new_parent_id and (new_parent_id == dept_id or new_parent_id in subtree_ids):
+            return False
+        
+        async with in_transaction():
+            if not subtree:
+                # 闭包表中缺失该部门（历史数据），补写自身记录
+                subtree = [(dept_id, 0)]
+                subtree_ids = [dept_id]
+                await SystemDepartmentClosure.create(ancestor_id=dept_id, descendant_id=dept_id, depth=0)
+            
+            # 断开子树与原祖先之间的关联
+            old_ancestors = await SystemDepartmentClosure.filter(
+                descendant_id=dept_id, depth__gt=0
+            ).values_list("ancestor_id", flat=True)
+            if old_ancestors:
+                await SystemDepartmentClosure.filter(
+                    ancestor_id__in=list(old_ancestors), descendant_id__in=subtree_ids
+                ).delete()
+            
+            # 建立子树与新祖先之间的关联
+            if new_parent_id:
+                new_ancestors = await SystemDepartmentClosure.filter(
+                    descendant_id=new_parent_id
+                ).values_list("ancestor_id", "depth")
+                rows = [
+                    SystemDepartmentClosure(
+                        ancestor_id=ancestor_id,
+                        descendant_id=str(descendant_id),
+                        depth=ancestor_depth + descendant_depth + 1
+                    )
+                    for ancestor_id, ancestor_depth in new_ancestors
+                    for descendant_id, descendant_depth in subtree
+                ]
+                if rows:
+                    await SystemDepartmentClosure.bulk_create(rows, batch_size=1000)
+        return True
+    
+    @classmethod
+    async def delete_department_subtree(cls, dept_id: str) -> Set[str]:
+        """
+        软删除部门及其全部下属部门，并移除对应闭包记录
+        
+        :return: 被删除的部门ID集合
+        """
+        dept_ids = await cls.get_child_department_ids(dept_id)
+        async with in_transaction():
+            await SystemDepartment.filter(id__in=list(dept_ids), is_del=False).update(is_del=True)
+            await SystemDepartmentClosure.filter(descendant_id__in=list(dept_ids)).delete()
+        return dept_ids
+    
+    @classmethod
+    async def rebuild_closure(cls) -> int:
+        """
+        根据 parent_id 全量重建闭包表（一次读取全部部门，在内存中计算）
+        
+        :return: 写入的闭包记录数
+        """
+        rows = await SystemDepartment.filter(is_del=False).values_list("id", "parent_id")
+        parent_map = {str(dept_id): (str(parent_id) if parent_id else None) for dept_id, parent_id in rows}
+        
+        closure = []
+        for dept_id in parent_map:
+            current, depth, seen = dept_id, 0, set()
+            # 上级部门已删除或不存在时链路中断，与原递归查询语义一致；seen 用于防御脏数据成环
+            while current is not None and current in parent_map and current not in seen:
+                seen.add(current)
+                closure.append(SystemDepartmentClosure(ancestor_id=current, descendant_id=dept_id, depth=depth))
+                current = parent_map[current]
+                depth += 1
+        
+        async with in_transaction():
+            await SystemDepartmentClosure.all().delete()
+            if closure:
+                await SystemDepartmentClosure.bulk_create(closure, batch_size=1000)
+        return len(closure)
+    
+    @classmethod
+    async def ensure_closure(cls):
+        """启动时校验闭包表，自身记录数与部门数不一致时全量重建"""
+        dept_count = await SystemDepartment.filter(is_del=False).count()
+        self_count = await SystemDepartmentClosure.filter(depth=0).count()
+        if dept_count != self_count:
+            try:
+                count = await cls.rebuild_closure()
+                logger.info(f"部门闭包表已重建，共 {dept_count} 个部门，{count} 条记录")
+            except Exception as e:
+                # 多进程同时启动时可能并发重建，以先完成者为准
+                logger.warning(f"部门闭包表重建失败: {e}")
 
 
 class CasbinEnforcer:
@@ -112,6 +248,12 @@ class CasbinEnforcer:
     _enforcer: Optional[casbin.Enforcer] = None
     _redis: Optional[AsyncRedis] = None
     _model_path: Optional[str] = None
+    _watcher: Optional[CasbinPolicyWatcher] = None
+    # 按角色集合缓存的 API 路由索引，策略变更时整体失效
+    _route_index_cache: Dict[Tuple[str, ...], ApiRouteIndex] = {}
+    _ROUTE_INDEX_CACHE_SIZE = 1024
+    # 最近一次策略加载的耗时与行数统计
+    _load_stats: Dict[str, object] = {}
     
     @classmethod
     async def init(cls, redis: AsyncRedis) -> casbin.Enforcer:
@@ -124,8 +266,17 @@ class CasbinEnforcer:
         try:
             model_text = await cls._get_model_from_redis()
             cls._model_path = cls._write_model_to_temp_file(model_text)
-            cls._enforcer = casbin.Enforcer(cls._model_path)
-            await cls._load_policy_from_db()
+            
+            # 先读取同步版本号再加载策略，加载期间产生的变更会通过订阅补齐
+            cls._watcher = CasbinPolicyWatcher(
+                redis, apply=cls._apply_policy_delta, reload=cls._reload_from_watcher
+            )
+            version = await cls._watcher.get_remote_version()
+            # 冷启动时是否优先使用本地策略快照由 app.casbin_snapshot_enabled 控制
+            snapshot_enabled = config.app().casbin_snapshot_enabled
+            await cls._load_policy(snapshot_version=version if snapshot_enabled else None)
+            await cls._watcher.mark_loaded(version)
+            cls._watcher.start()
             
             logger.success("Casbin Enforcer 初始化成功")
             return cls._enforcer
@@ -134,6 +285,12 @@ class CasbinEnforcer:
             logger.error(f"Casbin Enforcer 初始化失败: {e}")
             raise
     
+    @classmethod
+    async def shutdown(cls):
+        """停止策略同步任务"""
+        if cls._watcher is not None:
+            await cls._watcher.stop()
+    
     @classmethod
     def _write_model_to_temp_file(cls, model_text: str) -> str:
         """将模型配置写入临时文件"""
@@ -176,21 +333,45 @@ class CasbinEnforcer:
         return model_text
     
     @classmethod
-    async def _load_policy_from_db(cls):
-        """从数据库加载策略到 Enforcer"""
-        rules = await CasbinRule.filter(is_del=False).all()
+    async def _load_policy(cls, snapshot_version: Optional[int] = None):
+        """
+        批量加载策略并整体替换 Enforcer
         
-        for rule in rules:
-            if rule.ptype == 'p':
-                policy = [v for v in [rule.v0, rule.v1, rule.v2, rule.v3, rule.v4, rule.v5] if v]
-                if policy:
-                    cls._enforcer.add_policy(*policy)
-            elif rule.ptype == 'g':
-                grouping = [v for v in [rule.v0, rule.v1, rule.v2] if v]
-                if grouping:
-                    cls._enforcer.add_grouping_policy(*grouping)
+        新 Enforcer 构建完成前旧策略持续生效，不存在清空后重新加载的空窗期。
         
-        logger.info(f"从数据库加载了 {len(rules)} 条 Casbin 策略")
+        :param snapshot_version: 冷启动时传入当前策略同步版本号，版本号与行数一致时直接使用本地快照，
+                                 从数据库加载后以该版本号刷新快照；为 None 时始终读取数据库
+        """
+        start = time.perf_counter()
+        adapter = None
+        if snapshot_version is not None:
+            db_rows = await CasbinRule.filter(is_del=False).count()
+            adapter = await BulkPolicyAdapter.from_snapshot(version=snapshot_version, rows=db_rows)
+        if adapter is None:
+            adapter = await BulkPolicyAdapter.from_db()
+        
+        cls._enforcer = casbin.Enforcer(cls._model_path, adapter)
+        cls._on_policy_changed()
+        
+        cls._load_stats = {
+            "source": adapter.source,
+            "rows": adapter.rows,
+            **adapter.stats,
+            "total_ms": round((time.perf_counter() - start) * 1000, 2),
+            "loaded_at": int(time.time()),
+        }
+        logger.info(
+            f"从{'本地快照' if adapter.source == 'snapshot' else '数据库'}加载了 {adapter.rows} 条 Casbin 策略，"
+            f"耗时 {cls._load_stats['total_ms']}ms"
+        )
+        
+        if snapshot_version is not None and adapter.source == "db":
+            await adapter.save_snapshot(snapshot_version, adapter.stats.get("db_rows", adapter.rows))
+    
+    @classmethod
+    def get_load_stats(cls) -> dict:
+        """获取最近一次策略加载统计（来源、行数、读取/构建耗时）"""
+        return dict(cls._load_stats)
     
     @classmethod
     async def _save_policy_to_db(cls, ptype: str, rule: List[str]):
@@ -223,6 +404,92 @@ class CasbinEnforcer:
             raise RuntimeError("Casbin Enforcer 未初始化")
         return cls._enforcer
 
+    @classmethod
+    def _on_policy_changed(cls):
+        """p 策略变更后的回调：使已编译的路由索引失效"""
+        cls._route_index_cache.clear()
+
+    # ==================== 跨进程策略同步 ====================
+
+    @classmethod
+    async def _notify(cls, op: str, *args):
+        """向其他进程广播本地已生效的策略变更"""
+        if cls._watcher is not None:
+            await cls._watcher.publish(op, *args)
+
+    @classmethod
+    async def _apply_policy_delta(cls, op: str, args: List):
+        """应用其他进程广播的增量变更（仅修改内存中的 Enforcer，不写数据库）"""
+        enforcer = cls.get_enforcer()
+        if op == "add_policy":
+            enforcer.add_policy(*args)
+        elif op == "remove_policy":
+            enforcer.remove_policy(*args)
+        elif op == "remove_filtered_policy":
+            enforcer.remove_filtered_policy(int(args[0]), *args[1:])
+        elif op == "add_grouping_policy":
+            enforcer.add_grouping_policy(*args)
+        elif op == "remove_grouping_policy":
+            enforcer.remove_grouping_policy(*args)
+        elif op == "delete_role":
+            enforcer.delete_role(args[0])
+        elif op == "delete_user":
+            enforcer.delete_user(args[0])
+        else:
+            raise ValueError(f"未知的 Casbin 同步操作: {op}")
+        cls._on_policy_changed()
+
+    @classmethod
+    async def _reload_from_watcher(cls, op: str):
+        """同步器触发的全量重载（不再向外广播）"""
+        if op == "reload_model":
+            await cls.reload_model(broadcast=False)
+        else:
+            await cls.reload_policy(broadcast=False)
+
+    @classmethod
+    def get_sync_status(cls) -> dict:
+        """获取策略同步状态"""
+        if cls._watcher is None:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "worker_id": cls._watcher.worker_id,
+            "local_version": cls._watcher.local_version,
+            **cls._watcher.stats,
+            "load": cls.get_load_stats(),
+        }
+
+    # ==================== API 路由索引 ====================
+
+    @classmethod
+    def get_api_route_index(cls, roles: List[str]) -> ApiRouteIndex:
+        """
+        获取角色集合对应的已编译 API 路由索引
+
+        同一角色集合只在首次访问或策略变更后构建一次
+        """
+        key = tuple(sorted(set(roles)))
+        index = cls._route_index_cache.get(key)
+        if index is None:
+            enforcer = cls.get_enforcer()
+            policies = []
+            for role in key:
+                policies.extend(enforcer.get_permissions_for_user(role))
+            index = ApiRouteIndex.from_casbin_policies(policies)
+            if len(cls._route_index_cache) >= cls._ROUTE_INDEX_CACHE_SIZE:
+                cls._route_index_cache.clear()
+            cls._route_index_cache[key] = index
+        return index
+
+    @classmethod
+    async def check_api_access(cls, user_id: str, path: str, method: str) -> bool:
+        """通过已编译的路由索引检查用户角色是否拥有 API 访问权限"""
+        roles = await cls.get_roles_for_user(user_id)
+        if not roles:
+            return False
+        return cls.get_api_route_index(roles).match(path, method)
+
     # ==================== 数据权限核心方法 ====================
     
     @classmethod
@@ -321,6 +588,8 @@ class CasbinEnforcer:
         result = enforcer.add_policy(*rule)
         if result:
             await cls._save_policy_to_db('p', rule)
+            cls._on_policy_changed()
+            await cls._notify("add_policy", *rule)
         return result
     
     @classmethod
@@ -333,14 +602,18 @@ class CasbinEnforcer:
             result = enforcer.remove_policy(*rule)
             if result:
                 await cls._remove_policy_from_db('p', rule)
+                await cls._notify("remove_policy", *rule)
         else:
-            # 移除所有类型
+            # 移除所有类型（含同一对象上的 API 权限）
             result = enforcer.remove_filtered_policy(0, role_code, permission_id)
             if result:
                 await CasbinRule.filter(
                     ptype='p', v0=role_code, v1=permission_id, is_del=False
                 ).update(is_del=True)
+                await cls._notify("remove_filtered_policy", 0, role_code, permission_id)
         
+        if result:
+            cls._on_policy_changed()
         return result
     
     @classmethod
@@ -362,6 +635,8 @@ class CasbinEnforcer:
         result = enforcer.add_policy(*rule)
         if result:
             await cls._save_policy_to_db('p', rule)
+            cls._on_policy_changed()
+            await cls._notify("add_policy", *rule)
         return result
     
     @classmethod
@@ -374,13 +649,17 @@ class CasbinEnforcer:
             result = enforcer.remove_policy(*rule)
             if result:
                 await cls._remove_policy_from_db('p', rule)
+                await cls._notify("remove_policy", *rule)
         else:
             result = enforcer.remove_filtered_policy(0, role_code, api_path)
             if result:
                 await CasbinRule.filter(
                     ptype='p', v0=role_code, v1=api_path, is_del=False
                 ).update(is_del=True)
+                await cls._notify("remove_filtered_policy", 0, role_code, api_path)
         
+        if result:
+            cls._on_policy_changed()
         return result
     
     @classmethod
@@ -469,6 +748,7 @@ class CasbinEnforcer:
         result = enforcer.add_grouping_policy(user_id, role_code)
         if result:
             await cls._save_policy_to_db('g', [user_id, role_code])
+            await cls._notify("add_grouping_policy", user_id, role_code)
         return result
     
     @classmethod
@@ -478,6 +758,7 @@ class CasbinEnforcer:
         result = enforcer.remove_grouping_policy(user_id, role_code)
         if result:
             await cls._remove_policy_from_db('g', [user_id, role_code])
+            await cls._notify("remove_grouping_policy", user_id, role_code)
         return result
     
     @classmethod
@@ -530,6 +811,8 @@ class CasbinEnforcer:
             await CasbinRule.filter(
                 ptype='p', v0=role_code, is_del=False
             ).update(is_del=True)
+            cls._on_policy_changed()
+            await cls._notify("delete_role", role_code)
         return result
     
     @classmethod
@@ -541,6 +824,7 @@ class CasbinEnforcer:
             await CasbinRule.filter(
                 ptype='g', v0=user_id, is_del=False
             ).update(is_del=True)
+            await cls._notify("delete_user", user_id)
         return result
 
     # ==================== 用户权限查询 ====================
@@ -610,16 +894,24 @@ class CasbinEnforcer:
     # ==================== 策略管理 ====================
     
     @classmethod
-    async def reload_policy(cls) -> None:
-        """重新加载策略"""
-        enforcer = cls.get_enforcer()
-        enforcer.clear_policy()
-        await cls._load_policy_from_db()
+    async def reload_policy(cls, broadcast: bool = True) -> None:
+        """
+        重新加载策略
+        
+        :param broadcast: 是否通知其他进程同样全量重载
+        """
+        await cls._load_policy()
+        if broadcast:
+            await cls._notify("reload")
         logger.info("Casbin 策略已重新加载")
     
     @classmethod
-    async def reload_model(cls) -> None:
-        """重新加载模型配置"""
+    async def reload_model(cls, broadcast: bool = True) -> None:
+        """
+        重新加载模型配置
+        
+        :param broadcast: 是否通知其他进程同样重新加载模型
+        """
         if not cls._redis:
             raise RuntimeError("Redis 未初始化")
         
@@ -631,8 +923,9 @@ class CasbinEnforcer:
             os.remove(cls._model_path)
         
         cls._model_path = cls._write_model_to_temp_file(model_text)
-        cls._enforcer = casbin.Enforcer(cls._model_path)
-        await cls._load_policy_from_db()
+        await cls._load_policy()
+        if broadcast:
+            await cls._notify("reload_model")
         
         logger.info("Casbin 模型配置已重新加载")
     
@@ -0,0 +1,188 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : casbin_adapter.py
+# @Comment : Casbin 批量策略加载适配器 - 分块读取 CasbinRule 元组、一次性构建策略模型，支持本地快照冷启动
+
+import asyncio
+import gzip
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from casbin import persist
+
+from models.casbin import CasbinRule
+from utils.log import logger
+
+# 默认快照路径（与日志目录一致，基于运行目录）
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.getcwd(), "cache", "casbin_policy.snapshot")
+# 与 casbin.model.policy.DEFAULT_SEP 一致，用于构建 policy_map 键
+POLICY_SEP = ","
+# 快照格式版本，结构变化时递增使旧快照失效
+SNAPSHOT_FORMAT = 1
+
+
+class BulkPolicyAdapter(persist.Adapter):
+    """
+    批量策略适配器
+
+    策略在异步阶段预先读取（数据库或快照），Enforcer.load_policy() 时一次性写入模型：
+    - 直接扩展 assertion.policy 并建立 policy_map，避免逐条 add_policy 的线性查重
+    - 由 casbin 在新模型上构建角色链接后整体替换，加载期间旧策略持续可用
+    - 只负责加载，增删改由 CasbinEnforcer 自行落库，因此其余接口保持空实现
+    """
+
+    def __init__(self, p_rules: List[List[str]], g_rules: List[List[str]], source: str = "db"):
+        self.p_rules = p_rules
+        self.g_rules = g_rules
+        self.source = source
+        self.stats: Dict[str, float] = {}
+
+    @property
+    def rows(self) -> int:
+        return len(self.p_rules) + len(self.g_rules)
+
+    def load_policy(self, model):
+        """将预读的策略批量写入模型"""
+        start = time.perf_counter()
+        p_count = self._extend(model, "p", "p", self.p_rules)
+        g_count = self._extend(model, "g", "g", self.g_rules)
+        self.stats.update({
+            "p_rules": p_count,
+            "g_rules": g_count,
+            "duplicates": self.rows - p_count - g_count,
+            "build_ms": round((time.perf_counter() - start) * 1000, 2),
+        })
+
+    @staticmethod
+    def _extend(model, sec: str, ptype: str, rules: List[List[str]]) -> int:
+        """去重后追加到 assertion，返回实际写入条数"""
+        if sec not in model.model or ptype not in model.model[sec]:
+            return 0
+        assertion = model.model[sec][ptype]
+        policy_map = assertion.policy_map
+        for rule in rules:
+            key = POLICY_SEP.join(rule)
+            if key in policy_map:
+                continue
+            policy_map[key] = len(assertion.policy)
+            assertion.policy.append(rule)
+        return len(assertion.policy)
+
+    # ==================== 数据源 ====================
+
+    @classmethod
+    async def from_db(cls, chunk_size: int = 5000) -> "BulkPolicyAdapter":
+        """
+        分块读取数据库中的有效策略
+
+        按主键做键集分页，每块只取元组而不实例化模型对象。
+        """
+        start = time.perf_counter()
+        p_rules: List[List[str]] = []
+        g_rules: List[List[str]] = []
+        last_id = None
+        chunks = 0
+        db_rows = 0
+        while True:
+            query = CasbinRule.filter(is_del=False)
+            if last_id is not None:
+                query = query.filter(id__gt=last_id)
+            rows = await query.order_by("id").limit(chunk_size).values_list(
+                "id", "ptype", "v0", "v1", "v2", "v3", "v4", "v5"
+            )
+            if not rows:
+                break
+            chunks += 1
+            db_rows += len(rows)
+            for row in rows:
+                ptype = row[1]
+                if ptype == "p":
+                    rule = [v for v in row[2:] if v]
+                    if rule:
+                        p_rules.append(rule)
+                elif ptype == "g":
+                    rule = [v for v in row[2:5] if v]
+                    if rule:
+                        g_rules.append(rule)
+            last_id = rows[-1][0]
+            if len(rows) < chunk_size:
+                break
+
+        adapter = cls(p_rules, g_rules, source="db")
+        adapter.stats.update({
+            "chunks": chunks,
+            "db_rows": db_rows,
+            "fetch_ms": round((time.perf_counter() - start) * 1000, 2),
+        })
+        return adapter
+
+    @classmethod
+    async def from_snapshot(
+            cls,
+            path: str = DEFAULT_SNAPSHOT_PATH,
+            version: Optional[int] = None,
+            rows: Optional[int] = None,
+    ) -> Optional["BulkPolicyAdapter"]:
+        """
+        从本地快照加载策略
+
+        :param path: 快照文件路径
+        :param version: 期望的策略同步版本号，不一致则视为过期
+        :param rows: 期望的有效策略行数，不一致则视为过期
+        :return: 快照不存在、损坏或过期时返回 None
+        """
+        if not os.path.exists(path):
+            return None
+        start = time.perf_counter()
+        try:
+            data = await asyncio.to_thread(cls._read_snapshot, path)
+        except Exception as e:
+            logger.warning(f"Casbin 策略快照读取失败，改为从数据库加载: {e}")
+            return None
+
+        if data.get("format") != SNAPSHOT_FORMAT:
+            return None
+        if version is not None and data.get("version") != version:
+            return None
+        if rows is not None and data.get("rows") != rows:
+            return None
+
+        adapter = cls(data.get("p") or [], data.get("g") or [], source="snapshot")
+        adapter.stats["fetch_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return adapter
+
+    async def save_snapshot(self, version: int, rows: int, path: str = DEFAULT_SNAPSHOT_PATH):
+        """
+        将当前策略写入本地快照（gzip 压缩的 JSON，先写临时文件再原子替换）
+
+        :param version: 策略同步版本号
+        :param rows: 数据库中的有效策略行数（含被过滤的空行），用于校验
+        """
+        data = {
+            "format": SNAPSHOT_FORMAT,
+            "version": version,
+            "rows": rows,
+            "created_at": int(time.time()),
+            "p": self.p_rules,
+            "g": self.g_rules,
+        }
+        try:
+            await asyncio.to_thread(self._write_snapshot, path, data)
+        except Exception as e:
+            logger.warning(f"Casbin 策略快照写入失败: {e}")
+
+    @staticmethod
+    def _read_snapshot(path: str) -> dict:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_snapshot(path: str, data: dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
@@ -0,0 +1,244 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : casbin_watcher.py
+# @Comment : Casbin 策略跨进程同步 - 基于 Redis Pub/Sub 广播增量变更，版本号断档时全量重载
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+
+from utils.get_redis import RedisKeyConfig
+from utils.log import logger
+
+# 增量应用回调：(op, args) -> None
+ApplyCallback = Callable[[str, List[Any]], Awaitable[None]]
+# 全量重载回调：(op) -> None，op 为 reload / reload_model
+ReloadCallback = Callable[[str], Awaitable[None]]
+
+# 需要全量处理的操作
+FULL_RELOAD_OPS = ("reload", "reload_model")
+
+
+class CasbinPolicyWatcher:
+    """
+    Casbin 策略同步器
+
+    - 每次策略变更先 INCR 全局版本号，再把 {版本号, 来源进程, 操作, 参数} 发布到频道
+    - 各进程按版本号顺序增量应用；收到乱序消息先暂存，等待断档补齐
+    - 断档超过 gap_timeout 秒仍未补齐（消息丢失、断线重连等）时回退为全量重载
+    - 定期轮询版本号，发现落后同样按断档处理
+    - 远端版本号小于本地（版本号键被删除、Redis 清空或重启未持久化）视为分歧，立即全量重载并以远端版本号为准
+    """
+
+    def __init__(
+            self,
+            redis: AsyncRedis,
+            apply: ApplyCallback,
+            reload: ReloadCallback,
+            gap_timeout: float = 2.0,
+            poll_interval: float = 30.0,
+    ):
+        self.redis = redis
+        self._apply = apply
+        self._reload = reload
+        self.gap_timeout = gap_timeout
+        self.poll_interval = poll_interval
+
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.channel = f"{RedisKeyConfig.CASBIN_POLICY.key}:channel"
+        self.version_key = f"{RedisKeyConfig.CASBIN_POLICY.key}:version"
+
+        self.local_version = 0
+        self._pending: Dict[int, dict] = {}
+        self._gap_since: Optional[float] = None
+        self._last_poll = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+        self.stats = {"published": 0, "applied": 0, "skipped": 0, "full_reloads": 0}
+
+    # ==================== 版本号 ====================
+
+    async def get_remote_version(self) -> int:
+        """读取 Redis 中的全局策略版本号"""
+        value = await self.redis.get(self.version_key)
+        return int(value) if value else 0
+
+    async def mark_loaded(self, version: Optional[int] = None):
+        """
+        标记本进程已加载到指定版本（全量加载前读取版本号后调用）
+        """
+        if version is None:
+            version = await self.get_remote_version()
+        self.local_version = version
+        for v in [v for v in self._pending if v <= version]:
+            self._pending.pop(v)
+        self._gap_since = time.monotonic() if self._pending else None
+
+    # ==================== 发布 ====================
+
+    async def publish(self, op: str, *args: Any) -> Optional[int]:
+        """
+        发布一条策略变更
+
+        :param op: 操作名（add_policy / remove_policy / remove_filtered_policy /
+                   add_grouping_policy / remove_grouping_policy / delete_role /
+                   delete_user / reload / reload_model）
+        :param args: 操作参数
+        :return: 本次变更的版本号，发布失败返回 None
+        """
+        try:
+            version = await self.redis.incr(self.version_key)
+            message = json.dumps(
+                {"v": version, "w": self.worker_id, "op": op, "args": list(args)},
+                ensure_ascii=False,
+            )
+            await self.redis.publish(self.channel, message)
+            self.stats["published"] += 1
+            return version
+        except RedisError as e:
+            logger.warning(f"Casbin 策略变更广播失败 op={op}: {e}")
+            return None
+
+    # ==================== 订阅 ====================
+
+    def start(self):
+        """启动后台订阅任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="casbin-policy-watcher")
+
+    async def stop(self):
+        """停止后台订阅任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """订阅主循环，断线后自动重连"""
+        backoff = 1.0
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                logger.info(f"Casbin 策略同步已订阅 {self.channel}（worker={self.worker_id}）")
+                # 订阅建立前可能错过消息，立即对一次版本号
+                await self._check_remote_version()
+                backoff = 1.0
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        await self._on_message(message.get("data"))
+                    await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Casbin 策略同步连接异常，{backoff:.0f} 秒后重连: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def _on_message(self, data: Any):
+        """处理一条变更消息"""
+        try:
+            message = json.loads(data)
+            version = int(message["v"])
+        except (TypeError, ValueError, KeyError) as e:
+            logger.warning(f"忽略无法解析的 Casbin 同步消息: {e}")
+            return
+
+        async with self._lock:
+            if version <= self.local_version:
+                # 版本号被重置后新消息的版本号会小于本地，与远端比对确认后全量重载
+                if version < self.local_version and await self._diverged():
+                    await self._resync()
+                return
+            self._pending[version] = message
+            await self._drain()
+
+    async def _drain(self):
+        """按版本号顺序应用暂存的消息"""
+        while self.local_version + 1 in self._pending:
+            message = self._pending.pop(self.local_version + 1)
+            op, args = message.get("op"), message.get("args") or []
+
+            if op in FULL_RELOAD_OPS:
+                if message.get("w") != self.worker_id:
+                    await self._full_reload(op, reason="远端请求")
+                    # 全量重载已推进版本号，继续处理剩余暂存消息
+                    continue
+                self.stats["skipped"] += 1
+            elif message.get("w") == self.worker_id:
+                # 本进程发起的变更已在本地生效
+                self.stats["skipped"] += 1
+            else:
+                try:
+                    await self._apply(op, args)
+                    self.stats["applied"] += 1
+                except Exception as e:
+                    logger.error(f"应用 Casbin 增量变更失败 op={op}: {e}")
+                    await self._full_reload("reload", reason="增量应用失败")
+                    continue
+            self.local_version += 1
+
+        self._gap_since = (self._gap_since or time.monotonic()) if self._pending else None
+
+    async def _tick(self):
+        """周期检查：断档超时则全量重载，定期比对远端版本号"""
+        now = time.monotonic()
+        if self._gap_since is not None and now - self._gap_since >= self.gap_timeout:
+            async with self._lock:
+                if self._gap_since is not None:
+                    await self._full_reload("reload", reason=f"版本断档（本地 {self.local_version}）")
+        if now - self._last_poll >= self.poll_interval:
+            await self._check_remote_version()
+
+    async def _check_remote_version(self):
+        """比对远端版本号，落后时开始计算断档时间，小于本地时立即全量重载"""
+        self._last_poll = time.monotonic()
+        try:
+            remote = await self.get_remote_version()
+        except RedisError as e:
+            logger.warning(f"读取 Casbin 策略版本号失败: {e}")
+            return
+        if remote < self.local_version:
+            async with self._lock:
+                if await self._diverged():
+                    await self._resync()
+        elif remote > self.local_version and self._gap_since is None:
+            self._gap_since = time.monotonic()
+
+    async def _diverged(self) -> bool:
+        """远端版本号是否小于本地（版本号被重置）"""
+        try:
+            return await self.get_remote_version() < self.local_version
+        except RedisError:
+            return False
+
+    async def _resync(self):
+        """版本号被重置：丢弃暂存消息，全量重载并以远端版本号为准（需持有 self._lock）"""
+        self._pending.clear()
+        await self._full_reload("reload", reason=f"远端版本号小于本地 {self.local_version}")
+
+    async def _full_reload(self, op: str, reason: str):
+        """全量重载并推进本地版本号"""
+        version = await self.get_remote_version()
+        logger.info(f"Casbin 策略全量重载: {reason}，目标版本 {version}")
+        await self._reload(op)
+        self.stats["full_reloads"] += 1
+        await self.mark_loaded(version)
+        await self._drain()
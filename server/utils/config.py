@@ -108,6 +108,19 @@ class AppSettings(BaseConfig):
     启用会增加API调用耗时，生产环境需评估性能影响
     """
 
+    ip2region_load_mode: str = 'mmap'
+    """
+    ip2region 数据文件（assets/ip2region_v4.xdb、可选的 ip2region_v6.xdb）加载方式
+    - 'mmap'：只读内存映射（默认），多个工作进程共享同一份页缓存
+    - 'memory'：整体读入每个工作进程的私有内存
+    mmap 模式下更新数据文件请先写入新文件再改名替换，不要原地覆盖正在使用的文件，替换后重启生效
+    """
+
+    ip_location_cache_size: int = 10000
+    """
+    IP 地理位置查询结果缓存容量（按 IP LRU 淘汰）
+    """
+
     multi_login_allowed: bool = True
     """
     是否允许同一用户同时在多个设备登录
@@ -123,6 +136,190 @@ class AppSettings(BaseConfig):
     - False：不初始化，仅当数据库表结构不存在时创建
     """
 
+    request_stats_enabled: bool = False
+    """
+    是否启用请求级调用统计
+    - True：统计每个请求的 Redis 命令数与数据库查询数，通过响应头 X-Redis-Calls / X-DB-Queries 返回
+    - False：禁用（默认）
+    用于排查和验证接口的外部调用次数，生产环境建议关闭
+    """
+
+    casbin_snapshot_enabled: bool = True
+    """
+    Casbin 策略冷启动时是否优先加载本地快照（cache/casbin_policy.snapshot）
+    - True：启用（默认），快照的策略版本号与行数均与当前一致时直接使用快照，否则从数据库加载并刷新快照
+    - False：禁用，每次启动都从数据库加载全部策略
+    """
+
+    log_batch_enabled: bool = True
+    """
+    是否启用日志批量异步写入
+    - True：启用（默认），操作日志/登录日志先进入进程内队列，由后台任务批量写库
+    - False：禁用，每个请求在返回前直接写库
+    """
+
+    log_batch_size: int = 200
+    """
+    日志批量写入的单批最大条数
+    """
+
+    log_flush_interval_ms: int = 500
+    """
+    日志批量写入的最长攒批时间（毫秒），日志最多延迟该时长入库
+    """
+
+    log_queue_size: int = 10000
+    """
+    日志队列容量，决定日志缓冲的内存上限
+    """
+
+    log_overflow_policy: str = 'spill'
+    """
+    日志队列满时的处理策略
+    - 'spill'：追加到本地文件 cache/log_spill.jsonl（默认），下次启动时回放入库
+    - 'block'：请求等待队列空位（不丢日志，但会增加接口耗时）
+    - 'drop'：直接丢弃
+    """
+
+    log_enrich_ua_cache_size: int = 4096
+    """
+    日志 User-Agent 解析结果缓存容量（按 UA 摘要 LRU 淘汰）
+    """
+
+    log_enrich_ip_cache_size: int = 65536
+    """
+    日志 IP 属地缓存容量（IPv4 按 /24 网段缓存，LRU 淘汰）
+    """
+
+    log_payload_max_bytes: int = 65536
+    """
+    操作日志中请求参数、返回结果各自保存的最大字节数，超出部分截断
+    - 0 表示不保存载荷
+    """
+
+    log_payload_compression: str = 'zlib'
+    """
+    操作日志载荷压缩方式
+    - 'zlib'：zlib 压缩（默认）
+    - 'zstd'：zstd 压缩，需安装 zstandard，未安装时退化为 zlib
+    - 'none'：不压缩
+    """
+
+    log_rollup_enabled: bool = True
+    """
+    是否启用日志每日汇总
+    - 启用：写入日志时累加每日汇总表，工作台统计读取汇总数据并合并当天原始日志
+    - 禁用：工作台统计直接聚合原始日志表
+    """
+
+    log_partition_enabled: bool = False
+    """
+    是否按月分区存储登录日志/操作日志
+    - MySQL / PostgreSQL：使用原生按月范围分区，后台任务提前创建后续月份的分区，过期月份整体删除分区；
+      已有数据库需先执行一次 python -m utils.log_partition migrate 将日志表转换为分区表
+    - SQLite：不支持分区，仍为单表，过期数据按批删除
+    """
+
+    log_partition_premake_months: int = 3
+    """
+    分区表提前创建的月份数（含当月）
+    """
+
+    log_retention_months: int = 0
+    """
+    日志保留月数（保留当月及之前 N 个月）
+    - 超出保留期的月份由后台任务归档后删除（含已软删除的日志），每日汇总数据不受影响
+    - 0 表示永久保留（默认）
+    """
+
+    log_archive_enabled: bool = True
+    """
+    删除过期日志前是否归档
+    - 归档为 gzip 压缩的 JSON Lines 文件，每表每月一个文件
+    """
+
+    log_archive_dir: str = 'archives/logs'
+    """
+    日志归档目录（相对于运行目录）
+    """
+
+    log_maintenance_interval_hours: int = 24
+    """
+    日志分区维护与过期归档任务的执行间隔（小时），多进程部署时同一周期只有一个进程执行
+    """
+
+    dashboard_cache_ttl: int = 30
+    """
+    工作台统计接口响应缓存有效期（秒）
+    - 相同数据范围的用户共享缓存，0 表示不缓存
+    """
+
+    list_count_mode: str = 'auto'
+    """
+    管理列表总数统计方式
+    - 'auto'：结果集较小时精确统计，超过阈值后按过滤条件缓存总数（默认）
+    - 'exact'：每次请求都执行 COUNT
+    - 'estimate'：使用数据库执行计划的行数估算（MySQL / PostgreSQL），不支持时同 'auto'
+    - 'none'：不统计总数，仅返回是否有下一页
+    """
+
+    list_exact_count_threshold: int = 10000
+    """
+    auto 模式下的精确统计阈值，总数达到该值后缓存 COUNT 结果
+    """
+
+    list_count_cache_seconds: int = 60
+    """
+    auto 模式下总数缓存的有效期（秒）
+    """
+
+    ws_heartbeat_interval: int = 10
+    """
+    WebSocket 在线状态心跳间隔（秒），各进程按此间隔刷新本进程连接用户的在线状态
+    """
+
+    ws_presence_ttl: int = 30
+    """
+    WebSocket 在线状态有效期（秒），进程异常退出后其连接用户在该时间后视为离线
+    - 应大于心跳间隔的 2 倍
+    """
+
+    ws_send_queue_size: int = 256
+    """
+    每个 WebSocket 连接的发送队列容量（消息数）
+    """
+
+    ws_queue_full_policy: str = 'drop_oldest'
+    """
+    发送队列已满时的处理策略
+    - 'drop_oldest'：丢弃最早的消息（默认）
+    - 'disconnect'：断开该慢连接，客户端重连后重新拉取未读通知
+    """
+
+    ws_send_timeout: float = 10.0
+    """
+    单条 WebSocket 消息的发送超时（秒），超时视为连接停滞并断开
+    """
+
+    notification_bulk_chunk_size: int = 1000
+    """
+    发布通知时批量创建用户通知记录的每批行数
+    """
+
+    notification_async_publish_threshold: int = 5000
+    """
+    目标用户数达到该值时在后台任务中发布通知，接口立即返回，进度通过发布进度接口查询
+    - 0 表示总是同步发布
+    """
+
+    notification_fanout_on_read: bool = True
+    """
+    全局与部门范围的通知是否在读取时合并（不再为每个目标用户创建用户通知记录）
+    - True：启用（默认），发布只保存通知与目标部门，用户列表、未读数量按范围合并；已读状态记录为稀疏的已读记录与已读水位线
+    - False：发布时为每个目标用户创建用户通知记录
+    已发布的通知保持发布时的投递方式
+    """
+
 
 class JwtSettings(BaseConfig):
     """
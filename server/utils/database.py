@@ -12,6 +12,7 @@ from tortoise import Tortoise
 
 from utils.config import config  # 导入统一配置实例
 from utils.log import logger  # 日志工具
+from utils.request_stats import install_db_query_counter
 
 
 def _build_db_connection(db_config) -> Dict[str, Dict[str, Any]]:
@@ -67,6 +68,87 @@ def _build_db_apps() -> Dict[str, Dict[str, Any]]:
     }
 
 
+# 已有表新增的列（generate_schemas 只创建缺失的表，不会为已有表补列）
+# (表名, 列名, {数据库引擎: 列定义})
+_ADDED_COLUMNS = [
+    ("system_operation_log", "payload_codec",
+     {"mysql": "VARCHAR(10) NULL", "postgresql": "VARCHAR(10) NULL", "sqlite": "VARCHAR(10) NULL"}),
+    ("system_operation_log", "request_payload",
+     {"mysql": "LONGBLOB NULL", "postgresql": "BYTEA NULL", "sqlite": "BLOB NULL"}),
+    ("system_operation_log", "request_size",
+     {"mysql": "INT NULL", "postgresql": "INT NULL", "sqlite": "INT NULL"}),
+    ("system_operation_log", "response_payload",
+     {"mysql": "LONGBLOB NULL", "postgresql": "BYTEA NULL", "sqlite": "BLOB NULL"}),
+    ("system_operation_log", "response_size",
+     {"mysql": "INT NULL", "postgresql": "INT NULL", "sqlite": "INT NULL"}),
+    ("system_notification", "delivery",
+     {"mysql": "SMALLINT NOT NULL DEFAULT 0", "postgresql": "SMALLINT NOT NULL DEFAULT 0",
+      "sqlite": "SMALLINT NOT NULL DEFAULT 0"}),
+]
+
+
+# 已有表新增的索引（模型未声明索引，通过 init_db 补建，新库与升级库一致）
+# (表名, 索引名, 列)
+_ADDED_INDEXES = [
+    # 日志列表、键集分页与导出按 (created_at, id) 排序遍历
+    ("system_login_log", "idx_system_login_log_created_at", ("created_at", "id")),
+    ("system_operation_log", "idx_system_operation_log_created_at", ("created_at", "id")),
+    # 读时合并通知按发布时间倒序读取
+    ("system_notification", "idx_system_notification_delivery", ("delivery", "status", "publish_time")),
+]
+
+
+async def _get_table_columns(conn, engine: str, table: str) -> set:
+    """查询表中已有的列名"""
+    if engine == "sqlite":
+        _, rows = await conn.execute_query(f'PRAGMA table_info("{table}")')
+        return {row["name"] for row in rows}
+    if engine == "postgresql":
+        _, rows = await conn.execute_query(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = $1", [table]
+        )
+        return {row["column_name"] for row in rows}
+    _, rows = await conn.execute_query(f"SHOW COLUMNS FROM `{table}`")
+    return {row["Field"] for row in rows}
+
+
+async def _ensure_added_columns(engine: str):
+    """为升级前创建的表补齐新增的列"""
+    conn = Tortoise.get_connection("default")
+    quote = "`" if engine == "mysql" else '"'
+    columns_cache: Dict[str, set] = {}
+    for table, column, definitions in _ADDED_COLUMNS:
+        if table not in columns_cache:
+            columns_cache[table] = await _get_table_columns(conn, engine, table)
+        if column in columns_cache[table]:
+            continue
+        definition = definitions.get(engine, definitions["mysql"])
+        await conn.execute_script(
+            f"ALTER TABLE {quote}{table}{quote} ADD COLUMN {quote}{column}{quote} {definition}"
+        )
+        columns_cache[table].add(column)
+        logger.info(f"已为表 {table} 新增列 {column}")
+
+
+async def _ensure_added_indexes(engine: str):
+    """为已有表补建索引"""
+    conn = Tortoise.get_connection("default")
+    for table, index, columns in _ADDED_INDEXES:
+        if engine == "mysql":
+            _, rows = await conn.execute_query(
+                "SELECT 1 FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+                [table, index],
+            )
+            if rows:
+                continue
+            column_sql = ", ".join(f"`{column}`" for column in columns)
+            await conn.execute_script(f"CREATE INDEX `{index}` ON `{table}` ({column_sql})")
+        else:
+            column_sql = ", ".join(f'"{column}"' for column in columns)
+            await conn.execute_script(f'CREATE INDEX IF NOT EXISTS "{index}" ON "{table}" ({column_sql})')
+
+
 def _configure_db_logging(enable: bool, log_level: str = "INFO"):
     """
     配置数据库日志
@@ -123,9 +205,15 @@ async def init_db():
             logger.info("SQL查询日志已禁用")
             _configure_db_logging(enable=False)
 
+        # 请求级调用统计需要统计 SQL 条数
+        if config.app().request_stats_enabled:
+            install_db_query_counter(echo=db_config.echo)
+
         # 生成表结构
         logger.info("开始生成数据库表结构...")
         await Tortoise.generate_schemas()
+        await _ensure_added_columns(db_config.engine)
+        await _ensure_added_indexes(db_config.engine)
 
         logger.success("数据库连接初始化成功")
         return tortoise_config
@@ -4,25 +4,36 @@
 # @File : dynamic_config.py
 # @Comment : 动态配置服务 - 支持从数据库加载配置到Redis，运行时动态读取
 
-from typing import Any, Dict, List, Optional
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
 
 from models import SystemConfig
 from models.config import ConfigGroup
 from utils.log import logger
 from utils.get_redis import RedisKeyConfig
 
+# 类型化读取的缓存中表示“配置不存在或无法解析”
+_MISSING = object()
+
 
 class DynamicConfigService:
     """
     动态配置服务
-    - 应用启动时从数据库加载配置到 Redis
-    - 运行时从 Redis 读取配置
-    - 配置更新时同步更新数据库和 Redis
+    - 应用启动时从数据库加载配置到 Redis，同时在进程内保存全部配置的快照
+    - 运行时直接读取本地快照，get_int / get_bool / get_list 的解析结果按快照缓存
+    - 配置更新时同步更新数据库和 Redis，递增配置版本号并通过 Pub/Sub 广播，
+      各进程收到新版本号后从数据库重新加载快照；另有定期版本号比对，兜底丢失的广播
+    - 快照未加载时（脚本等未调用 load_all_to_redis 的场景）退化为读取 Redis / 数据库
     """
     
     # Redis 配置前缀
     CONFIG_PREFIX = f"{RedisKeyConfig.SYSTEM_CONFIG.key}:"
+    # 配置版本号与变更广播频道
+    VERSION_KEY = f"{RedisKeyConfig.DYNAMIC_CONFIG.key}:version"
+    CHANNEL = f"{RedisKeyConfig.DYNAMIC_CONFIG.key}:channel"
     
     # 默认配置定义（首次启动时初始化到数据库）
     DEFAULT_CONFIGS = [
@@ -94,8 +105,22 @@ class DynamicConfigService:
         {"group": ConfigGroup.UPLOAD, "key": "minio_secure", "name": "MinIO启用HTTPS", "value": "false", "type": True, "remark": "MinIO是否启用HTTPS"},
     ]
     
-    def __init__(self, redis: AsyncRedis):
+    def __init__(self, redis: AsyncRedis, poll_interval: float = 30.0):
+        """
+        :param redis: Redis 连接
+        :param poll_interval: 定期比对配置版本号的间隔（秒）
+        """
         self.redis = redis
+        self.poll_interval = poll_interval
+        # 本地快照 {key: value} 及其对应的配置版本号
+        self._snapshot: Optional[Dict[str, str]] = None
+        self._version = 0
+        # 类型化读取结果 {(类型, key, 参数): 解析结果}，快照替换时清空
+        self._typed: Dict[Tuple[str, str, str], Any] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._last_poll = 0.0
+        self.stats = {"reloads": 0, "published": 0}
     
     async def init_default_configs(self):
         """
@@ -149,15 +174,21 @@ class DynamicConfigService:
             logger.info(f"已加载 {len(configs)} 条配置到 Redis")
         except Exception as e:
             logger.error(f"加载配置到 Redis 失败: {e}")
+        await self.reload_snapshot()
     
     async def get(self, key: str, default: Any = None) -> Optional[str]:
         """
-        获取配置值（优先从 Redis 读取）
+        获取配置值（优先读取本地快照，未加载快照时读取 Redis）
         
         :param key: 配置键名
         :param default: 默认值
         :return: 配置值
         """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            value = snapshot.get(key)
+            return default if value is None else value
+
         redis_key = f"{self.CONFIG_PREFIX}{key}"
         value = await self.redis.get(redis_key)
         if value is not None:
@@ -171,33 +202,50 @@ class DynamicConfigService:
         
         return default
     
-    async def get_bool(self, key: str, default: bool = False) -> bool:
-        """获取布尔类型配置"""
+    async def _get_typed(self, kind: str, key: str, arg: str = ""):
+        """读取并解析配置，快照已加载时缓存解析结果；不存在或无法解析时返回 _MISSING"""
+        cache_key = (kind, key, arg)
+        if self._snapshot is not None and cache_key in self._typed:
+            return self._typed[cache_key]
+
+        snapshot = self._snapshot
         value = await self.get(key)
         if value is None:
-            return default
-        return value.lower() in ("true", "1", "yes", "on")
+            parsed = _MISSING
+        elif kind == "bool":
+            parsed = value.lower() in ("true", "1", "yes", "on")
+        elif kind == "int":
+            try:
+                parsed = int(value)
+            except ValueError:
+                parsed = _MISSING
+        else:
+            parsed = tuple(item.strip() for item in value.split(arg) if item.strip())
+        # 读取期间快照被替换时不缓存旧值
+        if snapshot is not None and snapshot is self._snapshot:
+            self._typed[cache_key] = parsed
+        return parsed
+
+    async def get_bool(self, key: str, default: bool = False) -> bool:
+        """获取布尔类型配置"""
+        value = await self._get_typed("bool", key)
+        return default if value is _MISSING else value
     
     async def get_int(self, key: str, default: int = 0) -> int:
         """获取整数类型配置"""
-        value = await self.get(key)
-        if value is None:
-            return default
-        try:
-            return int(value)
-        except ValueError:
-            return default
+        value = await self._get_typed("int", key)
+        return default if value is _MISSING else value
     
     async def get_list(self, key: str, separator: str = ",", default: List[str] = None) -> List[str]:
         """获取列表类型配置"""
-        value = await self.get(key)
-        if value is None:
+        value = await self._get_typed("list", key, separator)
+        if value is _MISSING:
             return default or []
-        return [item.strip() for item in value.split(separator) if item.strip()]
+        return list(value)
     
     async def set(self, key: str, value: str, name: str = None, group: str = None, remark: str = None) -> bool:
         """
-        设置配置值（同时更新数据库和 Redis）
+        设置配置值（同时更新数据库和 Redis，并广播配置变更）
         
         :param key: 配置键名
         :param value: 配置值
@@ -206,6 +254,28 @@ class DynamicConfigService:
         :param remark: 备注
         :return: 是否成功
         """
+        success = await self._save(key, value, name, group, remark)
+        if success:
+            await self.publish_change()
+        return success
+
+    async def set_many(self, items: Iterable[Tuple[str, str]]) -> int:
+        """
+        批量设置配置值，全部写入后只广播一次配置变更
+
+        :param items: [(配置键名, 配置值)]
+        :return: 成功条数
+        """
+        count = 0
+        for key, value in items:
+            if await self._save(key, value):
+                count += 1
+        if count:
+            await self.publish_change()
+        return count
+
+    async def _save(self, key: str, value: str, name: str = None, group: str = None, remark: str = None) -> bool:
+        """写入数据库和 Redis（不广播）"""
         try:
             # 更新或创建数据库记录
             config = await SystemConfig.get_or_none(key=key, is_del=False)
@@ -239,7 +309,7 @@ class DynamicConfigService:
     
     async def delete(self, key: str) -> bool:
         """
-        删除配置（软删除数据库记录，删除 Redis 缓存）
+        删除配置（软删除数据库记录，删除 Redis 缓存，并广播配置变更）
         """
         try:
             config = await SystemConfig.get_or_none(key=key, is_del=False)
@@ -249,6 +319,7 @@ class DynamicConfigService:
             
             redis_key = f"{self.CONFIG_PREFIX}{key}"
             await self.redis.delete(redis_key)
+            await self.publish_change()
             
             logger.info(f"配置已删除: {key}")
             return True
@@ -329,19 +400,124 @@ class DynamicConfigService:
     
     async def refresh_from_db(self):
         """
-        从数据库刷新所有配置到 Redis
+        从数据库刷新所有配置到 Redis，并广播配置变更
+
+        只删除已不存在的配置键；同一前缀下的其他数据（如通知、未读计数）不受影响
         """
-        # 删除所有现有配置缓存
-        keys = []
-        async for key in self.redis.scan_iter(f"{self.CONFIG_PREFIX}*"):
-            keys.append(key)
-        if keys:
-            await self.redis.delete(*keys)
+        active = set(await SystemConfig.filter(is_del=False).values_list("key", flat=True))
+        stale = set(await SystemConfig.filter(is_del=True).values_list("key", flat=True))
+        stale.update(self._snapshot or ())
+        stale -= active
+        if stale:
+            await self.redis.delete(*[f"{self.CONFIG_PREFIX}{key}" for key in stale])
         
         # 重新加载
         await self.load_all_to_redis()
+        await self.publish_change()
         logger.info("配置已从数据库刷新")
 
+    # ==================== 本地快照与变更广播 ====================
+
+    async def reload_snapshot(self, version: Optional[int] = None):
+        """
+        从数据库重新加载本地快照
+
+        :param version: 广播中的版本号，本地已不低于该版本时跳过；不传则无条件重新加载
+        """
+        async with self._lock:
+            if version is not None and self._snapshot is not None and version <= self._version:
+                return
+            try:
+                # 先读版本号再读数据：加载期间的新变更会再次触发重新加载
+                remote_version = await self._remote_version()
+                configs = await SystemConfig.filter(is_del=False).values_list("key", "value")
+            except Exception as e:
+                logger.error(f"加载配置快照失败: {e}")
+                return
+            self._snapshot = dict(configs)
+            self._typed = {}
+            self._version = remote_version
+            self.stats["reloads"] += 1
+
+    async def publish_change(self):
+        """递增配置版本号并广播，本进程立即重新加载快照"""
+        try:
+            version = await self.redis.incr(self.VERSION_KEY)
+            await self.redis.publish(self.CHANNEL, version)
+            self.stats["published"] += 1
+        except RedisError as e:
+            logger.warning(f"配置变更广播失败: {e}")
+        await self.reload_snapshot()
+
+    async def _remote_version(self) -> int:
+        value = await self.redis.get(self.VERSION_KEY)
+        return int(value) if value else 0
+
+    def start(self):
+        """启动后台订阅任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="dynamic-config-watcher")
+
+    async def stop(self):
+        """停止后台订阅任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """订阅主循环，断线后自动重连"""
+        backoff = 1.0
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                # 订阅建立前可能错过广播，立即比对一次版本号
+                await self._check_remote_version()
+                backoff = 1.0
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        try:
+                            version = int(message.get("data"))
+                        except (TypeError, ValueError):
+                            continue
+                        if version > self._version:
+                            await self.reload_snapshot(version)
+                    if time.monotonic() - self._last_poll >= self.poll_interval:
+                        await self._check_remote_version()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"配置变更订阅连接异常，{backoff:.0f} 秒后重连: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def _check_remote_version(self):
+        self._last_poll = time.monotonic()
+        # 版本号键被清空等情况下远端版本可能小于本地，同样重新加载
+        if await self._remote_version() != self._version:
+            await self.reload_snapshot()
+
+    def snapshot_stats(self) -> dict:
+        """本地快照统计"""
+        return {
+            **self.stats,
+            "loaded": self._snapshot is not None,
+            "version": self._version,
+            "keys": len(self._snapshot or ()),
+            "typed": len(self._typed),
+            "subscribed": self._task is not None and not self._task.done(),
+        }
+
 
 # 全局配置服务实例（需要在应用启动时初始化）
 _dynamic_config: Optional[DynamicConfigService] = None
@@ -7,7 +7,9 @@
 # @Comment : Redis工具类（基于 redis-py 5.x，兼容 Python 3.11+）
 
 import asyncio
+import time
 from enum import Enum
+from typing import List, Optional
 
 from redis.asyncio import Redis as AsyncRedis
 from redis.exceptions import (
@@ -18,6 +20,7 @@ from redis.exceptions import (
 from models import SystemConfig
 from utils.config import config
 from utils.log import logger
+from utils.request_stats import InstrumentedRedis
 
 
 class RedisKeyConfig(Enum):
@@ -41,6 +44,89 @@ class RedisKeyConfig(Enum):
     CAPTCHA_CODES = {"key": "captcha_codes", "remark": "图片验证码"}
     EMAIL_CODES = {"key": "email_codes", "remark": "邮箱验证码"}
     SYSTEM_CONFIG = {"key": "system_config", "remark": "系统配置信息"}
+    CASBIN_POLICY = {"key": "casbin_policy", "remark": "Casbin策略同步"}
+    DYNAMIC_CONFIG = {"key": "dynamic_config", "remark": "动态配置版本同步"}
+    CACHE_VERSION = {"key": "cache_version", "remark": "缓存版本号"}
+    SINGLE_FLIGHT_LOCK = {"key": "single_flight", "remark": "缓存重建锁"}
+    ONLINE_SESSION = {"key": "online_session", "remark": "在线会话索引"}
+    LIST_COUNT = {"key": "list_count", "remark": "列表总数缓存"}
+    RESPONSE_CACHE = {"key": "response_cache", "remark": "接口响应缓存"}
+    LOG_MAINTENANCE_LOCK = {"key": "log_maintenance_lock", "remark": "日志维护任务锁"}
+    LOG_ROLLUP_LOCK = {"key": "log_rollup_lock", "remark": "日志汇总回填任务锁"}
+    WS_PRESENCE = {"key": "ws_presence", "remark": "WebSocket在线状态"}
+    WS_MESSAGE = {"key": "ws_message", "remark": "WebSocket跨进程消息"}
+    NOTIFICATION_UNREAD = {"key": "notification_unread", "remark": "通知未读计数"}
+    NOTIFICATION_PUBLISH = {"key": "notification_publish", "remark": "通知发布任务进度"}
+
+
+class CacheGeneration:
+    """
+    代数（generation）缓存失效
+
+    缓存键形如 {命名空间}:{全局代数}.{作用域代数}:{标识}：
+    - 全局代数 cache_version:{命名空间}，批量失效时整体替换为新值（纳秒时间戳，键被删除后重建也不会与旧值重复）
+    - 作用域代数 cache_version:scope:{作用域}（如 user:{id}），由多个命名空间共享，同一作用域下的缓存一起失效
+    失效只需一次 SET / INCR，旧键不再被读取，由 TTL 自然过期，无需 KEYS 扫描与批量删除。
+    """
+
+    @staticmethod
+    def global_key(namespace: RedisKeyConfig) -> str:
+        """命名空间的全局代数键"""
+        return f"{RedisKeyConfig.CACHE_VERSION.key}:{namespace.key}"
+
+    @staticmethod
+    def scope_key(scope: str) -> str:
+        """作用域代数键"""
+        return f"{RedisKeyConfig.CACHE_VERSION.key}:scope:{scope}"
+
+    @staticmethod
+    def user_scope(user_id) -> str:
+        """用户作用域（用户信息、用户路由等共享）"""
+        return f"user:{user_id}"
+
+    @classmethod
+    def generation_keys(cls, namespace: RedisKeyConfig, scope: Optional[str] = None) -> List[str]:
+        """读取代数所需的键，顺序为 [全局代数键, 作用域代数键]"""
+        keys = [cls.global_key(namespace)]
+        if scope is not None:
+            keys.append(cls.scope_key(scope))
+        return keys
+
+    @staticmethod
+    def compose(global_generation: Optional[str], scope_generation: Optional[str] = None) -> str:
+        """由全局代数和作用域代数拼出代数标记"""
+        return f"{global_generation or 0}.{scope_generation or 0}"
+
+    @staticmethod
+    def cache_key(namespace: RedisKeyConfig, ident, generation: str) -> str:
+        """拼出带代数的缓存键"""
+        return f"{namespace.key}:{generation}:{ident}"
+
+    @classmethod
+    async def resolve_key(
+            cls,
+            conn: AsyncRedis,
+            namespace: RedisKeyConfig,
+            ident,
+            scope: Optional[str] = None
+    ) -> str:
+        """读取当前代数（一次 MGET）并返回缓存键"""
+        generations = await conn.mget(cls.generation_keys(namespace, scope))
+        return cls.cache_key(namespace, ident, cls.compose(*generations))
+
+    @classmethod
+    async def invalidate_scope(cls, conn: AsyncRedis, scope: str):
+        """使某个作用域下所有命名空间的缓存失效"""
+        await conn.incr(cls.scope_key(scope))
+
+    @classmethod
+    async def invalidate_namespaces(cls, conn: AsyncRedis, *namespaces: RedisKeyConfig):
+        """使一个或多个命名空间下的全部缓存失效"""
+        generation = time.time_ns()
+        async with conn.pipeline(transaction=False) as pipe:
+            for namespace in namespaces:
+                pipe.set(cls.global_key(namespace), generation)
+            await pipe.execute()
 
 
 class RedisUtil:
@@ -72,7 +158,7 @@ class RedisUtil:
 
         try:
             logger.info("开始初始化Redis连接...")
-            conn = AsyncRedis.from_url(
+            conn = InstrumentedRedis.from_url(
                 f"redis://{redis_cfg.host}:{redis_cfg.port}",
                 db=redis_cfg.database,
                 **conn_params,
@@ -6,115 +6,264 @@
 # @Comment : 基于 ip2region xdb 的 IP 地理位置解析
 import atexit
 import ipaddress
+import mmap
 from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
 
 import ip2region.util as util
 import ip2region.searcher as xdb
 
+from utils.config import config
+from utils.local_cache import LocalTTLCache
+
+# xdb 加载方式
+LOAD_MMAP = "mmap"
+LOAD_MEMORY = "memory"
+
+# 固定返回值
+INVALID_IP = "无效IP"
+PRIVATE_IP = "内网IP"
+UNSUPPORTED_IPV6 = "暂不支持IPv6"
+UNKNOWN = "未知"
+
+# IP 版本 -> (xdb 文件名, xdb 版本)
+_XDB_FILES = {
+    4: ("ip2region_v4.xdb", util.IPv4),
+    6: ("ip2region_v6.xdb", util.IPv6),
+}
+# 查询结果不随时间变化，缓存仅按容量淘汰
+_CACHE_TTL = 7 * 24 * 3600
+
+
+class _XdbSource:
+    """单个 xdb 文件的查询器"""
+
+    def __init__(self, path: Path, version: util.Version, load_mode: str):
+        """
+        :param path: xdb 文件路径
+        :param version: 期望的 IP 版本
+        :param load_mode: mmap 映射文件（多进程共享页缓存）/ memory 读入进程私有内存
+        """
+        # 验证 xdb 文件适用性
+        try:
+            util.verify_from_file(str(path))
+            header_version = util.version_from_header(util.load_header_from_file(str(path)))
+        except Exception as e:
+            raise RuntimeError(f"ip2region xdb 文件验证失败: {str(e)}")
+        if header_version is None or header_version.id != version.id:
+            raise RuntimeError(f"ip2region xdb 文件 {path.name} 不是 {version.name} 数据")
+
+        self.path = path
+        self.load_mode = load_mode
+        self._mmap: Optional[mmap.mmap] = None
+        try:
+            if load_mode == LOAD_MMAP:
+                # 只读映射：各工作进程共享同一份页缓存，不占用进程私有内存
+                with open(path, "rb") as f:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                buffer = self._mmap
+            else:
+                buffer = util.load_content_from_file(str(path))
+            self.size = len(buffer)
+            self._searcher = xdb.new_with_buffer(version, buffer)
+        except Exception as e:
+            raise RuntimeError(f"ip2region 初始化失败: {str(e)}")
+
+    def search(self, ip_bytes: bytes) -> str:
+        return self._searcher.search(ip_bytes)
+
+    def close(self):
+        self._searcher.close()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
 # 初始化 searcher 为模块级变量
-_searcher = None
-_c_buffer = None
+_sources: Optional[Dict[int, _XdbSource]] = None
+_cache: Optional[LocalTTLCache] = None
 
 
 def _init_searcher():
-    """初始化 ip2region searcher，使用内存缓存模式以支持并发"""
-    global _searcher, _c_buffer
-    if _searcher is not None:
+    """
+    初始化 ip2region 查询器
+
+    - IPv4 数据 ip2region_v4.xdb 必须存在；IPv6 数据 ip2region_v6.xdb 可选，缺失时 IPv6 返回“暂不支持IPv6”
+    - 默认以 mmap 只读映射加载，可通过 ip2region_load_mode 改为整体读入内存
+    """
+    global _sources, _cache
+    if _sources is not None:
         return
-    
-    db_path = str(Path().cwd() / 'assets' / 'ip2region_v4.xdb')
-    
-    # 验证 xdb 文件适用性
-    try:
-        util.verify_from_file(db_path)
-    except Exception as e:
-        raise RuntimeError(f"ip2region xdb 文件验证失败: {str(e)}")
-    
-    # 加载整个 xdb 到内存，支持并发查询
-    try:
-        _c_buffer = util.load_content_from_file(db_path)
-        _searcher = xdb.new_with_buffer(util.IPv4, _c_buffer)
-    except Exception as e:
-        raise RuntimeError(f"ip2region 初始化失败: {str(e)}")
-    
+
+    app_config = config.app()
+    load_mode = LOAD_MEMORY if app_config.ip2region_load_mode == LOAD_MEMORY else LOAD_MMAP
+    assets = Path().cwd() / 'assets'
+    sources = {4: _XdbSource(assets / _XDB_FILES[4][0], _XDB_FILES[4][1], load_mode)}
+    v6_path = assets / _XDB_FILES[6][0]
+    if v6_path.exists():
+        try:
+            sources[6] = _XdbSource(v6_path, _XDB_FILES[6][1], load_mode)
+        except RuntimeError:
+            sources[4].close()
+            raise
+
+    _cache = LocalTTLCache(maxsize=max(1, app_config.ip_location_cache_size), ttl=_CACHE_TTL)
+    _sources = sources
     atexit.register(_close_searcher)
 
 
 def _close_searcher():
     """关闭 searcher 资源"""
-    global _searcher, _c_buffer
-    if _searcher is not None:
-        _searcher.close()
-        _searcher = None
-        _c_buffer = None
+    global _sources, _cache
+    if _sources is not None:
+        for source in _sources.values():
+            source.close()
+        _sources = None
+        _cache = None
 
 
-def get_ip_location(ip: str) -> str:
+def _normalize_ip(ip: str) -> Union[ipaddress.IPv4Address, ipaddress.IPv6Address, str]:
     """
-    获取 IP 对应的地理位置信息
-    
-    :param ip: 需要查询的 IP 地址
-    :return: 地理位置信息字符串，格式：国家|省份|城市|运营商
+    校验 IP，返回地址对象；无效或内网地址直接返回结果字符串
+
+    IPv4 映射的 IPv6 地址（::ffff:a.b.c.d，双栈代理常见）按 IPv4 查询
     """
     if not isinstance(ip, str):
-        return "无效IP"
-    
+        return INVALID_IP
     ip = ip.strip()
     if not ip:
-        return "无效IP"
-    
-    # 验证 IP 格式
+        return INVALID_IP
     try:
         ip_obj = ipaddress.ip_address(ip)
     except ValueError:
-        return "无效IP"
-    
+        return INVALID_IP
+    if ip_obj.version == 6 and ip_obj.ipv4_mapped is not None:
+        ip_obj = ip_obj.ipv4_mapped
     # 内网 IP 直接返回
     if ip_obj.is_private:
-        return "内网IP"
-    
-    # 目前只支持 IPv4
-    if ip_obj.version != 4:
-        return "暂不支持IPv6"
-    
-    _init_searcher()
-    
+        return PRIVATE_IP
+    return ip_obj
+
+
+def _search_region(ip_obj: Union[ipaddress.IPv4Address, ipaddress.IPv6Address]) -> Optional[str]:
+    """
+    查询原始 region 字符串
+
+    :return: region 字符串；未加载对应版本的 xdb 时返回 None
+    """
+    source = _sources.get(ip_obj.version)
+    if source is None:
+        return None
+    return source.search(ip_obj.packed)
+
+
+def _lookup(ip: str) -> str:
+    ip_obj = _normalize_ip(ip)
+    if isinstance(ip_obj, str):
+        return ip_obj
     try:
-        region = _searcher.search(ip)
-        if not region:
-            return "未知"
-        return _parse_region(region)
+        region = _search_region(ip_obj)
     except Exception:
-        return "未知"
+        return UNKNOWN
+    if region is None:
+        return UNSUPPORTED_IPV6
+    if not region:
+        return UNKNOWN
+    return _parse_region(region)
+
+
+def get_ip_location(ip: str) -> str:
+    """
+    获取 IP 对应的地理位置信息（带进程内 LRU 缓存）
+
+    :param ip: 需要查询的 IP 地址
+    :return: 地理位置信息字符串，格式：国家|省份|城市|运营商
+    """
+    if not isinstance(ip, str):
+        return INVALID_IP
+    _init_searcher()
+    result = _cache.get(ip)
+    if result is None:
+        result = _lookup(ip)
+        _cache.set(ip, result)
+    return result
+
+
+def get_ip_locations(ips: Iterable[str]) -> Dict[str, str]:
+    """
+    批量获取 IP 地理位置信息
+
+    相同 IP 只查询一次；未命中缓存的地址按数值排序后依次查询，相邻地址落在 xdb 的相同页上
+
+    :param ips: IP 地址列表
+    :return: IP -> 地理位置信息字符串
+    """
+    _init_searcher()
+    result: Dict[str, str] = {}
+    pending = []
+    for ip in ips:
+        if not isinstance(ip, str):
+            continue
+        if ip in result:
+            continue
+        cached = _cache.get(ip)
+        if cached is not None:
+            result[ip] = cached
+            continue
+        ip_obj = _normalize_ip(ip)
+        if isinstance(ip_obj, str):
+            result[ip] = ip_obj
+            _cache.set(ip, ip_obj)
+            continue
+        result[ip] = ""
+        pending.append((ip_obj.version, ip_obj.packed, ip))
+
+    for _, _, ip in sorted(pending):
+        location = _lookup(ip)
+        result[ip] = location
+        _cache.set(ip, location)
+    return result
+
+
+def ip_location_stats() -> dict:
+    """查询器与缓存统计"""
+    if _sources is None:
+        return {"loaded": False}
+    return {
+        "loaded": True,
+        "load_mode": next(iter(_sources.values())).load_mode,
+        "versions": {f"ipv{version}": source.size for version, source in _sources.items()},
+        "cache": _cache.stats(),
+    }
 
 
 def _parse_region(region: str) -> str:
     """
     解析 ip2region 返回的 region 字符串
-    
+
     ip2region 返回格式：国家|省份|城市|网络运营商
     例如：中国|广东省|深圳市|电信
-    
+
     :param region: ip2region 返回的原始字符串
     :return: 处理后的地理位置字符串
     """
     if not region:
         return "未知"
-    
+
     parts = region.split('|')
     # 过滤掉 "0" 和空字符串
     valid_parts = [p for p in parts if p and p != '0']
-    
+
     if not valid_parts:
         return "未知"
-    
+
     return "|".join(valid_parts)
 
 
 def get_ip_location_detail(ip: str) -> dict:
     """
     获取 IP 对应的详细地理位置信息
-    
+
     :param ip: 需要查询的 IP 地址
     :return: 包含详细信息的字典
     """
@@ -125,36 +274,24 @@ def get_ip_location_detail(ip: str) -> dict:
         "isp": "",
         "raw": ""
     }
-    
-    if not isinstance(ip, str):
-        return result
-    
-    ip = ip.strip()
-    if not ip:
-        return result
-    
-    try:
-        ip_obj = ipaddress.ip_address(ip)
-    except ValueError:
-        return result
-    
-    if ip_obj.is_private:
+
+    ip_obj = _normalize_ip(ip)
+    if ip_obj == PRIVATE_IP:
         result["country"] = "内网"
         return result
-    
-    if ip_obj.version != 4:
+    if isinstance(ip_obj, str):
         return result
-    
+
     _init_searcher()
-    
+
     try:
-        region = _searcher.search(ip)
+        region = _search_region(ip_obj)
         if not region:
             return result
-        
+
         result["raw"] = region
         parts = region.split('|')
-        
+
         if len(parts) >= 1 and parts[0] and parts[0] != '0':
             result["country"] = parts[0]
         if len(parts) >= 2 and parts[1] and parts[1] != '0':
@@ -163,7 +300,7 @@ def get_ip_location_detail(ip: str) -> dict:
             result["city"] = parts[2]
         if len(parts) >= 4 and parts[3] and parts[3] != '0':
             result["isp"] = parts[3]
-        
+
         return result
     except Exception:
         return result
@@ -0,0 +1,75 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : local_cache.py
+# @Comment : 进程内 LRU + TTL 缓存，带命中统计
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LocalTTLCache:
+    """
+    进程内 LRU + TTL 缓存
+
+    - 超过 maxsize 时淘汰最久未使用的条目
+    - 条目超过 ttl 秒视为过期，读取时惰性删除
+    - 可为条目附带版本号，读取时版本号不一致视为未命中（用于跨进程失效）
+    - 仅在单个事件循环内使用，无需加锁
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None, version: Any = None) -> Any:
+        """读取缓存，未命中、已过期或版本号不一致时返回 default"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, item_version, value = item
+        if expires_at < time.monotonic() or item_version != version:
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, version: Any = None):
+        """写入缓存"""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), version, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable):
+        """删除指定条目"""
+        self._data.pop(key, None)
+
+    def clear(self):
+        """清空缓存"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """命中统计"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total * 100, 2) if total else 0.0,
+        }
@@ -0,0 +1,203 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : log_enricher.py
+# @Comment : 日志字段补全 - 请求路径只记录原始 IP / User-Agent，写库前批量解析属地、浏览器与操作系统
+
+import hashlib
+import ipaddress
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from user_agents import parse
+
+from utils.config import config
+from utils.ip2region_util import get_ip_locations
+from utils.local_cache import LocalTTLCache
+from utils.log import logger
+
+# 日志字段中携带原始 IP / UA 的保留键，补全时移除
+ENRICH_KEY = "_enrich"
+# 属地关闭时的默认值（与原同步解析保持一致）
+LOCATION_DISABLED = "内网IP"
+# 解析失败时的默认值
+UNKNOWN = "未知"
+# 解析结果不随时间变化，缓存仅按容量淘汰
+_CACHE_TTL = 7 * 24 * 3600
+
+# 模型类名 -> 属地字段名（浏览器与操作系统字段统一为 browser / os）
+_LOCATION_FIELDS = {
+    "SystemLoginLog": "login_location",
+    "SystemOperationLog": "location",
+}
+
+
+class LogEnricher:
+    """
+    日志字段补全
+
+    - 请求路径调用 raw_fields 生成 {ENRICH_KEY: {"ip", "ua"}}，随日志字段进入 LogWriter 队列
+    - LogWriter 后台任务写库前调用 enrich_batch：同一批内相同 UA / 网段只解析一次，
+      结果写入属地、浏览器、操作系统字段，汇总监听器收到的是补全后的日志
+    - UA 解析结果按 UA 摘要做有界 LRU 缓存；IPv4 属地按 /24 网段缓存，其余地址按完整地址缓存
+    - 未携带 ENRICH_KEY 的日志（已自行填写字段）原样写入
+    """
+
+    _ua_cache: Optional[LocalTTLCache] = None
+    _ip_cache: Optional[LocalTTLCache] = None
+    # 属地查询失败（如 xdb 文件缺失）只告警一次
+    _locate_warned: bool = False
+
+    @classmethod
+    def raw_fields(cls, ip: Optional[str], user_agent: Optional[str]) -> Dict[str, Any]:
+        """
+        生成待补全的原始字段
+
+        :param ip: 客户端 IP
+        :param user_agent: 原始 User-Agent
+        :return: 可直接合并到日志字段中的字典
+        """
+        return {ENRICH_KEY: {"ip": ip or "", "ua": user_agent or ""}}
+
+    @classmethod
+    def enrich_batch(cls, items: List[Tuple[str, dict]]):
+        """
+        补全一批日志字段（原地修改）
+
+        :param items: [(模型类名, 字段字典)]
+        """
+        pending = []
+        for kind, fields in items:
+            raw = fields.pop(ENRICH_KEY, None)
+            if raw is not None:
+                pending.append((kind, fields, raw.get("ip") or "", raw.get("ua") or ""))
+        if not pending:
+            return
+
+        locations = cls.locate_many(ip for kind, _, ip, _ in pending if kind in _LOCATION_FIELDS)
+        ua_results: Dict[str, Tuple[str, str]] = {}
+        for kind, fields, ip, ua in pending:
+            if ua not in ua_results:
+                ua_results[ua] = cls.parse_user_agent(ua)
+            fields.setdefault("browser", ua_results[ua][0])
+            fields.setdefault("os", ua_results[ua][1])
+            location_field = _LOCATION_FIELDS.get(kind)
+            if location_field is not None:
+                fields.setdefault(location_field, locations[ip])
+
+    @classmethod
+    def enrich(cls, kind: str, fields: dict) -> dict:
+        """补全单条日志字段（原地修改并返回）"""
+        cls.enrich_batch([(kind, fields)])
+        return fields
+
+    @classmethod
+    def resolve(cls, ip: Optional[str], user_agent: Optional[str]) -> Dict[str, str]:
+        """
+        解析 IP 与 UA（走缓存），用于登录通知等需要展示属地的场景
+
+        :return: {"location", "browser", "os"}
+        """
+        browser, os_name = cls.parse_user_agent(user_agent or "")
+        return {"location": cls.locate(ip or ""), "browser": browser, "os": os_name}
+
+    # ==================== 解析 ====================
+
+    @classmethod
+    def parse_user_agent(cls, user_agent: str) -> Tuple[str, str]:
+        """
+        解析 User-Agent
+
+        :param user_agent: 原始 UA 字符串
+        :return: (浏览器及版本, 操作系统及版本)
+        """
+        cache = cls._caches()[0]
+        key = hashlib.blake2b(user_agent.encode("utf-8", "replace"), digest_size=16).digest()
+        result = cache.get(key)
+        if result is None:
+            try:
+                ua = parse(user_agent)
+            except Exception as e:
+                logger.warning(f"解析 User-Agent 失败: {e}")
+                return UNKNOWN, UNKNOWN
+            result = (
+                f"{ua.browser.family} {ua.browser.version_string}".strip(),
+                f"{ua.os.family} {ua.os.version_string}".strip(),
+            )
+            cache.set(key, result)
+        return result
+
+    @classmethod
+    def locate(cls, ip: str) -> str:
+        """
+        查询 IP 属地（未启用属地查询时返回默认值）
+
+        :param ip: 客户端 IP
+        :return: 属地字符串
+        """
+        return cls.locate_many([ip])[ip]
+
+    @classmethod
+    def locate_many(cls, ips: Iterable[str]) -> Dict[str, str]:
+        """
+        批量查询 IP 属地：先按网段查缓存，未命中的网段各取一个地址批量查询 ip2region
+
+        :param ips: 客户端 IP 列表
+        :return: IP -> 属地字符串
+        """
+        ips = set(ips)
+        if not config.app().ip_location_enabled:
+            return {ip: LOCATION_DISABLED for ip in ips}
+        cache = cls._caches()[1]
+        result: Dict[str, str] = {}
+        # 网段 -> 该网段下待查询的 IP
+        missing: Dict[str, List[str]] = {}
+        for ip in ips:
+            key = cls._network_key(ip)
+            cached = cache.get(key)
+            if cached is not None:
+                result[ip] = cached
+            else:
+                missing.setdefault(key, []).append(ip)
+        if not missing:
+            return result
+
+        try:
+            resolved = get_ip_locations(members[0] for members in missing.values())
+        except Exception as e:
+            # xdb 文件缺失等初始化错误不影响日志写入
+            if not cls._locate_warned:
+                cls._locate_warned = True
+                logger.warning(f"查询 IP 属地失败: {e}")
+            return {**result, **{ip: UNKNOWN for members in missing.values() for ip in members}}
+        for key, members in missing.items():
+            location = resolved[members[0]]
+            cache.set(key, location)
+            for ip in members:
+                result[ip] = location
+        return result
+
+    @staticmethod
+    def _network_key(ip: str) -> str:
+        """IPv4 取 /24 网段（同一网段属地相同），其余地址与无效值按原值"""
+        ip = ip.strip()
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return ip
+        if address.version == 4:
+            return str(ipaddress.ip_network(f"{address}/24", strict=False))
+        return str(address)
+
+    @classmethod
+    def _caches(cls) -> Tuple[LocalTTLCache, LocalTTLCache]:
+        if cls._ua_cache is None or cls._ip_cache is None:
+            app_config = config.app()
+            cls._ua_cache = LocalTTLCache(maxsize=max(1, app_config.log_enrich_ua_cache_size), ttl=_CACHE_TTL)
+            cls._ip_cache = LocalTTLCache(maxsize=max(1, app_config.log_enrich_ip_cache_size), ttl=_CACHE_TTL)
+        return cls._ua_cache, cls._ip_cache
+
+    @classmethod
+    def stats(cls) -> dict:
+        """缓存命中统计"""
+        ua_cache, ip_cache = cls._caches()
+        return {"user_agent": ua_cache.stats(), "ip_network": ip_cache.stats()}
@@ -0,0 +1,497 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : log_partition.py
+# @Comment : 日志按月分区存储 - 原生分区维护、过期月份归档删除、按保留期限定查询时间范围
+#
+# 手动执行（在 server 目录下）：
+#     python -m utils.log_partition migrate                   # 将已有日志表转换为分区表（MySQL / PostgreSQL）
+#     python -m utils.log_partition maintain                  # 创建后续分区，归档并删除过期月份
+#     python -m utils.log_partition archive --month 2026-01   # 只归档指定月份，不删除
+
+import asyncio
+import base64
+import gzip
+import json
+import os
+import re
+from datetime import date, datetime, time
+from typing import Any, Dict, List, Optional, Type
+
+from redis.asyncio import Redis as AsyncRedis
+from tortoise import Tortoise
+from tortoise.expressions import Q
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+from models import SystemLoginLog, SystemOperationLog
+from utils.config import config
+from utils.get_redis import RedisKeyConfig
+from utils.log import logger
+
+_LOG_MODELS: Dict[str, Type[Model]] = {
+    "login": SystemLoginLog,
+    "operation": SystemOperationLog,
+}
+
+# 分区名中的月份，PostgreSQL 子表为 {表名}_p{YYYYMM}，MySQL 分区为 p{YYYYMM}
+_PARTITION_MONTH = re.compile(r"p(\d{4})(\d{2})$")
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_range(month: date):
+    return datetime.combine(month, time.min), datetime.combine(_add_months(month, 1), time.min)
+
+
+def _archive_default(value: Any):
+    """归档序列化：二进制字段转为 base64，时间转为 ISO 格式"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"__bytes__": base64.b64encode(bytes(value)).decode("ascii")}
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class LogPartition:
+    """
+    日志分区存储与保留期管理
+
+    - MySQL / PostgreSQL 启用分区后，日志表按 created_at 做月度范围分区（另有兜底分区），
+      维护任务提前创建后续月份的分区；带时间条件的查询由数据库裁剪到相关分区
+    - 超出保留期的月份先导出为 gzip JSON Lines 归档文件，再删除：分区表直接删除整个分区，
+      未分区的表（含 SQLite）按批删除
+    - 日志查询通过 date_filter 生成时间条件，下限不早于保留期起点
+    - 每日汇总表不随日志删除，工作台历史统计保持不变
+    - 维护任务在后台定期执行，多进程部署时通过 Redis 锁保证同一周期只执行一次
+    """
+
+    _task: Optional[asyncio.Task] = None
+    # 单批读取 / 删除的行数
+    _batch_size: int = 2000
+
+    # ==================== 查询 ====================
+
+    @classmethod
+    def retention_start(cls) -> Optional[date]:
+        """保留期起点（保留当月及之前 log_retention_months 个月），未设置保留期时返回 None"""
+        months = config.app().log_retention_months
+        if months <= 0:
+            return None
+        return _add_months(_month_start(date.today()), -months)
+
+    @classmethod
+    def date_filter(cls, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, datetime]:
+        """
+        生成日志查询的时间条件
+
+        :param start: 开始时间
+        :param end: 结束时间（含）
+        :return: created_at 过滤条件，开始时间早于保留期起点时以保留期起点为准
+        """
+        filters = {}
+        cutoff = cls.retention_start()
+        if cutoff is not None:
+            cutoff_at = datetime.combine(cutoff, time.min)
+            if start is not None and start.tzinfo is not None:
+                cutoff_at = cutoff_at.astimezone()
+            start = cutoff_at if start is None or start < cutoff_at else start
+        if start is not None:
+            filters["created_at__gte"] = start
+        if end is not None:
+            filters["created_at__lte"] = end
+        return filters
+
+    # ==================== 分区 ====================
+
+    @staticmethod
+    def _engine() -> str:
+        """数据库方言：postgres / mysql / sqlite"""
+        return Tortoise.get_connection("default").capabilities.dialect
+
+    @classmethod
+    def _partition_name(cls, table: str, month: date) -> str:
+        name = f"p{month.strftime('%Y%m')}"
+        return f"{table}_{name}" if cls._engine() == "postgres" else name
+
+    @classmethod
+    async def partitions(cls, model: Type[Model]) -> Dict[str, Optional[date]]:
+        """
+        查询日志表的分区
+
+        :return: 分区名 -> 月份（兜底分区为 None），未分区时为空
+        """
+        engine = cls._engine()
+        table = model._meta.db_table
+        conn = Tortoise.get_connection("default")
+        if engine == "postgres":
+            _, rows = await conn.execute_query(
+                "SELECT c.relname AS name FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = $1",
+                [table],
+            )
+        elif engine == "mysql":
+            _, rows = await conn.execute_query(
+                "SELECT PARTITION_NAME AS name FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL",
+                [table],
+            )
+        else:
+            return {}
+        result = {}
+        for row in rows:
+            match = _PARTITION_MONTH.search(row["name"])
+            result[row["name"]] = date(int(match.group(1)), int(match.group(2)), 1) if match else None
+        return result
+
+    @classmethod
+    async def ensure_partitions(cls, model: Type[Model]) -> List[str]:
+        """
+        提前创建当月及之后 log_partition_premake_months 个月的分区
+
+        :return: 新建的分区名
+        """
+        existing = await cls.partitions(model)
+        if not existing:
+            return []
+        months = {month for month in existing.values() if month}
+        latest = max(months) if months else None
+        created = []
+        current = _month_start(date.today())
+        for offset in range(max(config.app().log_partition_premake_months, 1)):
+            month = _add_months(current, offset)
+            # MySQL 只能从兜底分区末尾拆出新分区
+            if month in months or (cls._engine() == "mysql" and latest and month < latest):
+                continue
+            try:
+                await cls._create_partition(Tortoise.get_connection("default"), model._meta.db_table, month)
+            except Exception as e:
+                # 兜底分区中已有该月数据时无法创建，数据仍可正常读写
+                logger.warning(f"创建日志分区 {model._meta.db_table} {month:%Y-%m} 失败: {e}")
+                continue
+            created.append(cls._partition_name(model._meta.db_table, month))
+        if created:
+            logger.info(f"已创建日志分区: {', '.join(created)}")
+        return created
+
+    @classmethod
+    async def _create_partition(cls, conn, table: str, month: date):
+        name = cls._partition_name(table, month)
+        next_month = _add_months(month, 1)
+        if cls._engine() == "postgres":
+            await conn.execute_script(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM ('{month}') TO ('{next_month}')"
+            )
+        else:
+            await conn.execute_script(
+                f"ALTER TABLE `{table}` REORGANIZE PARTITION pmax INTO ("
+                f"PARTITION {name} VALUES LESS THAN ('{next_month} 00:00:00'), "
+                f"PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+            )
+
+    @classmethod
+    async def migrate(cls, model: Type[Model]) -> bool:
+        """
+        将已有日志表转换为按月分区表（一次性操作，数据量大时耗时较长，建议在维护窗口执行）
+
+        - 主键改为 (id, created_at)，created_at 为空的历史数据以 updated_at 或当前时间补齐
+        - PostgreSQL：新建分区表并复制数据，保留原有普通索引
+        - MySQL：分区表不支持外键，会删除日志表上的外键约束（ORM 关联查询不受影响）
+
+        :return: 是否执行了转换
+        """
+        engine = cls._engine()
+        table = model._meta.db_table
+        if engine not in ("postgres", "mysql"):
+            logger.warning(f"{engine} 不支持表分区，{table} 保持单表存储")
+            return False
+        if await cls.partitions(model):
+            logger.info(f"{table} 已是分区表")
+            await cls.ensure_partitions(model)
+            return False
+
+        first = await model.filter(created_at__not_isnull=True).order_by("created_at").first().values_list(
+            "created_at", flat=True
+        )
+        current = _month_start(date.today())
+        month = _month_start(first.date()) if first and first.date() < current else current
+        months = []
+        while month < _add_months(current, max(config.app().log_partition_premake_months, 1)):
+            months.append(month)
+            month = _add_months(month, 1)
+
+        logger.info(f"开始将 {table} 转换为分区表，共 {len(months)} 个月份分区")
+        if engine == "postgres":
+            await cls._migrate_postgresql(table, months)
+        else:
+            await cls._migrate_mysql(table, months)
+        logger.success(f"{table} 已转换为分区表")
+        return True
+
+    @classmethod
+    async def _migrate_postgresql(cls, table: str, months: List[date]):
+        legacy = f"{table}_unpartitioned"
+        async with in_transaction() as conn:
+            await conn.execute_script(
+                f'UPDATE "{table}" SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL'
+            )
+            # 分区表的唯一索引必须包含分区键，只保留普通索引
+            _, indexes = await conn.execute_query(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = $1 AND indexdef NOT LIKE 'CREATE UNIQUE%'",
+                [table],
+            )
+            await conn.execute_script(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+            await conn.execute_script(
+                f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING COMMENTS) '
+                f"PARTITION BY RANGE (created_at)"
+            )
+            await conn.execute_script(
+                f'ALTER TABLE "{table}" ALTER COLUMN created_at SET NOT NULL, ADD PRIMARY KEY (id, created_at)'
+            )
+            for month in months:
+                await cls._create_partition(conn, table, month)
+            await conn.execute_script(f'CREATE TABLE "{table}_pdefault" PARTITION OF "{table}" DEFAULT')
+            await conn.execute_script(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+            await conn.execute_script(f'DROP TABLE "{legacy}"')
+            # 原索引随旧表删除后按原名重建
+            for row in indexes:
+                await conn.execute_script(row["indexdef"])
+            await conn.execute_script(
+                f'CREATE INDEX IF NOT EXISTS "idx_{table}_created_at" ON "{table}" (created_at, id)'
+            )
+
+    @classmethod
+    async def _migrate_mysql(cls, table: str, months: List[date]):
+        conn = Tortoise.get_connection("default")
+        await conn.execute_script(
+            f"UPDATE `{table}` SET created_at = COALESCE(updated_at, NOW(6)) WHERE created_at IS NULL"
+        )
+        _, foreign_keys = await conn.execute_query(
+            "SELECT CONSTRAINT_NAME AS name FROM information_schema.TABLE_CONSTRAINTS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'",
+            [table],
+        )
+        for row in foreign_keys:
+            await conn.execute_script(f"ALTER TABLE `{table}` DROP FOREIGN KEY `{row['name']}`")
+        await conn.execute_script(f"ALTER TABLE `{table}` DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)")
+        _, indexes = await conn.execute_query(
+            "SELECT 1 FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+            [table, f"idx_{table}_created_at"],
+        )
+        if not indexes:
+            await conn.execute_script(f"ALTER TABLE `{table}` ADD INDEX `idx_{table}_created_at` (created_at, id)")
+        definitions = [
+            f"PARTITION {cls._partition_name(table, month)} VALUES LESS THAN ('{_add_months(month, 1)} 00:00:00')"
+            for month in months
+        ]
+        definitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+        await conn.execute_script(
+            f"ALTER TABLE `{table}` PARTITION BY RANGE COLUMNS(created_at) ({', '.join(definitions)})"
+        )
+
+    # ==================== 归档与删除 ====================
+
+    @classmethod
+    async def expired_months(cls, model: Type[Model]) -> List[date]:
+        """保留期之前仍有数据（或仍有分区）的月份"""
+        cutoff = cls.retention_start()
+        if cutoff is None:
+            return []
+        months = {
+            month for month in (await cls.partitions(model)).values()
+            if month and month < cutoff
+        }
+        first = await model.filter(
+            created_at__lt=datetime.combine(cutoff, time.min)
+        ).order_by("created_at").first().values_list("created_at", flat=True)
+        if first is not None:
+            month = _month_start(first.date())
+            while month < cutoff:
+                months.add(month)
+                month = _add_months(month, 1)
+        return sorted(months)
+
+    @classmethod
+    async def archive_month(cls, model: Type[Model], month: date) -> Optional[str]:
+        """
+        将指定月份的日志（含已软删除的）导出为 gzip JSON Lines 文件
+
+        按 (created_at, id) 分批读取，先写临时文件，完成后再改名，避免留下不完整的归档
+
+        :return: 归档文件路径，该月没有数据时返回 None
+        """
+        table = model._meta.db_table
+        start, end = _month_range(month)
+        directory = os.path.join(os.getcwd(), config.app().log_archive_dir, table)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{table}_{month:%Y%m}.jsonl.gz")
+        temp_path = f"{path}.part"
+
+        queryset = model.filter(created_at__gte=start, created_at__lt=end)
+        total = 0
+        last = None
+        with gzip.open(temp_path, "wt", encoding="utf-8") as file:
+            while True:
+                chunk = queryset
+                if last is not None:
+                    chunk = chunk.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+                rows = await chunk.order_by("created_at", "id").limit(cls._batch_size).values()
+                if not rows:
+                    break
+                lines = "".join(
+                    json.dumps(row, ensure_ascii=False, default=_archive_default) + "\n" for row in rows
+                )
+                await asyncio.to_thread(file.write, lines)
+                total += len(rows)
+                last = (rows[-1]["created_at"], rows[-1]["id"])
+
+        if not total:
+            os.remove(temp_path)
+            return None
+        os.replace(temp_path, path)
+        logger.info(f"已归档 {table} {month:%Y-%m} 共 {total} 条日志: {path}")
+        return path
+
+    @classmethod
+    async def purge_month(cls, model: Type[Model], month: date) -> int:
+        """
+        删除指定月份的日志：分区表直接删除整个分区，兜底分区或未分区的表按批删除
+
+        :return: 删除条数
+        """
+        table = model._meta.db_table
+        start, end = _month_range(month)
+        queryset = model.filter(created_at__gte=start, created_at__lt=end)
+        deleted = 0
+
+        name = cls._partition_name(table, month)
+        if name in await cls.partitions(model):
+            deleted += await queryset.count()
+            conn = Tortoise.get_connection("default")
+            if cls._engine() == "postgres":
+                await conn.execute_script(f'DROP TABLE "{name}"')
+            else:
+                await conn.execute_script(f"ALTER TABLE `{table}` DROP PARTITION {name}")
+
+        while True:
+            ids = await queryset.limit(cls._batch_size).values_list("id", flat=True)
+            if not ids:
+                break
+            deleted += await model.filter(id__in=ids).delete()
+        if deleted:
+            logger.info(f"已删除 {table} {month:%Y-%m} 共 {deleted} 条过期日志")
+        return deleted
+
+    # ==================== 维护任务 ====================
+
+    @classmethod
+    async def maintain(cls) -> Dict[str, Any]:
+        """
+        执行一次维护：创建后续月份分区，归档并删除过期月份
+
+        归档失败的月份不会删除，留待下次维护重试
+
+        :return: 表名 -> 新建分区、归档文件、删除条数
+        """
+        app_config = config.app()
+        result = {}
+        for model in _LOG_MODELS.values():
+            table = model._meta.db_table
+            summary = {"created": [], "archived": [], "deleted": 0}
+            if app_config.log_partition_enabled and cls._engine() in ("postgres", "mysql"):
+                if await cls.partitions(model):
+                    summary["created"] = await cls.ensure_partitions(model)
+                else:
+                    logger.warning(f"{table} 尚未转换为分区表，请执行 python -m utils.log_partition migrate")
+            for month in await cls.expired_months(model):
+                try:
+                    if app_config.log_archive_enabled:
+                        path = await cls.archive_month(model, month)
+                        if path:
+                            summary["archived"].append(path)
+                    summary["deleted"] += await cls.purge_month(model, month)
+                except Exception as e:
+                    logger.error(f"归档 {table} {month:%Y-%m} 失败，本月日志暂不删除: {e}")
+            result[table] = summary
+        return result
+
+    @classmethod
+    def start(cls, redis: AsyncRedis):
+        """启动后台维护任务（未启用分区且未设置保留期时不启动）"""
+        app_config = config.app()
+        if cls._task is not None or not (app_config.log_partition_enabled or app_config.log_retention_months > 0):
+            return
+        interval = max(app_config.log_maintenance_interval_hours, 1) * 3600
+
+        async def run():
+            # 启动后稍等再执行，避免拖慢启动
+            await asyncio.sleep(60)
+            while True:
+                try:
+                    # 锁在周期内不释放，其他进程本周期内跳过
+                    if await redis.set(RedisKeyConfig.LOG_MAINTENANCE_LOCK.key, os.getpid(), nx=True, ex=interval - 60):
+                        await cls.maintain()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"日志分区维护失败: {e}")
+                await asyncio.sleep(interval)
+
+        cls._task = asyncio.create_task(run(), name="log-partition-maintenance")
+
+    @classmethod
+    async def shutdown(cls):
+        """停止后台维护任务"""
+        if cls._task is None:
+            return
+        cls._task.cancel()
+        try:
+            await cls._task
+        except asyncio.CancelledError:
+            pass
+        cls._task = None
+
+
+async def _main():
+    import argparse
+
+    from utils.database import close_db, init_db
+
+    parser = argparse.ArgumentParser(description="日志分区维护")
+    parser.add_argument("action", choices=["migrate", "maintain", "archive"], help="操作")
+    parser.add_argument("--kind", choices=list(_LOG_MODELS), default=None, help="日志类型，默认全部")
+    parser.add_argument(
+        "--month", type=lambda value: datetime.strptime(value, "%Y-%m").date(), default=None,
+        help="archive 的月份 YYYY-MM",
+    )
+    args = parser.parse_args()
+    models = [_LOG_MODELS[args.kind]] if args.kind else list(_LOG_MODELS.values())
+
+    await init_db()
+    try:
+        if args.action == "migrate":
+            for model in models:
+                await LogPartition.migrate(model)
+        elif args.action == "maintain":
+            await LogPartition.maintain()
+        else:
+            if args.month is None:
+                parser.error("archive 需要指定 --month")
+            for model in models:
+                await LogPartition.archive_month(model, args.month)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,109 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : log_payload.py
+# @Comment : 操作日志载荷编解码 - 原始字节截断 + zlib/zstd 压缩
+
+import zlib
+from typing import Optional, Tuple
+
+from utils.log import logger
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+CODEC_NONE = "none"
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+
+
+class LogPayloadCodec:
+    """
+    操作日志载荷编解码
+
+    - 请求体与响应体直接以原始字节保存，不做 JSON 解析与重新序列化
+    - 超过 max_bytes 的部分截断，原始大小单独记录
+    - 压缩级别偏向速度（zlib 1 / zstd 3），编码发生在请求路径上
+    """
+
+    _warned_zstd = False
+
+    @classmethod
+    def resolve_codec(cls, codec: str) -> str:
+        """校验压缩方式，zstd 不可用时退化为 zlib"""
+        codec = (codec or CODEC_NONE).lower()
+        if codec == CODEC_ZSTD and zstandard is None:
+            if not cls._warned_zstd:
+                cls._warned_zstd = True
+                logger.warning("未安装 zstandard，操作日志载荷改用 zlib 压缩")
+            return CODEC_ZLIB
+        if codec not in (CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD):
+            return CODEC_ZLIB
+        return codec
+
+    @classmethod
+    def encode(cls, data: Optional[bytes], max_bytes: int, codec: str) -> Tuple[Optional[bytes], int]:
+        """
+        截断并压缩载荷
+
+        :param data: 原始字节
+        :param max_bytes: 保存的最大字节数（压缩前）
+        :param codec: 已校验的压缩方式
+        :return: (编码后的字节, 原始大小)
+        """
+        if data is None:
+            return None, 0
+        size = len(data)
+        if max_bytes <= 0:
+            return None, size
+        if size > max_bytes:
+            data = data[:max_bytes]
+        if codec == CODEC_ZLIB:
+            data = zlib.compress(data, 1)
+        elif codec == CODEC_ZSTD:
+            data = zstandard.ZstdCompressor(level=3).compress(data)
+        return data, size
+
+    @classmethod
+    def decode(cls, blob: Optional[bytes], codec: Optional[str]) -> Tuple[str, int]:
+        """
+        解压载荷
+
+        :return: (文本, 保存的字节数)；截断位置可能落在多字节字符中间，按替换字符解码
+        """
+        if not blob:
+            return "", 0
+        if codec == CODEC_ZLIB:
+            blob = zlib.decompress(blob)
+        elif codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("未安装 zstandard，无法解压该日志载荷")
+            blob = zstandard.ZstdDecompressor().decompress(blob)
+        return blob.decode("utf-8", errors="replace"), len(blob)
+
+    @classmethod
+    def to_detail(cls, log) -> dict:
+        """
+        生成操作日志的载荷详情，兼容仅有文本字段的旧记录
+
+        :param log: SystemOperationLog 实例
+        """
+        if log.payload_codec is None:
+            return {
+                "id": str(log.id),
+                "request_params": log.request_params or "",
+                "response_result": log.response_result or "",
+                "request_truncated": False,
+                "response_truncated": False,
+            }
+        request_params, request_kept = cls.decode(log.request_payload, log.payload_codec)
+        response_result, response_kept = cls.decode(log.response_payload, log.payload_codec)
+        return {
+            "id": str(log.id),
+            "request_params": request_params,
+            "response_result": response_result,
+            "request_truncated": (log.request_size or 0) > request_kept,
+            "response_truncated": (log.response_size or 0) > response_kept,
+        }
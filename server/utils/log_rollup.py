@@ -0,0 +1,520 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : log_rollup.py
+# @Comment : 日志每日汇总 - 写入时增量累加，支持按日期重建；工作台统计读取汇总 + 当天原始日志
+#
+# 手动重建（在 server 目录下）：
+#     python -m utils.log_rollup                       # 重建全部历史
+#     python -m utils.log_rollup --start 2026-01-01 --end 2026-01-31
+
+import asyncio
+import os
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F, Q
+from tortoise.functions import Coalesce, Count, Sum
+from tortoise.models import Model
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
+
+from models import (
+    SystemLoginDailyStat,
+    SystemLoginLog,
+    SystemOperationDailyStat,
+    SystemOperationLog,
+    SystemUser,
+)
+from utils.config import config
+from utils.get_redis import RedisKeyConfig
+from utils.log import logger
+from utils.log_partition import LogPartition
+from utils.sql_functions import TruncDate, date_key
+
+LOGIN = "login"
+OPERATION = "operation"
+
+
+class _RollupSpec:
+    """一类日志的汇总定义"""
+
+    def __init__(
+            self,
+            log_model: Type[Model],
+            stat_model: Type[Model],
+            user_field: str,
+            user_filter: str,
+            department_filter: str,
+            dims: Dict[str, Tuple[str, Optional[int]]],
+    ):
+        """
+        :param log_model: 日志模型
+        :param stat_model: 汇总模型
+        :param user_field: 日志中用户外键的 *_id 属性
+        :param user_filter: 日志按用户过滤的查询条件
+        :param department_filter: 日志按用户部门过滤的查询条件
+        :param dims: 汇总维度 -> (日志字段, 字符串截断长度)，不含日期、部门、用户
+        """
+        self.log_model = log_model
+        self.stat_model = stat_model
+        self.user_field = user_field
+        self.user_filter = user_filter
+        self.department_filter = department_filter
+        self.dims = dims
+
+
+_SPECS: Dict[str, _RollupSpec] = {
+    LOGIN: _RollupSpec(
+        SystemLoginLog,
+        SystemLoginDailyStat,
+        user_field="user_id_id",
+        user_filter="user_id",
+        department_filter="user_id__department__id__in",
+        dims={
+            "os": ("os", 64),
+            "browser": ("browser", 64),
+            "location": ("login_location", 128),
+            "status": ("status", None),
+        },
+    ),
+    OPERATION: _RollupSpec(
+        SystemOperationLog,
+        SystemOperationDailyStat,
+        user_field="operator_id",
+        user_filter="operator_id",
+        department_filter="operator__department__id__in",
+        dims={
+            "operation_type": ("operation_type", None),
+            "operation_name": ("operation_name", 128),
+            "status": ("status", None),
+        },
+    ),
+}
+
+# 汇总键：(日期, 部门ID, 用户ID, *维度)
+_KEY_FIELDS = ("stat_date", "department_id", "user_id")
+
+
+def _clip(value, max_length: Optional[int]):
+    if max_length is None:
+        return value
+    return (value or "")[:max_length]
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+class LogRollup:
+    """
+    日志每日汇总
+
+    - 增量：LogWriter 每批写库成功后调用 record，按汇总键聚合后逐键累加（UPDATE count = count + n，
+      行不存在时插入）
+    - 重建：rebuild 按日期区间从日志表 GROUP BY 重新计算并整体替换；首次升级时自动在后台回填
+      （多进程同时启动时只由抢到 Redis 锁的进程执行），删除日志后重建受影响的日期
+    - 查询：aggregate 读取今天之前的汇总数据，再合并今天的原始日志聚合结果，
+      耗时只与维度基数相关，与日志总量无关；取前 N 组时排序与截取在数据库中完成
+    - 部门维度按写入（或重建）时用户所属部门记录
+    """
+
+    # 回填任务锁有效期（秒），回填完成后释放
+    BACKFILL_LOCK_TTL = 3600
+
+    _backfill_task: Optional[asyncio.Task] = None
+
+    # ==================== 增量 ====================
+
+    @classmethod
+    async def record(cls, objs: List[Model]):
+        """
+        累加新写入日志的计数（LogWriter 监听器）
+
+        :param objs: 已写入的日志模型实例
+        """
+        grouped: Dict[str, List[Model]] = {}
+        for obj in objs:
+            for kind, spec in _SPECS.items():
+                if isinstance(obj, spec.log_model):
+                    grouped.setdefault(kind, []).append(obj)
+        if not grouped:
+            return
+
+        user_ids = {
+            getattr(obj, _SPECS[kind].user_field)
+            for kind, items in grouped.items() for obj in items
+        }
+        departments = await cls._user_departments(user_ids)
+        today = date.today()
+        for kind, items in grouped.items():
+            spec = _SPECS[kind]
+            deltas: Counter = Counter()
+            for obj in items:
+                user_id = getattr(obj, spec.user_field)
+                day = obj.created_at.date() if obj.created_at else today
+                key = (day, departments.get(str(user_id), ""), str(user_id or ""))
+                key += tuple(_clip(getattr(obj, field), length) for field, length in spec.dims.values())
+                deltas[key] += 1
+            await cls._apply(spec, deltas)
+
+    @classmethod
+    async def _apply(cls, spec: _RollupSpec, deltas: Counter):
+        fields = _KEY_FIELDS + tuple(spec.dims)
+        for key, count in deltas.items():
+            filters = dict(zip(fields, key))
+            if await spec.stat_model.filter(**filters).update(count=F("count") + count):
+                continue
+            try:
+                await spec.stat_model.create(**filters, count=count)
+            except IntegrityError:
+                # 其他进程刚插入同一行
+                await spec.stat_model.filter(**filters).update(count=F("count") + count)
+
+    @staticmethod
+    async def _user_departments(user_ids: Iterable) -> Dict[str, str]:
+        """用户ID -> 部门ID"""
+        user_ids = [user_id for user_id in user_ids if user_id]
+        if not user_ids:
+            return {}
+        rows = await SystemUser.filter(id__in=user_ids).values_list("id", "department_id")
+        return {str(user_id): str(department_id or "") for user_id, department_id in rows}
+
+    # ==================== 重建 ====================
+
+    @classmethod
+    async def rebuild(
+            cls,
+            start: Optional[date] = None,
+            end: Optional[date] = None,
+            kinds: Sequence[str] = (LOGIN, OPERATION),
+            chunk_days: int = 7,
+    ) -> Dict[str, int]:
+        """
+        按日期区间重建汇总数据
+
+        :param start: 开始日期，默认为最早一条日志的日期
+        :param end: 结束日期（含），默认为今天
+        :param kinds: 日志类型
+        :param chunk_days: 每次聚合的天数，控制单次查询结果的大小
+        :return: 日志类型 -> 写入的汇总行数
+        """
+        end = end or date.today()
+        result = {}
+        for kind in kinds:
+            spec = _SPECS[kind]
+            kind_start = start
+            if kind_start is None:
+                first = await spec.log_model.filter(is_del=False).order_by("created_at").first().values_list(
+                    "created_at", flat=True
+                )
+                if first is None:
+                    result[kind] = 0
+                    continue
+                kind_start = first.date()
+            # 保留期之前的日志已归档删除，保留已有汇总数据
+            cutoff = LogPartition.retention_start()
+            if cutoff is not None and kind_start < cutoff:
+                kind_start = cutoff
+            rows = 0
+            day = kind_start
+            while day <= end:
+                chunk_end = min(day + timedelta(days=chunk_days - 1), end)
+                rows += await cls._rebuild_range(spec, day, chunk_end)
+                day = chunk_end + timedelta(days=1)
+            result[kind] = rows
+            logger.info(f"已重建{kind}日志汇总 {kind_start} ~ {end}，共 {rows} 行")
+        return result
+
+    @classmethod
+    async def rebuild_days(cls, log_model: Type[Model], days: Iterable[date]):
+        """重建指定日期的汇总数据（未启用汇总时跳过）"""
+        if not config.app().log_rollup_enabled:
+            return
+        kind = next(kind for kind, spec in _SPECS.items() if spec.log_model is log_model)
+        cutoff = LogPartition.retention_start()
+        for day in sorted(set(days)):
+            if cutoff is not None and day < cutoff:
+                continue
+            await cls._rebuild_range(_SPECS[kind], day, day)
+
+    @classmethod
+    async def delete_logs(cls, queryset: QuerySet) -> int:
+        """
+        软删除日志并重建受影响日期的汇总数据
+
+        :param queryset: 待删除日志的查询集
+        :return: 删除条数
+        """
+        if not config.app().log_rollup_enabled:
+            return await queryset.update(is_del=True)
+        days = await queryset.annotate(day=TruncDate("created_at")).group_by("day").values_list("day", flat=True)
+        deleted = await queryset.update(is_del=True)
+        if deleted:
+            await cls.rebuild_days(queryset.model, [date.fromisoformat(date_key(day)) for day in days if day])
+        return deleted
+
+    @classmethod
+    async def _rebuild_range(cls, spec: _RollupSpec, start: date, end: date) -> int:
+        dims = {f"g_{name}": field for name, (field, _) in spec.dims.items()}
+        rows = await spec.log_model.filter(
+            is_del=False,
+            created_at__gte=_day_start(start),
+            created_at__lt=_day_start(end + timedelta(days=1)),
+        ).annotate(
+            day=TruncDate("created_at"), total=Count("id")
+        ).group_by("day", spec.user_field, *dims.values()).values(
+            "day", spec.user_field, "total", **dims
+        )
+
+        departments = await cls._user_departments({row[spec.user_field] for row in rows})
+        counts: Counter = Counter()
+        for row in rows:
+            user_id = row[spec.user_field]
+            key = (date.fromisoformat(date_key(row["day"])), departments.get(str(user_id), ""), str(user_id or ""))
+            key += tuple(_clip(row[f"g_{name}"], length) for name, (_, length) in spec.dims.items())
+            counts[key] += row["total"]
+
+        fields = _KEY_FIELDS + tuple(spec.dims)
+        async with in_transaction():
+            await spec.stat_model.filter(stat_date__gte=start, stat_date__lte=end).delete()
+            await spec.stat_model.bulk_create(
+                [spec.stat_model(**dict(zip(fields, key)), count=count) for key, count in counts.items()],
+                batch_size=1000,
+            )
+        return len(counts)
+
+    @classmethod
+    async def ensure_backfilled(cls, redis: AsyncRedis):
+        """汇总表为空时（首次升级）在后台回填全部历史，多进程启动时由抢到锁的进程执行"""
+        if cls._backfill_task is not None:
+            return
+        for spec in _SPECS.values():
+            if not await spec.stat_model.exists() and await spec.log_model.filter(is_del=False).exists():
+                break
+        else:
+            return
+        lock_key = RedisKeyConfig.LOG_ROLLUP_LOCK.key
+        if not await redis.set(lock_key, os.getpid(), nx=True, ex=cls.BACKFILL_LOCK_TTL):
+            logger.info("日志汇总回填已由其他进程执行，跳过")
+            return
+
+        async def backfill():
+            try:
+                await cls.rebuild()
+            except Exception as e:
+                logger.error(f"日志汇总回填失败，可执行 python -m utils.log_rollup 手动重建: {e}")
+            finally:
+                cls._backfill_task = None
+                try:
+                    await redis.delete(lock_key)
+                except RedisError:
+                    pass
+
+        logger.info("日志汇总表为空，开始后台回填")
+        cls._backfill_task = asyncio.create_task(backfill(), name="log-rollup-backfill")
+
+    # ==================== 查询 ====================
+
+    @classmethod
+    async def aggregate(
+            cls,
+            kind: str,
+            group_by: Sequence[str],
+            *,
+            start: Optional[date] = None,
+            department_ids: Optional[List[str]] = None,
+            user_id: Optional[str] = None,
+            status: Optional[int] = None,
+            values: Optional[Dict[str, list]] = None,
+            exclude_empty: bool = False,
+            limit: Optional[int] = None,
+    ) -> List[dict]:
+        """
+        按维度聚合日志数量
+
+        :param kind: 日志类型 login / operation
+        :param group_by: 分组维度，可选 day 及汇总表维度（如 os、location、operation_type）
+        :param start: 开始日期（含），为空表示全部历史
+        :param department_ids: 仅统计这些部门的数据
+        :param user_id: 仅统计该用户的数据
+        :param status: 仅统计该状态的数据
+        :param values: 仅统计维度取值在给定列表中的数据，如 {"location": ["北京", ""]}（不支持 day）
+        :param exclude_empty: 排除分组维度为空的数据
+        :param limit: 只返回数量最多的前 N 组（按数量倒序，仅支持单个分组维度）
+        :return: [{维度: 值, "count": 数量}]，day 为 YYYY-MM-DD 字符串，空字符串维度表示未知
+        """
+        if limit is not None and len(group_by) != 1:
+            raise ValueError("limit 仅支持单个分组维度")
+        spec = _SPECS[kind]
+        today = date.today()
+        values = values or {}
+
+        stats = None
+        raw_start = start
+        if config.app().log_rollup_enabled:
+            raw_start = today
+            if start is None or start < today:
+                stats = spec.stat_model.filter(stat_date__lt=today)
+                if start is not None:
+                    stats = stats.filter(stat_date__gte=start)
+                if department_ids is not None:
+                    stats = stats.filter(department_id__in=department_ids)
+                if user_id is not None:
+                    stats = stats.filter(user_id=str(user_id))
+                if status is not None:
+                    stats = stats.filter(status=status)
+
+        # 当天（或未启用汇总时的整个区间）直接聚合原始日志
+        logs = spec.log_model.filter(is_del=False)
+        if raw_start is not None:
+            logs = logs.filter(created_at__gte=_day_start(raw_start))
+        if department_ids is not None:
+            logs = logs.filter(**{spec.department_filter: department_ids})
+        if user_id is not None:
+            logs = logs.filter(**{spec.user_filter: user_id})
+        if status is not None:
+            logs = logs.filter(status=status)
+
+        if limit is None:
+            counts = await cls._log_counts(spec, logs, group_by, values, exclude_empty)
+            if stats is not None:
+                counts.update(await cls._stat_counts(spec, stats, group_by, values, exclude_empty))
+        elif stats is None:
+            # 只涉及原始日志，排序与截取在数据库中完成
+            counts = await cls._log_counts(spec, logs, group_by, values, exclude_empty, limit)
+        else:
+            # 合并后的前 N 组只可能是汇总数据的前 N 组或当天出现过的分组：
+            # 汇总表在数据库中取前 N 组，再补查当天分组的历史数量后合并
+            name = group_by[0]
+            counts = await cls._stat_counts(spec, stats, group_by, values, exclude_empty, limit)
+            today_counts = await cls._log_counts(spec, logs, group_by, values, exclude_empty)
+            missing = [key[0] for key in today_counts if key not in counts]
+            if missing:
+                if name == "day":
+                    missing_filter = Q(stat_date__in=[date.fromisoformat(day) for day in missing])
+                else:
+                    missing_filter = cls._in_filter(name, missing)
+                counts.update(await cls._stat_counts(spec, stats.filter(missing_filter), group_by, values, exclude_empty))
+            counts.update(today_counts)
+
+        items = list(counts.items())
+        if limit is not None:
+            items = sorted(items, key=lambda item: item[1], reverse=True)[:limit]
+        return [{**dict(zip(group_by, key)), "count": count} for key, count in items]
+
+    @classmethod
+    async def _stat_counts(
+            cls,
+            spec: _RollupSpec,
+            stats: QuerySet,
+            group_by: Sequence[str],
+            values: Dict[str, list],
+            exclude_empty: bool,
+            limit: Optional[int] = None,
+    ) -> Counter:
+        """汇总表按维度求和"""
+        for name, allowed in values.items():
+            stats = stats.filter(cls._in_filter(name, allowed))
+        if exclude_empty:
+            stats = cls._exclude_empty(spec, stats, {name: name for name in group_by if name != "day"})
+        fields = ["stat_date" if name == "day" else name for name in group_by]
+        query = stats.annotate(total=Sum("count")).group_by(*fields)
+        if limit is not None:
+            query = query.order_by("-total").limit(limit)
+        counts: Counter = Counter()
+        for row in await query.values(*fields, "total"):
+            key = tuple(cls._normalize(spec, name, row[field]) for name, field in zip(group_by, fields))
+            counts[key] += int(row["total"] or 0)
+        return counts
+
+    @classmethod
+    async def _log_counts(
+            cls,
+            spec: _RollupSpec,
+            logs: QuerySet,
+            group_by: Sequence[str],
+            values: Dict[str, list],
+            exclude_empty: bool,
+            limit: Optional[int] = None,
+    ) -> Counter:
+        """原始日志按维度计数"""
+        # 日期与字符串维度通过注解计算（空值统一为空字符串），其余维度直接分组
+        annotations, columns = {}, {}
+        for name in dict.fromkeys([*group_by, *values]):
+            if name == "day":
+                annotations["g_day"] = TruncDate("created_at")
+                columns[name] = "g_day"
+                continue
+            field, length = spec.dims[name]
+            if length:
+                annotations[f"g_{name}"] = Coalesce(field, "")
+                columns[name] = f"g_{name}"
+            else:
+                columns[name] = field
+        query = logs.annotate(**annotations, total=Count("id"))
+        for name, allowed in values.items():
+            query = query.filter(cls._in_filter(columns[name], allowed))
+        if exclude_empty:
+            query = cls._exclude_empty(spec, query, {name: columns[name] for name in group_by if name != "day"})
+        group_columns = [columns[name] for name in group_by]
+        query = query.group_by(*group_columns)
+        if limit is not None:
+            query = query.order_by("-total").limit(limit)
+        counts: Counter = Counter()
+        for row in await query.values(*group_columns, "total"):
+            key = tuple(cls._normalize(spec, name, row[column]) for name, column in zip(group_by, group_columns))
+            counts[key] += row["total"]
+        return counts
+
+    @staticmethod
+    def _in_filter(column: str, allowed: list) -> Q:
+        """取值在列表中（含空值）"""
+        condition = Q(**{f"{column}__in": [value for value in allowed if value is not None]})
+        if None in allowed:
+            condition |= Q(**{f"{column}__isnull": True})
+        return condition
+
+    @staticmethod
+    def _exclude_empty(spec: _RollupSpec, query: QuerySet, columns: Dict[str, str]) -> QuerySet:
+        """排除维度为空的数据：字符串维度为空字符串，其余维度为 NULL"""
+        for name, column in columns.items():
+            _, length = spec.dims[name]
+            if length:
+                query = query.exclude(**{column: ""})
+            else:
+                query = query.filter(**{f"{column}__isnull": False})
+        return query
+
+    @staticmethod
+    def _normalize(spec: _RollupSpec, name: str, value):
+        if name == "day":
+            return date_key(value)
+        _, length = spec.dims[name]
+        return _clip(value, length)
+
+
+async def _main():
+    import argparse
+
+    from utils.database import close_db, init_db
+
+    parser = argparse.ArgumentParser(description="重建日志每日汇总")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="开始日期 YYYY-MM-DD，默认最早日志")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="结束日期 YYYY-MM-DD，默认今天")
+    parser.add_argument("--kind", choices=[LOGIN, OPERATION], default=None, help="日志类型，默认全部")
+    args = parser.parse_args()
+
+    await init_db()
+    try:
+        await LogRollup.rebuild(args.start, args.end, kinds=[args.kind] if args.kind else (LOGIN, OPERATION))
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,333 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : log_writer.py
+# @Comment : 日志批量异步写入 - 进程内有界队列 + 后台批量 bulk_create，溢出策略可配置
+
+import asyncio
+import base64
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from tortoise import timezone
+from tortoise.exceptions import ConfigurationError, FieldError, IntegrityError, ValidationError
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+from utils.log import logger
+from utils.log_enricher import LogEnricher
+
+# 溢出落盘文件（与 Casbin 策略快照同目录，基于运行目录）
+DEFAULT_SPILL_PATH = os.path.join(os.getcwd(), "cache", "log_spill.jsonl")
+# 溢出策略
+OVERFLOW_DROP = "drop"
+OVERFLOW_BLOCK = "block"
+OVERFLOW_SPILL = "spill"
+# 重试也不会成功的写入错误（约束冲突、字段校验失败等），遇到时直接丢弃该条日志
+PERMANENT_ERRORS = (IntegrityError, ValidationError, FieldError, ConfigurationError, TypeError, ValueError)
+
+
+def _json_default(value: Any):
+    """落盘序列化：二进制字段转为 base64，其余转为字符串"""
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    return str(value)
+
+
+def _json_object_hook(obj: dict):
+    if len(obj) == 1 and "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+
+class LogWriter:
+    """
+    日志批量写入器
+
+    - 请求路径只把日志字段放入进程内有界队列，不再等待数据库写入
+    - 后台任务每 flush_interval 毫秒或攒满 batch_size 条时按表 bulk_create 一次
+    - 队列满时按溢出策略处理：drop 丢弃 / block 等待队列空位 / spill 追加到本地 JSONL 文件，
+      落盘数据在下次启动时回放入库
+    - 批量写入失败时逐条重写，只处理写入失败的行：约束冲突、字段校验等永久性错误直接丢弃，
+      其余（连接中断等）在 spill 策略下落盘、其他策略下计为失败，回放时同样处理，坏数据不会反复落盘
+    - 应用关闭时（lifespan）排空队列并写完最后一批
+    - 未启动（如脚本、测试环境）时退化为直接写库
+    - 请求路径只携带原始 IP / User-Agent（LogEnricher.raw_fields），属地与 UA 在后台写库前按批解析
+    - 写库成功后通知已注册的监听器（如每日汇总），监听器异常不影响日志写入
+    """
+
+    _queue: Optional[asyncio.Queue] = None
+    _task: Optional[asyncio.Task] = None
+    # 模型类名 -> 模型类
+    _models: Dict[str, Type[Model]] = {}
+    _batch_size: int = 200
+    _flush_interval: float = 0.5
+    _overflow: str = OVERFLOW_SPILL
+    _spill_path: str = DEFAULT_SPILL_PATH
+    _last_drop_warning: float = 0.0
+    # 写入成功后的监听器，参数为已写入的模型实例列表
+    _listeners: List[Callable[[List[Model]], Awaitable[None]]] = []
+    _stats: Dict[str, int] = {
+        "enqueued": 0,
+        "written": 0,
+        "batches": 0,
+        "dropped": 0,
+        "spilled": 0,
+        "replayed": 0,
+        "failed": 0,
+    }
+
+    @classmethod
+    async def start(
+            cls,
+            models: List[Type[Model]],
+            batch_size: int = 200,
+            flush_interval_ms: int = 500,
+            queue_size: int = 10000,
+            overflow: str = OVERFLOW_SPILL,
+            spill_path: str = DEFAULT_SPILL_PATH,
+    ):
+        """
+        启动后台写入任务
+
+        :param models: 日志模型类，用于回放落盘日志
+        :param batch_size: 单批最大条数
+        :param flush_interval_ms: 最长攒批时间（毫秒）
+        :param queue_size: 队列容量，决定内存上限
+        :param overflow: 队列满时的策略：drop / block / spill
+        :param spill_path: 落盘文件路径
+        """
+        if cls._task is not None:
+            return
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_BLOCK, OVERFLOW_SPILL):
+            logger.warning(f"未知的日志溢出策略 {overflow}，使用 {OVERFLOW_SPILL}")
+            overflow = OVERFLOW_SPILL
+        cls._models.update({model.__name__: model for model in models})
+        cls._batch_size = max(1, batch_size)
+        cls._flush_interval = max(1, flush_interval_ms) / 1000
+        cls._overflow = overflow
+        cls._spill_path = spill_path
+        await cls._replay_spill()
+        cls._queue = asyncio.Queue(maxsize=max(1, queue_size))
+        cls._task = asyncio.create_task(cls._run(cls._queue), name="log-writer")
+        logger.info(
+            f"日志批量写入已启动: batch_size={cls._batch_size}, "
+            f"flush_interval={flush_interval_ms}ms, queue_size={queue_size}, overflow={overflow}"
+        )
+
+    @classmethod
+    async def shutdown(cls, timeout: float = 10.0):
+        """停止写入任务：排空队列并写完最后一批，超时则将剩余日志落盘"""
+        queue, task = cls._queue, cls._task
+        if task is None:
+            return
+        # 先摘除队列，之后的日志直接写库
+        cls._queue, cls._task = None, None
+        await queue.put(None)
+        try:
+            await asyncio.wait_for(task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("日志写入任务关闭超时，剩余日志落盘")
+            remaining = []
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is not None:
+                    remaining.append(item)
+            await cls._spill(remaining)
+        except Exception as e:
+            logger.error(f"日志写入任务异常退出: {e}")
+        logger.info(f"日志批量写入已停止: {cls.stats()}")
+
+    @classmethod
+    def add_listener(cls, listener: Callable[[List[Model]], Awaitable[None]]):
+        """注册写入成功后的监听器（同一监听器只注册一次）"""
+        if listener not in cls._listeners:
+            cls._listeners.append(listener)
+
+    @classmethod
+    async def write(cls, model: Type[Model], **fields: Any):
+        """
+        写入一条日志
+
+        :param model: 日志模型类
+        :param fields: 模型字段（外键请传 *_id 形式的主键值，以便落盘）
+        """
+        queue = cls._queue
+        if queue is None:
+            LogEnricher.enrich(model.__name__, fields)
+            await cls._notify([await model.create(**fields)])
+            return
+
+        cls._models.setdefault(model.__name__, model)
+        # 入队时记录时间，避免批量写入延迟影响 created_at
+        fields.setdefault("created_at", timezone.now())
+        item = (model.__name__, fields)
+        cls._stats["enqueued"] += 1
+        try:
+            queue.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if cls._overflow == OVERFLOW_BLOCK:
+            await queue.put(item)
+        elif cls._overflow == OVERFLOW_SPILL:
+            await cls._spill([item])
+        else:
+            cls._stats["dropped"] += 1
+            now = time.monotonic()
+            if now - cls._last_drop_warning > 10:
+                cls._last_drop_warning = now
+                logger.warning(f"日志队列已满，丢弃日志（累计 {cls._stats['dropped']} 条）")
+
+    @classmethod
+    def stats(cls) -> dict:
+        """写入统计"""
+        return {
+            **cls._stats,
+            "running": cls._task is not None,
+            "queued": cls._queue.qsize() if cls._queue is not None else 0,
+            "overflow": cls._overflow,
+        }
+
+    # ==================== 后台任务 ====================
+
+    @classmethod
+    async def _run(cls, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + cls._flush_interval
+            while len(batch) < cls._batch_size:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await cls._flush(batch)
+
+    @classmethod
+    async def _flush(cls, batch: List[Tuple[str, dict]]):
+        """补全属地与 UA 字段后按日志类型分组批量写入"""
+        LogEnricher.enrich_batch(batch)
+        grouped: Dict[str, List[dict]] = {}
+        for kind, fields in batch:
+            grouped.setdefault(kind, []).append(fields)
+        for kind, rows in grouped.items():
+            model = cls._models.get(kind)
+            if model is None:
+                logger.error(f"未注册的日志类型: {kind}，丢弃 {len(rows)} 条")
+                cls._stats["failed"] += len(rows)
+                continue
+            try:
+                objs = [model(**fields) for fields in rows]
+                # 事务内写入，失败时整批回滚，逐条重写不会产生重复数据
+                async with in_transaction():
+                    await model.bulk_create(objs)
+                cls._stats["written"] += len(rows)
+                cls._stats["batches"] += 1
+            except Exception as e:
+                logger.error(f"批量写入日志失败（{kind}，{len(rows)} 条），改为逐条写入: {e}")
+                objs = await cls._write_rows(kind, model, rows)
+            if objs:
+                await cls._notify(objs)
+
+    @classmethod
+    async def _write_rows(cls, kind: str, model: Type[Model], rows: List[dict]) -> List[Model]:
+        """逐条写入，返回写入成功的实例；永久性错误丢弃，其余按溢出策略落盘或计为失败"""
+        written: List[Model] = []
+        retry: List[Tuple[str, dict]] = []
+        discarded = 0
+        for fields in rows:
+            try:
+                written.append(await model.create(**fields))
+            except PERMANENT_ERRORS as e:
+                discarded += 1
+                logger.debug(f"丢弃无法写入的日志（{kind}）: {e}")
+            except Exception:
+                retry.append((kind, fields))
+        cls._stats["written"] += len(written)
+        cls._stats["failed"] += discarded
+        if discarded:
+            logger.error(f"{kind} 有 {discarded} 条日志数据无效，已丢弃")
+        if retry:
+            if cls._overflow == OVERFLOW_SPILL:
+                await cls._spill(retry)
+            else:
+                cls._stats["failed"] += len(retry)
+        return written
+
+    @classmethod
+    async def _notify(cls, objs: List[Model]):
+        for listener in cls._listeners:
+            try:
+                await listener(objs)
+            except Exception as e:
+                logger.error(f"日志写入监听器执行失败: {e}")
+
+    # ==================== 落盘与回放 ====================
+
+    @classmethod
+    async def _spill(cls, items: List[Tuple[str, dict]]):
+        if not items:
+            return
+        lines = [
+            json.dumps({"kind": kind, "fields": fields}, ensure_ascii=False, default=_json_default)
+            for kind, fields in items
+        ]
+        try:
+            await asyncio.to_thread(cls._append_lines, cls._spill_path, lines)
+            cls._stats["spilled"] += len(items)
+        except Exception as e:
+            logger.error(f"日志落盘失败，丢弃 {len(items)} 条: {e}")
+            cls._stats["failed"] += len(items)
+
+    @staticmethod
+    def _append_lines(path: str, lines: List[str]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    @classmethod
+    async def _replay_spill(cls):
+        """启动时回放上次落盘的日志"""
+        path = cls._spill_path
+        if not os.path.exists(path):
+            return
+        # 先改名再读取，回放期间新的落盘写入新文件
+        replay_path = f"{path}.{os.getpid()}.replay"
+        try:
+            os.replace(path, replay_path)
+            with open(replay_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError as e:
+            logger.warning(f"读取落盘日志失败: {e}")
+            return
+
+        items = []
+        for line in lines:
+            try:
+                record = json.loads(line, object_hook=_json_object_hook)
+                items.append((record["kind"], record["fields"]))
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+        for i in range(0, len(items), cls._batch_size):
+            await cls._flush(items[i:i + cls._batch_size])
+        cls._stats["replayed"] += len(items)
+        os.remove(replay_path)
+        logger.info(f"已回放落盘日志 {len(items)} 条")
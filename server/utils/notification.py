@@ -4,89 +4,517 @@
 # @File : notification.py
 # @Comment : 通知工具类 - WebSocket 管理和 Redis 操作
 
+import asyncio
 import json
+import math
+from collections import deque
+import os
+import time
+import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Set
+from typing import Deque, Dict, List, Optional, Set, Tuple, Union
 from fastapi import WebSocket
 from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
 
+from utils.config import config
 from utils.log import logger
 from utils.get_redis import RedisKeyConfig
 from models import SystemNotification, UserNotification
 from models.notification import NotificationType, NotificationStatus
 
+# 减少未读计数：KEYS[1] 未读计数哈希；ARGV 用户ID、减少数量。结果不大于 0 时移除字段
+_DECREMENT_UNREAD_SCRIPT = """
+local count = redis.call('HINCRBY', KEYS[1], ARGV[1], -tonumber(ARGV[2]))
+if count <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    return 0
+end
+return count
+"""
+
+# 注销进程的在线登记：KEYS[1] 用户哈希，KEYS[2] 在线用户集合；ARGV 进程ID、当前时间戳、用户ID
+# 其他进程仍持有该用户连接（登记未过期）时保留在线状态
+_MARK_OFFLINE_SCRIPT = """
+redis.call('HDEL', KEYS[1], ARGV[1])
+local now = tonumber(ARGV[2])
+local fields = redis.call('HGETALL', KEYS[1])
+for i = 2, #fields, 2 do
+    if tonumber(fields[i]) > now then
+        return 1
+    end
+end
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[3])
+return 0
+"""
+
+# 发送队列已满时的处理策略
+QUEUE_DROP_OLDEST = "drop_oldest"
+QUEUE_DISCONNECT = "disconnect"
+
+
+class WebSocketConnection:
+    """
+    单个 WebSocket 连接的发送队列
+
+    - 推送只把序列化好的消息放入有界队列，由连接自己的写任务按序发送，慢连接不阻塞其他连接
+    - 队列已满：drop_oldest 丢弃最早的消息；disconnect 断开该连接（客户端重连后拉取未读通知）
+    - 单条消息发送超过 ws_send_timeout 秒视为连接停滞，断开连接
+    """
+
+    # 连接被判定为慢消费者时的关闭码（1008 策略违规）
+    SLOW_CONSUMER_CODE = 1008
+
+    def __init__(self, websocket: WebSocket, user_id: str, manager: "ConnectionManager"):
+        app_config = config.app()
+        self.websocket = websocket
+        self.user_id = user_id
+        self._manager = manager
+        self._maxsize = max(1, app_config.ws_send_queue_size)
+        self._policy = QUEUE_DISCONNECT if app_config.ws_queue_full_policy == QUEUE_DISCONNECT else QUEUE_DROP_OLDEST
+        self._send_timeout = app_config.ws_send_timeout
+        # (入队时间, 消息文本)
+        self._queue: Deque[Tuple[float, str]] = deque()
+        self._ready = asyncio.Event()
+        self._close_reason: Optional[str] = None
+        self._task = asyncio.create_task(self._writer(), name=f"ws-writer-{user_id}")
+
+    @property
+    def depth(self) -> int:
+        """当前排队的消息数"""
+        return len(self._queue)
+
+    def enqueue(self, text: str) -> bool:
+        """
+        放入发送队列（不等待发送）
+
+        :return: 是否已入队（连接正在关闭时返回 False）
+        """
+        if self._close_reason is not None:
+            return False
+        stats = self._manager.stats
+        if len(self._queue) >= self._maxsize:
+            if self._policy == QUEUE_DISCONNECT:
+                stats["slow_disconnects"] += 1
+                self.close("消息积压，连接已断开")
+                return False
+            self._queue.popleft()
+            stats["dropped"] += 1
+        self._queue.append((time.monotonic(), text))
+        stats["enqueued"] += 1
+        self._ready.set()
+        return True
+
+    def close(self, reason: str):
+        """清空队列并由写任务关闭连接"""
+        if self._close_reason is None:
+            self._close_reason = reason
+            self._queue.clear()
+            self._ready.set()
+
+    async def stop(self):
+        """停止写任务（连接已断开时调用）"""
+        self._close_reason = self._close_reason or "连接已断开"
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _writer(self):
+        """写任务：按序发送队列中的消息"""
+        while True:
+            while not self._queue and self._close_reason is None:
+                self._ready.clear()
+                await self._ready.wait()
+            if self._close_reason is not None:
+                break
+            enqueued_at, text = self._queue.popleft()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(text), timeout=self._send_timeout)
+            except asyncio.TimeoutError:
+                self._manager.stats["slow_disconnects"] += 1
+                self._close_reason = "发送超时，连接已断开"
+                break
+            except Exception as e:
+                logger.warning(f"发送消息失败: {e}")
+                self._manager.stats["send_failures"] += 1
+                self._close_reason = "发送失败"
+                break
+            self._manager.record_latency(time.monotonic() - enqueued_at)
+
+        self._queue.clear()
+        try:
+            await self.websocket.close(code=self.SLOW_CONSUMER_CODE, reason=self._close_reason)
+        except Exception:
+            pass
+        await self._manager.disconnect(self.websocket, self.user_id)
+
 
 class ConnectionManager:
-    """WebSocket 连接管理器"""
-    
+    """
+    WebSocket 连接管理器
+
+    - 连接只保存在持有它的进程中；未调用 start 时为单进程模式，所有操作只作用于本进程
+    - start 后接入 Redis：发往其他进程连接的消息经 Pub/Sub 频道转发，由持有连接的进程投递；
+      在线状态记录在 Redis 中并按心跳续期，进程异常退出后其连接用户在 ws_presence_ttl 秒后视为离线
+    - 在线状态结构：
+      ws_presence:users      有序集合，用户ID -> 在线截止时间戳（任一进程持有该用户连接即续期）
+      ws_presence:user:{id}  哈希，进程ID -> 在线截止时间戳（用于判断用户是否还在其他进程在线）
+      ws_presence:workers    有序集合，进程ID -> 在线截止时间戳
+    - 每个连接持有有界发送队列（WebSocketConnection），发送接口只负责序列化一次并入队
+    """
+
+    # 单条跨进程消息携带的最大用户数
+    PUBLISH_CHUNK_SIZE = 500
+    # 计算发送延迟分位数保留的最近样本数
+    LATENCY_SAMPLES = 1024
+
     def __init__(self):
-        # user_id -> set of WebSocket connections
-        self._connections: Dict[str, Set[WebSocket]] = {}
-    
+        # user_id -> {WebSocket: 发送队列}
+        self._connections: Dict[str, Dict[WebSocket, WebSocketConnection]] = {}
+        self._redis: Optional[AsyncRedis] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_heartbeat = 0.0
+
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.channel = f"{RedisKeyConfig.WS_MESSAGE.key}:channel"
+        self.users_key = f"{RedisKeyConfig.WS_PRESENCE.key}:users"
+        self.workers_key = f"{RedisKeyConfig.WS_PRESENCE.key}:workers"
+
+        self.stats = {
+            "published": 0, "received": 0, "heartbeats": 0, "cluster_workers": 1,
+            "enqueued": 0, "delivered": 0, "dropped": 0, "slow_disconnects": 0, "send_failures": 0,
+        }
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._latency_samples: Deque[float] = deque(maxlen=self.LATENCY_SAMPLES)
+
+    def _user_key(self, user_id: str) -> str:
+        return f"{RedisKeyConfig.WS_PRESENCE.key}:user:{user_id}"
+
+    # ==================== 连接 ====================
+
     async def connect(self, websocket: WebSocket, user_id: str):
-        """建立连接"""
+        """建立连接（连接成功消息在注册时同步入队，保证先于任何推送发出）"""
         await websocket.accept()
-        if user_id not in self._connections:
-            self._connections[user_id] = set()
-        self._connections[user_id].add(websocket)
+        first = user_id not in self._connections
+        if first:
+            self._connections[user_id] = {}
+        connection = WebSocketConnection(websocket, user_id, self)
+        connection.enqueue(self._dumps({"type": "connected", "data": {"message": "WebSocket 连接成功"}}))
+        self._connections[user_id][websocket] = connection
+        if first:
+            await self._mark_online([user_id])
         logger.info(f"WebSocket 连接建立: user_id={user_id}")
-    
-    def disconnect(self, websocket: WebSocket, user_id: str):
+
+    async def disconnect(self, websocket: WebSocket, user_id: str):
         """断开连接"""
-        if user_id in self._connections:
-            self._connections[user_id].discard(websocket)
-            if not self._connections[user_id]:
-                del self._connections[user_id]
+        if await self._discard(websocket, user_id):
+            await self._mark_offline(user_id)
         logger.info(f"WebSocket 连接断开: user_id={user_id}")
-    
+
+    async def _discard(self, websocket: WebSocket, user_id: str) -> bool:
+        """移除本地连接并停止其写任务，返回该用户在本进程是否已无连接"""
+        sockets = self._connections.get(user_id)
+        if sockets is None:
+            return False
+        connection = sockets.pop(websocket, None)
+        if not sockets:
+            del self._connections[user_id]
+        if connection is None:
+            return False
+        await connection.stop()
+        return user_id not in self._connections
+
+    # ==================== 发送 ====================
+
     async def send_to_user(self, user_id: str, message: dict) -> bool:
-        """发送消息给指定用户"""
-        if user_id not in self._connections:
+        """
+        发送消息给指定用户（本进程直接投递，其他进程经频道转发）
+
+        :return: 用户是否在线（任一进程持有其连接）
+        """
+        delivered = self._send_local(user_id, self._dumps(message))
+        if self._redis is None:
+            return delivered
+        await self._publish([user_id], message)
+        return delivered or await self.is_online(user_id)
+
+    def send_to_socket(self, websocket: WebSocket, user_id: str, message: Union[dict, str]) -> bool:
+        """
+        发送消息给本进程的指定连接（请求响应、心跳等），与推送共用该连接的发送队列
+
+        :param message: 消息字典，或已序列化的文本（如 pong）
+        :return: 是否已入队（连接不存在或正在关闭时返回 False）
+        """
+        connection = self._connections.get(user_id, {}).get(websocket)
+        if connection is None:
             return False
-        
-        disconnected = set()
-        for ws in self._connections[user_id]:
-            try:
-                await ws.send_json(message)
-            except Exception as e:
-                logger.warning(f"发送消息失败: {e}")
-                disconnected.add(ws)
-        
-        # 清理断开的连接
-        for ws in disconnected:
-            self._connections[user_id].discard(ws)
-        
-        return True
-    
+        return connection.enqueue(message if isinstance(message, str) else self._dumps(message))
+
     async def send_to_users(self, user_ids: List[str], message: dict):
-        """发送消息给多个用户"""
+        """发送消息给多个用户（只入队，不等待发送）"""
+        text = self._dumps(message)
         for user_id in user_ids:
-            await self.send_to_user(user_id, message)
-    
+            self._send_local(user_id, text)
+        if self._redis is not None:
+            user_ids = list(user_ids)
+            for i in range(0, len(user_ids), self.PUBLISH_CHUNK_SIZE):
+                await self._publish(user_ids[i:i + self.PUBLISH_CHUNK_SIZE], message)
+
     async def broadcast(self, message: dict):
-        """广播消息给所有在线用户"""
+        """广播消息给所有在线用户（含其他进程）"""
+        text = self._dumps(message)
         for user_id in list(self._connections.keys()):
-            await self.send_to_user(user_id, message)
-    
-    def get_online_users(self) -> List[str]:
-        """获取所有在线用户ID"""
+            self._send_local(user_id, text)
+        if self._redis is not None:
+            await self._publish(None, message)
+
+    def _send_local(self, user_id: str, text: str) -> bool:
+        """放入本进程持有的连接的发送队列"""
+        sockets = self._connections.get(user_id)
+        if not sockets:
+            return False
+        for connection in list(sockets.values()):
+            connection.enqueue(text)
+        return True
+
+    @staticmethod
+    def _dumps(message: dict) -> str:
+        """序列化消息（与 send_json 的输出一致），多个连接共享同一份文本"""
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+    def record_latency(self, seconds: float):
+        """记录一条消息从入队到发送完成的耗时"""
+        self.stats["delivered"] += 1
+        self._latency_total += seconds
+        self._latency_max = max(self._latency_max, seconds)
+        self._latency_samples.append(seconds)
+
+    async def _publish(self, user_ids: Optional[List[str]], message: dict):
+        """发布跨进程消息，user_ids 为 None 表示广播"""
+        payload = json.dumps({"w": self.worker_id, "u": user_ids, "m": message}, ensure_ascii=False)
+        try:
+            await self._redis.publish(self.channel, payload)
+            self.stats["published"] += 1
+        except RedisError as e:
+            logger.warning(f"WebSocket 消息跨进程转发失败: {e}")
+
+    # ==================== 在线状态 ====================
+
+    def get_local_users(self) -> List[str]:
+        """获取本进程持有连接的用户ID"""
         return list(self._connections.keys())
-    
-    def is_online(self, user_id: str) -> bool:
-        """检查用户是否在线"""
+
+    def is_local(self, user_id: str) -> bool:
+        """检查用户是否连接在本进程"""
         return user_id in self._connections and len(self._connections[user_id]) > 0
 
+    async def get_online_users(self) -> List[str]:
+        """获取所有在线用户ID（全部进程）"""
+        if self._redis is None:
+            return self.get_local_users()
+        try:
+            users = await self._redis.zrangebyscore(self.users_key, time.time(), "+inf")
+        except RedisError as e:
+            logger.warning(f"读取在线用户失败，仅返回本进程用户: {e}")
+            return self.get_local_users()
+        return list(set(users) | set(self._connections))
+
+    async def is_online(self, user_id: str) -> bool:
+        """检查用户是否在线（全部进程）"""
+        return user_id in await self.filter_online([user_id])
+
+    async def filter_online(self, user_ids: List[str]) -> Set[str]:
+        """
+        批量检查在线状态
+
+        :return: 在线的用户ID集合
+        """
+        online = {user_id for user_id in user_ids if self.is_local(user_id)}
+        remaining = [user_id for user_id in user_ids if user_id not in online]
+        if self._redis is None or not remaining:
+            return online
+        now = time.time()
+        try:
+            for i in range(0, len(remaining), self.PUBLISH_CHUNK_SIZE):
+                chunk = remaining[i:i + self.PUBLISH_CHUNK_SIZE]
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for user_id in chunk:
+                        pipe.zscore(self.users_key, user_id)
+                    scores = await pipe.execute()
+                online.update(user_id for user_id, score in zip(chunk, scores) if score and score > now)
+        except RedisError as e:
+            logger.warning(f"读取在线状态失败，仅按本进程连接判断: {e}")
+        return online
+
+    async def _mark_online(self, user_ids: List[str]):
+        """登记 / 续期本进程连接用户的在线状态"""
+        if self._redis is None or not user_ids:
+            return
+        ttl = config.app().ws_presence_ttl
+        expire_at = time.time() + ttl
+        try:
+            for i in range(0, len(user_ids), self.PUBLISH_CHUNK_SIZE):
+                chunk = user_ids[i:i + self.PUBLISH_CHUNK_SIZE]
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for user_id in chunk:
+                        pipe.hset(self._user_key(user_id), self.worker_id, expire_at)
+                        pipe.expire(self._user_key(user_id), ttl)
+                    pipe.zadd(self.users_key, {user_id: expire_at for user_id in chunk})
+                    await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"登记 WebSocket 在线状态失败: {e}")
+
+    async def _mark_offline(self, user_id: str):
+        """注销本进程对该用户的在线登记，其他进程也无连接时用户离线"""
+        if self._redis is None:
+            return
+        try:
+            await self._redis.eval(
+                _MARK_OFFLINE_SCRIPT, 2, self._user_key(user_id), self.users_key,
+                self.worker_id, time.time(), user_id,
+            )
+        except RedisError as e:
+            logger.warning(f"注销 WebSocket 在线状态失败: {e}")
+
+    async def _heartbeat(self):
+        """续期本进程在线登记，清理已过期的用户"""
+        self._last_heartbeat = time.monotonic()
+        if self._redis is None:
+            return
+        now = time.time()
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.zadd(self.workers_key, {self.worker_id: now + config.app().ws_presence_ttl})
+                pipe.zremrangebyscore(self.workers_key, "-inf", now)
+                pipe.zremrangebyscore(self.users_key, "-inf", now)
+                pipe.zcard(self.workers_key)
+                self.stats["cluster_workers"] = (await pipe.execute())[-1]
+        except RedisError as e:
+            logger.warning(f"WebSocket 在线心跳失败: {e}")
+            return
+        await self._mark_online(self.get_local_users())
+        self.stats["heartbeats"] += 1
+
+    # ==================== 跨进程订阅 ====================
+
+    def start(self, redis: AsyncRedis):
+        """接入 Redis 并启动订阅与心跳任务"""
+        self._redis = redis
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="ws-backplane")
+
+    async def stop(self):
+        """停止后台任务并注销本进程的在线登记"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._redis is not None:
+            for user_id in self.get_local_users():
+                await self._mark_offline(user_id)
+            try:
+                await self._redis.zrem(self.workers_key, self.worker_id)
+            except RedisError:
+                pass
+            self._redis = None
+
+    async def _run(self):
+        """订阅主循环，断线后自动重连"""
+        backoff = 1.0
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                logger.info(f"WebSocket 跨进程消息已订阅 {self.channel}（worker={self.worker_id}）")
+                # Redis 重启后在线登记丢失，重连时立即补登
+                await self._heartbeat()
+                backoff = 1.0
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        await self._on_message(message.get("data"))
+                    if time.monotonic() - self._last_heartbeat >= config.app().ws_heartbeat_interval:
+                        await self._heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"WebSocket 跨进程订阅连接异常，{backoff:.0f} 秒后重连: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def _on_message(self, data):
+        """投递其他进程转发来的消息"""
+        try:
+            payload = json.loads(data)
+            origin, user_ids, message = payload["w"], payload["u"], payload["m"]
+        except (TypeError, ValueError, KeyError) as e:
+            logger.warning(f"忽略无法解析的 WebSocket 跨进程消息: {e}")
+            return
+        if origin == self.worker_id:
+            # 本进程发布的消息已直接投递
+            return
+        self.stats["received"] += 1
+        targets = self.get_local_users() if user_ids is None else [u for u in user_ids if u in self._connections]
+        text = self._dumps(message)
+        for user_id in targets:
+            self._send_local(user_id, text)
+
+    def connection_stats(self) -> dict:
+        """连接、发送队列与跨进程转发统计（延迟单位：毫秒）"""
+        depths = [connection.depth for sockets in self._connections.values() for connection in sockets.values()]
+        samples = sorted(self._latency_samples)
+        # nearest-rank 百分位：第 ceil(0.95 * n) 个样本
+        p95_index = max(0, math.ceil(0.95 * len(samples)) - 1)
+        delivered = self.stats["delivered"]
+        return {
+            "worker_id": self.worker_id,
+            "backplane": self._redis is not None,
+            "local_users": len(self._connections),
+            "local_connections": len(depths),
+            "queue_depth": {"total": sum(depths), "max": max(depths, default=0)},
+            "send_latency_ms": {
+                "avg": round(self._latency_total / delivered * 1000, 3) if delivered else 0.0,
+                "p95": round(samples[p95_index] * 1000, 3) if samples else 0.0,
+                "max": round(self._latency_max * 1000, 3),
+            },
+            **self.stats,
+        }
+
 
 # 全局连接管理器实例
 ws_manager = ConnectionManager()
 
 
 class NotificationService:
-    """通知服务"""
+    """
+    通知服务
+
+    - 未读计数保存在单个哈希 notification_unread 中（用户ID -> 未读数）
+    - 批量推送按 PIPELINE_CHUNK_SIZE 个用户一组，每组一次管道往返写入未读计数与待推送集合
+    """
     
     # Redis key 前缀
     NOTIFICATION_KEY = f"{RedisKeyConfig.SYSTEM_CONFIG.key}:notification"
-    UNREAD_COUNT_KEY = f"{RedisKeyConfig.SYSTEM_CONFIG.key}:unread_count"
+    UNREAD_COUNT_KEY = RedisKeyConfig.NOTIFICATION_UNREAD.key
+    # 旧版按用户存储的未读计数键前缀（启动时迁移到哈希）
+    LEGACY_UNREAD_COUNT_KEY = f"{RedisKeyConfig.SYSTEM_CONFIG.key}:unread_count"
+    # 待推送通知保留时间
+    PENDING_TTL = timedelta(hours=24)
+    # 单次管道包含的用户数
+    PIPELINE_CHUNK_SIZE = 1000
     
     def __init__(self, redis: AsyncRedis):
         self._redis = redis
@@ -106,66 +534,102 @@ class NotificationService:
         - 通过 WebSocket 实时推送给在线用户
         - 存储到 Redis 供离线用户获取
         """
-        message = {
-            "type": "notification",
-            "data": {
-                "id": notification_id,
-                "title": title,
-                "content": content[:200],  # 预览内容
-                "notification_type": notification_type,
-                "priority": priority,
-                "creator_name": creator_name,
-                "created_at": datetime.now().isoformat()
-            }
-        }
-        
-        # 推送给在线用户
-        online_users = []
-        offline_users = []
+        message = self.build_message(notification_id, title, content, notification_type, priority, creator_name)
         
-        for user_id in target_user_ids:
-            if ws_manager.is_online(user_id):
-                online_users.append(user_id)
-            else:
-                offline_users.append(user_id)
+        # 推送给在线用户（含连接在其他进程的用户）
+        online_set = await ws_manager.filter_online(target_user_ids)
+        online_users = [user_id for user_id in target_user_ids if user_id in online_set]
+        offline_users = [user_id for user_id in target_user_ids if user_id not in online_set]
         
         # WebSocket 推送
         if online_users:
             await ws_manager.send_to_users(online_users, message)
             logger.info(f"通知已推送给 {len(online_users)} 个在线用户")
         
-        # 更新所有目标用户的未读计数
-        for user_id in target_user_ids:
-            await self.increment_unread_count(user_id)
-        
-        # 存储通知到 Redis（用于离线用户获取）
-        await self._store_notification_to_redis(notification_id, message, target_user_ids)
+        # 存储通知到 Redis（用于离线用户获取），同时累加所有目标用户的未读计数
+        await self._store_notification_to_redis(notification_id, message, target_user_ids, increment_unread=True)
         
         return {
             "online_count": len(online_users),
             "offline_count": len(offline_users)
         }
     
+    async def push_broadcast(
+        self,
+        notification_id: str,
+        title: str,
+        content: str,
+        notification_type: int,
+        priority: int,
+        user_ids: Optional[List[str]] = None,
+        creator_name: str = "系统"
+    ):
+        """
+        推送读时合并的通知：只推送给在线用户，不写未读计数与待推送集合（用户读取时按范围合并，
+        HTTP 轮询与重连时由 NotificationFeed.pending 补发）
+
+        :param user_ids: 在线的目标用户，None 表示广播给全部在线用户
+        """
+        message = self.build_message(notification_id, title, content, notification_type, priority, creator_name)
+        if user_ids is None:
+            await ws_manager.broadcast(message)
+        elif user_ids:
+            await ws_manager.send_to_users(user_ids, message)
+    
+    @staticmethod
+    def build_message(
+        notification_id: str,
+        title: str,
+        content: str,
+        notification_type: int,
+        priority: int,
+        creator_name: str = "系统"
+    ) -> dict:
+        """构造 WebSocket 通知消息"""
+        return {
+            "type": "notification",
+            "data": {
+                "id": notification_id,
+                "title": title,
+                "content": content[:200],  # 预览内容
+                "notification_type": notification_type,
+                "priority": priority,
+                "creator_name": creator_name,
+                "created_at": datetime.now().isoformat()
+            }
+        }
+    
     async def _store_notification_to_redis(
         self,
         notification_id: str,
         message: dict,
-        target_user_ids: List[str]
+        target_user_ids: List[str],
+        increment_unread: bool = False
     ):
-        """存储通知到 Redis"""
+        """
+        存储通知到 Redis
+
+        :param increment_unread: 是否在同一管道中累加目标用户的未读计数
+        """
         # 存储通知内容（24小时过期）
         key = f"{self.NOTIFICATION_KEY}:{notification_id}"
-        await self._redis.setex(
-            key,
-            timedelta(hours=24),
-            json.dumps(message, ensure_ascii=False)
-        )
+        await self._redis.setex(key, self.PENDING_TTL, json.dumps(message, ensure_ascii=False))
         
         # 为每个用户添加待推送通知ID
-        for user_id in target_user_ids:
-            user_key = f"{self.NOTIFICATION_KEY}:pending:{user_id}"
-            await self._redis.sadd(user_key, notification_id)
-            await self._redis.expire(user_key, timedelta(hours=24))
+        for chunk in self._chunks(target_user_ids):
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for user_id in chunk:
+                    user_key = f"{self.NOTIFICATION_KEY}:pending:{user_id}"
+                    pipe.sadd(user_key, notification_id)
+                    pipe.expire(user_key, self.PENDING_TTL)
+                    if increment_unread:
+                        pipe.hincrby(self.UNREAD_COUNT_KEY, user_id, 1)
+                await pipe.execute()
+    
+    def _chunks(self, user_ids: List[str]):
+        user_ids = list(user_ids)
+        for i in range(0, len(user_ids), self.PIPELINE_CHUNK_SIZE):
+            yield user_ids[i:i + self.PIPELINE_CHUNK_SIZE]
     
     async def get_pending_notifications(self, user_id: str) -> List[dict]:
         """获取用户的待推送通知（用于 HTTP 轮询）"""
@@ -187,29 +651,50 @@ class NotificationService:
     
     async def increment_unread_count(self, user_id: str):
         """增加用户未读计数"""
-        key = f"{self.UNREAD_COUNT_KEY}:{user_id}"
-        await self._redis.incr(key)
+        await self._redis.hincrby(self.UNREAD_COUNT_KEY, user_id, 1)
+    
+    async def increment_unread_counts(self, user_ids: List[str], count: int = 1):
+        """批量增加用户未读计数（按组管道写入）"""
+        for chunk in self._chunks(user_ids):
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for user_id in chunk:
+                    pipe.hincrby(self.UNREAD_COUNT_KEY, user_id, count)
+                await pipe.execute()
     
     async def get_unread_count(self, user_id: str) -> int:
         """获取用户未读计数"""
-        key = f"{self.UNREAD_COUNT_KEY}:{user_id}"
-        count = await self._redis.get(key)
+        count = await self._redis.hget(self.UNREAD_COUNT_KEY, user_id)
         return int(count) if count else 0
     
+    async def set_unread_count(self, user_id: str, count: int):
+        """设置用户未读计数（以数据库统计结果校正）"""
+        if count > 0:
+            await self._redis.hset(self.UNREAD_COUNT_KEY, user_id, count)
+        else:
+            await self._redis.hdel(self.UNREAD_COUNT_KEY, user_id)
+    
     async def reset_unread_count(self, user_id: str):
         """重置用户未读计数"""
-        key = f"{self.UNREAD_COUNT_KEY}:{user_id}"
-        await self._redis.delete(key)
+        await self._redis.hdel(self.UNREAD_COUNT_KEY, user_id)
     
     async def decrement_unread_count(self, user_id: str, count: int = 1):
-        """减少用户未读计数"""
-        key = f"{self.UNREAD_COUNT_KEY}:{user_id}"
-        current = await self.get_unread_count(user_id)
-        new_count = max(0, current - count)
-        if new_count > 0:
-            await self._redis.set(key, new_count)
-        else:
-            await self._redis.delete(key)
+        """减少用户未读计数（不小于 0，归零时移除字段）"""
+        await self._redis.eval(_DECREMENT_UNREAD_SCRIPT, 1, self.UNREAD_COUNT_KEY, user_id, count)
+    
+    async def migrate_unread_counts(self):
+        """将旧版按用户存储的未读计数键合并到哈希中（启动时调用，无旧键时只有一次 SCAN）"""
+        legacy_keys = [key async for key in self._redis.scan_iter(match=f"{self.LEGACY_UNREAD_COUNT_KEY}:*", count=1000)]
+        if not legacy_keys:
+            return
+        values = await self._redis.mget(legacy_keys)
+        prefix_length = len(self.LEGACY_UNREAD_COUNT_KEY) + 1
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key, value in zip(legacy_keys, values):
+                if value and int(value) > 0:
+                    pipe.hset(self.UNREAD_COUNT_KEY, key[prefix_length:], int(value))
+            pipe.delete(*legacy_keys)
+            await pipe.execute()
+        logger.info(f"已迁移 {len(legacy_keys)} 个未读计数键到 {self.UNREAD_COUNT_KEY}")
     
     async def send_login_notification(
         self,
@@ -260,8 +745,7 @@ class NotificationService:
             }
         }
         
-        if ws_manager.is_online(user_id):
-            await ws_manager.send_to_user(user_id, message)
+        if await ws_manager.send_to_user(user_id, message):
             logger.info(f"登录通知已推送给用户: {user_id}")
     
     async def get_login_notification(self, user_id: str) -> Optional[dict]:
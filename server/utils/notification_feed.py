@@ -0,0 +1,348 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : notification_feed.py
+# @Comment : 用户通知读取 - 合并个人通知记录与读时合并的全局/部门通知
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from redis.asyncio import Redis as AsyncRedis
+from tortoise.expressions import Q, Subquery
+
+from models import (
+    NotificationTarget,
+    SystemNotification,
+    SystemUser,
+    UserNotification,
+    UserNotificationWatermark,
+)
+from models.notification import NotificationDelivery, NotificationScope, NotificationStatus
+from utils.casbin import DepartmentHelper
+from utils.notification import NotificationService
+
+
+class NotificationFeed:
+    """
+    用户通知读取
+
+    - 个人通知：投递方式为发布时写入（FANOUT_ON_WRITE）的 UserNotification 记录，与原逻辑一致
+    - 读时合并通知（FANOUT_ON_READ）：全局通知对发布时已注册的用户可见；部门通知对目标部门及其下属部门的用户可见，
+      按用户所在部门的祖先部门匹配 NotificationTarget
+    - 读时合并通知的已读状态：发布时间不晚于用户水位线，或存在该用户的 UserNotification 记录（稀疏已读表）；
+      全部标记已读只推进水位线并清理水位线之前的稀疏记录
+    - 待推送通知（HTTP 轮询、WebSocket 建立连接时补发）：个人通知读取 Redis 待推送集合；读时合并通知按用户的
+      投递游标补发待推送有效期内发布且仍未读的通知，游标随之推进，同一通知只补发一次
+    """
+
+    # 列表返回字段（与个人通知记录的字段一致）
+    _PERSONAL_VALUES = {
+        "id": "id",
+        "is_read": "is_read",
+        "read_time": "read_time",
+        "created_at": "created_at",
+        "notification_id": "notification_id",
+        "title": "notification__title",
+        "content": "notification__content",
+        "notification_type": "notification__type",
+        "priority": "notification__priority",
+        "publish_time": "notification__publish_time",
+        "creator_name": "notification__creator__nickname",
+    }
+    _BROADCAST_VALUES = {
+        "id": "id",
+        "title": "title",
+        "content": "content",
+        "notification_type": "type",
+        "priority": "priority",
+        "publish_time": "publish_time",
+        "creator_name": "creator__nickname",
+    }
+
+    # ==================== 读者信息 ====================
+
+    @classmethod
+    async def _reader(cls, user_id: str) -> dict:
+        """读取用户的注册时间、所在部门的祖先部门与已读水位线"""
+        user = await SystemUser.filter(id=user_id).first().values("created_at", "department_id")
+        department_ids: List[str] = []
+        if user and user.get("department_id"):
+            department_ids = await DepartmentHelper.get_ancestor_department_ids(str(user["department_id"]))
+        watermark = await UserNotificationWatermark.filter(user_id=user_id).first().values_list("read_at", flat=True)
+        return {
+            "user_id": user_id,
+            "joined_at": user.get("created_at") if user else None,
+            "department_ids": department_ids,
+            "watermark": watermark,
+        }
+
+    # ==================== 过滤条件 ====================
+
+    @staticmethod
+    def _not_expired(prefix: str = "") -> Q:
+        return Q(**{f"{prefix}expire_time__isnull": True}) | Q(**{f"{prefix}expire_time__gt": datetime.now()})
+
+    @classmethod
+    def _personal_filter(cls, user_id: str, is_read: Optional[bool] = None, type: Optional[int] = None) -> Q:
+        """个人通知记录的过滤条件"""
+        query = Q(
+            user_id=user_id,
+            notification__is_del=False,
+            notification__status=NotificationStatus.PUBLISHED,
+            notification__delivery=NotificationDelivery.FANOUT_ON_WRITE,
+        ) & cls._not_expired("notification__")
+        if is_read is not None:
+            query &= Q(is_read=is_read)
+        if type is not None:
+            query &= Q(notification__type=type)
+        return query
+
+    @classmethod
+    def _broadcast_filter(cls, reader: dict, is_read: Optional[bool] = None, type: Optional[int] = None) -> Q:
+        """用户可见的读时合并通知的过滤条件"""
+        query = Q(
+            is_del=False,
+            status=NotificationStatus.PUBLISHED,
+            delivery=NotificationDelivery.FANOUT_ON_READ,
+        ) & cls._not_expired()
+        if reader["joined_at"] is not None:
+            query &= Q(publish_time__gte=reader["joined_at"])
+        audience = Q(scope=NotificationScope.ALL)
+        if reader["department_ids"]:
+            audience |= Q(
+                scope=NotificationScope.DEPARTMENT,
+                id__in=Subquery(
+                    NotificationTarget.filter(department_id__in=reader["department_ids"]).values("notification_id")
+                ),
+            )
+        query &= audience
+        if type is not None:
+            query &= Q(type=type)
+        if is_read is not None:
+            read_rows = Subquery(UserNotification.filter(user_id=reader["user_id"]).values("notification_id"))
+            watermark = reader["watermark"]
+            if is_read:
+                read = Q(id__in=read_rows)
+                if watermark is not None:
+                    read |= Q(publish_time__lte=watermark)
+                query &= read
+            else:
+                query &= Q(id__not_in=read_rows)
+                if watermark is not None:
+                    query &= Q(publish_time__gt=watermark)
+        return query
+
+    # ==================== 查询 ====================
+
+    @classmethod
+    async def list(
+            cls,
+            user_id: str,
+            page: int = 1,
+            page_size: int = 20,
+            is_read: Optional[bool] = None,
+            type: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        用户通知列表（个人通知与读时合并通知按时间倒序合并分页）
+
+        读时合并通知的 id 为通知ID（没有用户通知记录），标记已读接口同时接受两种ID
+
+        :return: {"result", "total", "page", "pageSize"}
+        """
+        page, page_size = max(1, page), max(1, page_size)
+        reader = await cls._reader(user_id)
+        personal_query = UserNotification.filter(cls._personal_filter(user_id, is_read, type))
+        broadcast_query = SystemNotification.filter(cls._broadcast_filter(reader, is_read, type))
+
+        # 两路各取前 page * page_size 条即可覆盖合并后的当前页
+        limit = page * page_size
+        personal = await personal_query.order_by("-created_at").limit(limit).values(**cls._PERSONAL_VALUES)
+        broadcasts = await broadcast_query.order_by("-publish_time").limit(limit).values(**cls._BROADCAST_VALUES)
+
+        read_times = {}
+        if broadcasts:
+            read_times = {
+                str(row["notification_id"]): row["read_time"]
+                for row in await UserNotification.filter(
+                    user_id=user_id, notification_id__in=[row["id"] for row in broadcasts]
+                ).values("notification_id", "read_time")
+            }
+        watermark = reader["watermark"]
+        for row in broadcasts:
+            notification_id = str(row["id"])
+            row["notification_id"] = row["id"]
+            row["created_at"] = row["publish_time"]
+            if notification_id in read_times:
+                row["is_read"], row["read_time"] = True, read_times[notification_id]
+            elif watermark is not None and row["publish_time"] <= watermark:
+                row["is_read"], row["read_time"] = True, watermark
+            else:
+                row["is_read"], row["read_time"] = False, None
+
+        merged = sorted(personal + broadcasts, key=lambda row: row["created_at"], reverse=True)
+        return {
+            "result": merged[(page - 1) * page_size: limit],
+            "total": await personal_query.count() + await broadcast_query.count(),
+            "page": page,
+            "pageSize": page_size,
+        }
+
+    @classmethod
+    async def unread_count(cls, user_id: str) -> int:
+        """未读数量（个人通知 + 读时合并通知）"""
+        reader = await cls._reader(user_id)
+        personal = await UserNotification.filter(
+            user_id=user_id,
+            is_read=False,
+            notification__is_del=False,
+            notification__status=NotificationStatus.PUBLISHED,
+            notification__delivery=NotificationDelivery.FANOUT_ON_WRITE,
+        ).count()
+        return personal + await SystemNotification.filter(cls._broadcast_filter(reader, is_read=False)).count()
+
+    @classmethod
+    async def total_count(cls, user_id: str) -> int:
+        """通知总数（个人通知 + 读时合并通知）"""
+        reader = await cls._reader(user_id)
+        personal = await UserNotification.filter(cls._personal_filter(user_id)).count()
+        return personal + await SystemNotification.filter(cls._broadcast_filter(reader)).count()
+
+    # ==================== 待推送 ====================
+
+    # 单次补发的读时合并通知上限
+    PENDING_LIMIT = 50
+
+    @staticmethod
+    def _delivered_key(user_id: str) -> str:
+        return f"{NotificationService.NOTIFICATION_KEY}:delivered:{user_id}"
+
+    @classmethod
+    async def pending(cls, redis: AsyncRedis, user_id: str) -> List[dict]:
+        """
+        获取并清除待推送通知（个人通知 + 未补发过的读时合并通知），消息格式与 WebSocket 推送一致
+        """
+        notifications = await NotificationService(redis).get_pending_notifications(user_id)
+
+        delivered_key = cls._delivered_key(user_id)
+        query = cls._broadcast_filter(await cls._reader(user_id), is_read=False)
+        query &= Q(publish_time__gt=datetime.now() - NotificationService.PENDING_TTL)
+        delivered = await redis.get(delivered_key)
+        if delivered:
+            query &= Q(publish_time__gt=datetime.fromisoformat(delivered))
+        rows = await SystemNotification.filter(query).order_by("publish_time").limit(cls.PENDING_LIMIT).values(
+            *cls._BROADCAST_VALUES.values()
+        )
+        if not rows:
+            return notifications
+
+        for row in rows:
+            message = NotificationService.build_message(
+                str(row["id"]), row["title"], row["content"], row["type"], row["priority"],
+                row["creator__nickname"] or "系统",
+            )
+            message["data"]["created_at"] = row["publish_time"].isoformat()
+            notifications.append(message)
+        await redis.set(delivered_key, rows[-1]["publish_time"].isoformat(), ex=NotificationService.PENDING_TTL)
+        return notifications
+
+    # ==================== 标记已读 ====================
+
+    @classmethod
+    async def mark_read(cls, user_id: str, id: str) -> Optional[bool]:
+        """
+        标记单条通知已读
+
+        :param id: 个人通知记录ID，或读时合并通知的通知ID
+        :return: True 个人通知由未读变为已读；False 已是已读或为读时合并通知；None 通知不存在
+        """
+        user_notification = await UserNotification.get_or_none(id=id, user_id=user_id)
+        if user_notification is not None:
+            if user_notification.is_read:
+                return False
+            user_notification.is_read = True
+            user_notification.read_time = datetime.now()
+            await user_notification.save(update_fields=["is_read", "read_time", "updated_at"])
+            return True
+
+        reader = await cls._reader(user_id)
+        if not await SystemNotification.filter(cls._broadcast_filter(reader) & Q(id=id)).exists():
+            return None
+        await UserNotification.get_or_create(
+            notification_id=id,
+            user_id=user_id,
+            defaults={"is_read": True, "read_time": datetime.now()},
+        )
+        return False
+
+    @classmethod
+    async def mark_all_read(cls, user_id: str) -> int:
+        """
+        全部标记已读：更新个人通知记录，推进读时合并通知的水位线并清理水位线之前的稀疏已读记录
+
+        :return: 由未读变为已读的通知数
+        """
+        now = datetime.now()
+        reader = await cls._reader(user_id)
+        broadcast_unread = await SystemNotification.filter(cls._broadcast_filter(reader, is_read=False)).count()
+        personal = await UserNotification.filter(
+            user_id=user_id,
+            is_read=False,
+            notification_id__in=Subquery(
+                SystemNotification.filter(delivery=NotificationDelivery.FANOUT_ON_WRITE).values("id")
+            ),
+        ).update(is_read=True, read_time=now)
+
+        await UserNotificationWatermark.update_or_create(user_id=user_id, defaults={"read_at": now})
+        await UserNotification.filter(
+            user_id=user_id,
+            notification_id__in=Subquery(
+                SystemNotification.filter(
+                    delivery=NotificationDelivery.FANOUT_ON_READ, publish_time__lte=now
+                ).values("id")
+            ),
+        ).delete()
+        return personal + broadcast_unread
+
+    # ==================== 统计 ====================
+
+    @classmethod
+    async def audience_query(cls, notification: SystemNotification):
+        """读时合并通知的受众用户查询（当前启用的用户，且在发布前已注册）"""
+        query = SystemUser.filter(is_del=False, status=1)
+        if notification.publish_time is not None:
+            query = query.filter(Q(created_at__isnull=True) | Q(created_at__lte=notification.publish_time))
+        if notification.scope == NotificationScope.DEPARTMENT:
+            department_ids = set()
+            for department_id in notification.scope_ids or []:
+                department_ids.update(await DepartmentHelper.get_child_department_ids(department_id))
+            query = query.filter(department_id__in=list(department_ids))
+        return query
+
+    @classmethod
+    async def audience_user_ids(cls, notification: SystemNotification, user_ids: List[str]) -> List[str]:
+        """从给定用户中筛选读时合并通知的受众（用于推送给在线用户）"""
+        if not user_ids:
+            return []
+        query = await cls.audience_query(notification)
+        return [str(user_id) for user_id in await query.filter(id__in=user_ids).values_list("id", flat=True)]
+
+    @classmethod
+    async def statistics(cls, notification: SystemNotification) -> Dict[str, int]:
+        """
+        已读统计
+
+        :return: {"total", "read", "unread"}
+        """
+        if notification.delivery != NotificationDelivery.FANOUT_ON_READ:
+            total = await UserNotification.filter(notification_id=notification.id).count()
+            read = await UserNotification.filter(notification_id=notification.id, is_read=True).count()
+        else:
+            audience = await cls.audience_query(notification)
+            total = await audience.count()
+            read_rows = Subquery(UserNotification.filter(notification_id=notification.id).values("user_id"))
+            read_filter = Q(id__in=read_rows)
+            if notification.publish_time is not None:
+                read_filter |= Q(notification_watermark__read_at__gte=notification.publish_time)
+            read = await audience.filter(read_filter).count()
+        return {"total": total, "read": read, "unread": total - read}
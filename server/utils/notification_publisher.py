@@ -0,0 +1,302 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : notification_publisher.py
+# @Comment : 通知发布 - 批量创建用户通知记录，大范围通知在后台任务中发布并上报进度
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+from tortoise.transactions import in_transaction
+
+from models import NotificationTarget, SystemNotification, SystemUser, UserNotification
+from models.notification import NotificationDelivery, NotificationScope, NotificationStatus
+from utils.config import config
+from utils.get_redis import RedisKeyConfig
+from utils.log import logger
+from utils.notification import NotificationService, ws_manager
+from utils.notification_feed import NotificationFeed
+
+# 发布任务状态
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# 进度回调：(已处理用户数) -> None
+ProgressCallback = Callable[[int], Awaitable[None]]
+
+
+class NotificationPublisher:
+    """
+    通知发布
+
+    - 一次查询取出已存在的 (通知, 用户) 关联，其余按 notification_bulk_chunk_size 分批 bulk_create
+    - 目标用户数低于 notification_async_publish_threshold 时同步发布：创建关联与修改状态在同一事务中
+    - 超过阈值时在后台任务中发布：每批一个事务，进度写入 Redis 哈希 notification_publish:{通知ID}，
+      全部关联创建完成后才将通知改为已发布并推送，失败时通知仍为草稿，重新发布会跳过已创建的关联
+    - 同一通知同时只允许一个发布任务（Redis 锁，按批续期，进程退出后自动过期）
+    - 启用 notification_fanout_on_read 时，全局与部门范围的通知改为读时合并：只保存通知本身与目标部门，
+      发布开销与受众规模无关（见 NotificationFeed）
+    """
+
+    # 任务进度保留时间（秒）
+    PROGRESS_TTL = 24 * 3600
+    # 任务锁有效期（秒），每批续期
+    LOCK_TTL = 300
+
+    _jobs: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _progress_key(notification_id: str) -> str:
+        return f"{RedisKeyConfig.NOTIFICATION_PUBLISH.key}:{notification_id}"
+
+    @staticmethod
+    def _lock_key(notification_id: str) -> str:
+        return f"{RedisKeyConfig.NOTIFICATION_PUBLISH.key}:{notification_id}:lock"
+
+    # ==================== 批量创建 ====================
+
+    @classmethod
+    async def materialize(
+            cls,
+            notification_id: str,
+            user_ids: List[str],
+            on_progress: Optional[ProgressCallback] = None,
+    ) -> int:
+        """
+        批量创建用户通知关联（已存在的跳过）
+
+        :param notification_id: 通知ID
+        :param user_ids: 目标用户ID
+        :param on_progress: 每批完成后回调已处理的用户数
+        :return: 新创建的关联数
+        """
+        existing: Set[str] = {
+            str(user_id) for user_id in
+            await UserNotification.filter(notification_id=notification_id).values_list("user_id", flat=True)
+        }
+        pending = list(dict.fromkeys(str(user_id) for user_id in user_ids if str(user_id) not in existing))
+        processed = len(user_ids) - len(pending)
+        if on_progress is not None and processed:
+            await on_progress(processed)
+
+        chunk_size = max(1, config.app().notification_bulk_chunk_size)
+        for i in range(0, len(pending), chunk_size):
+            chunk = pending[i:i + chunk_size]
+            async with in_transaction():
+                # 并发发布时可能已被其他请求创建，忽略唯一约束冲突
+                await UserNotification.bulk_create(
+                    [UserNotification(notification_id=notification_id, user_id=user_id) for user_id in chunk],
+                    ignore_conflicts=True,
+                )
+            processed += len(chunk)
+            if on_progress is not None:
+                await on_progress(processed)
+        return len(pending)
+
+    # ==================== 发布 ====================
+
+    @classmethod
+    def should_run_async(cls, total: int) -> bool:
+        """目标用户数是否达到后台发布阈值"""
+        threshold = config.app().notification_async_publish_threshold
+        return 0 < threshold <= total
+
+    @classmethod
+    def fanout_on_read(cls, notification: SystemNotification) -> bool:
+        """该通知是否按读时合并发布"""
+        return config.app().notification_fanout_on_read and notification.scope in (
+            NotificationScope.ALL, NotificationScope.DEPARTMENT
+        )
+
+    @classmethod
+    async def publish_fanout_on_read(cls, redis: AsyncRedis, notification: SystemNotification) -> dict:
+        """
+        读时合并发布：保存目标部门并改为已发布，只推送给在线的受众
+
+        :return: {"total_users", "online_count", "offline_count"}
+        """
+        async with in_transaction():
+            if notification.scope == NotificationScope.DEPARTMENT:
+                await NotificationTarget.bulk_create(
+                    [
+                        NotificationTarget(notification_id=notification.id, department_id=str(department_id))
+                        for department_id in dict.fromkeys(notification.scope_ids or [])
+                    ],
+                    ignore_conflicts=True,
+                )
+            notification.delivery = NotificationDelivery.FANOUT_ON_READ
+            notification.status = NotificationStatus.PUBLISHED
+            notification.publish_time = datetime.now()
+            await notification.save(update_fields=["delivery", "status", "publish_time", "updated_at"])
+
+        online_user_ids = await NotificationFeed.audience_user_ids(notification, await ws_manager.get_online_users())
+        creator = await SystemUser.get_or_none(id=notification.creator_id) if notification.creator_id else None
+        await NotificationService(redis).push_broadcast(
+            notification_id=str(notification.id),
+            title=notification.title,
+            content=notification.content,
+            notification_type=notification.type,
+            priority=notification.priority,
+            user_ids=online_user_ids,
+            creator_name=creator.nickname if creator else "系统",
+        )
+        total = await (await NotificationFeed.audience_query(notification)).count()
+        return {
+            "total_users": total,
+            "online_count": len(online_user_ids),
+            "offline_count": max(0, total - len(online_user_ids)),
+        }
+
+    @classmethod
+    async def publish(
+            cls,
+            redis: AsyncRedis,
+            notification: SystemNotification,
+            target_user_ids: List[str],
+    ) -> dict:
+        """
+        同步发布：在一个事务中创建关联并改为已发布，随后推送
+
+        :return: {"total_users", "online_count", "offline_count"}
+        """
+        async with in_transaction():
+            await cls.materialize(str(notification.id), target_user_ids)
+            notification.status = NotificationStatus.PUBLISHED
+            notification.publish_time = datetime.now()
+            await notification.save(update_fields=["status", "publish_time", "updated_at"])
+        result = await cls._push(redis, notification, target_user_ids)
+        return {"total_users": len(target_user_ids), **result}
+
+    @classmethod
+    async def start_job(
+            cls,
+            redis: AsyncRedis,
+            notification: SystemNotification,
+            target_user_ids: List[str],
+    ) -> Optional[dict]:
+        """
+        在后台任务中发布
+
+        :return: 初始进度；该通知已有进行中的发布任务时返回 None
+        """
+        notification_id = str(notification.id)
+        if not await redis.set(cls._lock_key(notification_id), "1", nx=True, ex=cls.LOCK_TTL):
+            return None
+        progress = {
+            "status": JOB_RUNNING,
+            "total": len(target_user_ids),
+            "processed": 0,
+            "created": 0,
+            "online_count": 0,
+            "offline_count": 0,
+            "error": "",
+            "started_at": datetime.now().isoformat(),
+            "finished_at": "",
+        }
+        await cls._save_progress(redis, notification_id, progress)
+        task = asyncio.create_task(
+            cls._run_job(redis, notification, target_user_ids), name=f"notification-publish-{notification_id}"
+        )
+        cls._jobs[notification_id] = task
+        task.add_done_callback(lambda _: cls._jobs.pop(notification_id, None))
+        return progress
+
+    @classmethod
+    async def _run_job(cls, redis: AsyncRedis, notification: SystemNotification, target_user_ids: List[str]):
+        notification_id = str(notification.id)
+        progress_key = cls._progress_key(notification_id)
+        started = time.monotonic()
+
+        async def on_progress(processed: int):
+            await redis.hset(progress_key, "processed", processed)
+            await redis.expire(cls._lock_key(notification_id), cls.LOCK_TTL)
+
+        try:
+            created = await cls.materialize(notification_id, target_user_ids, on_progress)
+            notification.status = NotificationStatus.PUBLISHED
+            notification.publish_time = datetime.now()
+            await notification.save(update_fields=["status", "publish_time", "updated_at"])
+            result = await cls._push(redis, notification, target_user_ids)
+            await cls._save_progress(redis, notification_id, {
+                "status": JOB_DONE, "created": created, **result, "finished_at": datetime.now().isoformat(),
+            })
+            logger.info(
+                f"通知 {notification_id} 后台发布完成：{len(target_user_ids)} 个用户，"
+                f"新建 {created} 条关联，耗时 {time.monotonic() - started:.1f} 秒"
+            )
+        except asyncio.CancelledError:
+            await cls._fail(redis, notification_id, "服务关闭，发布中断")
+            raise
+        except Exception as e:
+            logger.error(f"通知 {notification_id} 后台发布失败: {e}")
+            await cls._fail(redis, notification_id, str(e))
+        finally:
+            try:
+                await redis.delete(cls._lock_key(notification_id))
+            except RedisError:
+                pass
+
+    @classmethod
+    async def _fail(cls, redis: AsyncRedis, notification_id: str, error: str):
+        try:
+            await cls._save_progress(redis, notification_id, {
+                "status": JOB_FAILED, "error": error, "finished_at": datetime.now().isoformat(),
+            })
+        except RedisError:
+            pass
+
+    @classmethod
+    async def _push(cls, redis: AsyncRedis, notification: SystemNotification, target_user_ids: List[str]) -> dict:
+        """推送通知并累加未读计数"""
+        creator = await SystemUser.get_or_none(id=notification.creator_id) if notification.creator_id else None
+        return await NotificationService(redis).push_notification(
+            notification_id=str(notification.id),
+            title=notification.title,
+            content=notification.content,
+            notification_type=notification.type,
+            priority=notification.priority,
+            target_user_ids=target_user_ids,
+            creator_name=creator.nickname if creator else "系统",
+        )
+
+    # ==================== 进度 ====================
+
+    @classmethod
+    async def _save_progress(cls, redis: AsyncRedis, notification_id: str, fields: dict):
+        key = cls._progress_key(notification_id)
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, cls.PROGRESS_TTL)
+            await pipe.execute()
+
+    @classmethod
+    async def get_progress(cls, redis: AsyncRedis, notification_id: str) -> Optional[dict]:
+        """
+        查询发布进度
+
+        :return: {"status", "total", "processed", "created", "online_count", "offline_count",
+                  "error", "started_at", "finished_at"}，无发布任务时返回 None
+        """
+        progress = await redis.hgetall(cls._progress_key(notification_id))
+        if not progress:
+            return None
+        for field in ("total", "processed", "created", "online_count", "offline_count"):
+            progress[field] = int(progress.get(field) or 0)
+        return progress
+
+    @classmethod
+    async def shutdown(cls):
+        """取消本进程进行中的发布任务（通知保持草稿状态，可重新发布）"""
+        tasks = list(cls._jobs.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
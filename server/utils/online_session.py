@@ -0,0 +1,143 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : online_session.py
+# @Comment : 在线会话索引 - 以过期时间为分数的有序集合 + 每个用户的会话集合
+
+import time
+from typing import Dict, Iterable, List, Optional
+
+from redis.asyncio import Redis as AsyncRedis
+
+from utils.get_redis import RedisKeyConfig
+from utils.log import logger
+
+
+class OnlineSessionRegistry:
+    """
+    在线会话索引
+
+    - online_session:index：有序集合，成员为 session_id，分数为过期时间戳（秒）
+    - online_session:user:{user_id}：集合，记录该用户的 session_id
+    - 登录、刷新令牌时登记，登出、强退时移除；过期成员在读取时惰性清理
+    - 会话令牌 access_token:{session_id} 与索引在同一个管道中写入/删除
+    """
+
+    @staticmethod
+    def index_key() -> str:
+        return f"{RedisKeyConfig.ONLINE_SESSION.key}:index"
+
+    @staticmethod
+    def user_key(user_id) -> str:
+        return f"{RedisKeyConfig.ONLINE_SESSION.key}:user:{user_id}"
+
+    @staticmethod
+    def token_key(session_id: str) -> str:
+        return f"{RedisKeyConfig.ACCESS_TOKEN.key}:{session_id}"
+
+    @classmethod
+    async def register(
+            cls,
+            redis: AsyncRedis,
+            session_id: str,
+            user_id,
+            access_token: str,
+            expires_in: int,
+    ):
+        """
+        保存会话令牌并登记在线会话
+
+        :param session_id: 会话ID
+        :param user_id: 用户ID
+        :param access_token: 访问令牌
+        :param expires_in: 有效期（秒）
+        """
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.set(cls.token_key(session_id), access_token, ex=expires_in)
+            pipe.zadd(cls.index_key(), {session_id: time.time() + expires_in})
+            pipe.sadd(cls.user_key(user_id), session_id)
+            await pipe.execute()
+
+    @classmethod
+    async def revoke(cls, redis: AsyncRedis, session_id: str, user_id=None) -> bool:
+        """
+        删除会话令牌并移出在线索引
+
+        :return: 会话令牌是否存在
+        """
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(cls.token_key(session_id))
+            pipe.zrem(cls.index_key(), session_id)
+            if user_id is not None:
+                pipe.srem(cls.user_key(user_id), session_id)
+            results = await pipe.execute()
+        return bool(results[0])
+
+    @classmethod
+    async def online_flags(cls, redis: AsyncRedis, session_ids: Iterable[Optional[str]]) -> Dict[str, bool]:
+        """
+        批量判断会话是否在线（清理过期成员 + ZMSCORE，一次往返）
+
+        :param session_ids: 当前页记录的 session_id，可包含空值
+        :return: session_id -> 是否在线
+        """
+        ids = list({sid for sid in session_ids if sid})
+        if not ids:
+            return {}
+        now = time.time()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(cls.index_key(), "-inf", now)
+            pipe.zmscore(cls.index_key(), ids)
+            _, scores = await pipe.execute()
+        return {sid: score is not None and score > now for sid, score in zip(ids, scores)}
+
+    @classmethod
+    async def user_sessions(cls, redis: AsyncRedis, user_id) -> List[str]:
+        """获取用户当前在线的会话，顺带清理已过期的成员"""
+        user_key = cls.user_key(user_id)
+        members = list(await redis.smembers(user_key))
+        if not members:
+            return []
+        flags = await cls.online_flags(redis, members)
+        expired = [sid for sid in members if not flags.get(sid)]
+        if expired:
+            await redis.srem(user_key, *expired)
+        return [sid for sid in members if flags.get(sid)]
+
+    @classmethod
+    async def ensure_index(cls, redis: AsyncRedis):
+        """
+        索引不存在时（首次升级）按现有会话令牌重建
+
+        仅在启动时执行一次 SCAN，令牌中的用户ID通过 JWT 解析，有效期取键的剩余 TTL。
+        """
+        if await redis.exists(cls.index_key()):
+            return
+        from jose import jwt
+        from jose.exceptions import JOSEError
+
+        from utils.config import config
+
+        jwt_config = config.jwt()
+        prefix = f"{RedisKeyConfig.ACCESS_TOKEN.key}:"
+        count = 0
+        async for key in redis.scan_iter(match=f"{prefix}*", count=500):
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.ttl(key)
+                token, ttl = await pipe.execute()
+            if not token or ttl is None or ttl <= 0:
+                continue
+            try:
+                payload = jwt.decode(token, jwt_config.secret_key, algorithms=[jwt_config.algorithm])
+            except JOSEError:
+                continue
+            session_id = key[len(prefix):]
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.zadd(cls.index_key(), {session_id: time.time() + ttl})
+                if payload.get("id"):
+                    pipe.sadd(cls.user_key(payload["id"]), session_id)
+                await pipe.execute()
+            count += 1
+        if count:
+            logger.info(f"已重建在线会话索引，共 {count} 个会话")
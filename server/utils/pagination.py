@@ -0,0 +1,322 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : pagination.py
+# @Comment : 列表分页工具 - 键集（游标）分页 + 可选的近似总数
+
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+from uuid import UUID
+
+from redis.asyncio import Redis as AsyncRedis
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+from exceptions.exception import ServiceWarning
+from utils.config import config
+from utils.get_redis import RedisKeyConfig
+from utils.log import logger
+
+# 总数统计方式
+COUNT_EXACT = "exact"
+COUNT_AUTO = "auto"
+COUNT_ESTIMATE = "estimate"
+COUNT_NONE = "none"
+
+# 默认排序：创建时间倒序，主键作为唯一的次序键
+DEFAULT_ORDER = ("-created_at", "-id")
+
+
+class Pagination:
+    """
+    列表分页工具
+
+    - 兼容 page/pageSize：无游标时按偏移量取第 page 页
+    - 每页返回 nextCursor，携带游标请求下一页时按排序键做键集查询（WHERE (k1, k2) < (v1, v2)），
+      不再扫描并丢弃前面的所有行；排序键存在空值时游标退化为偏移量
+    - 总数可选：exact 每次 COUNT；auto 小表精确 COUNT，大表按过滤条件缓存 COUNT 结果；
+      estimate 使用数据库执行计划的行数估算；none 不统计
+    """
+
+    @classmethod
+    async def paginate(
+            cls,
+            queryset: QuerySet,
+            *,
+            page: int = 1,
+            page_size: int = 10,
+            cursor: Optional[str] = None,
+            order_by: Sequence[str] = DEFAULT_ORDER,
+            values: Union[Dict[str, str], Sequence[str], None] = None,
+            redis: Optional[AsyncRedis] = None,
+            count_mode: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        分页查询
+
+        :param queryset: 已应用过滤条件的查询集
+        :param page: 页码（无游标时生效）
+        :param page_size: 每页数量
+        :param cursor: 上一页返回的 nextCursor
+        :param order_by: 排序键，最后一个键必须唯一（通常为 id）
+        :param values: 返回字段，字典为 {别名: 字段}，列表为字段名
+        :param redis: 用于缓存总数，不传时 auto 退化为 exact
+        :param count_mode: 总数统计方式，默认取配置 list_count_mode
+        :return: {"result", "total", "page", "pageSize", "nextCursor", "hasMore", "totalExact"}
+        """
+        page = max(1, page)
+        page_size = max(1, page_size)
+        order_by = tuple(order_by)
+        count_mode = count_mode or config.app().list_count_mode
+
+        fields = values if isinstance(values, dict) else {name: name for name in (values or ())}
+        # 附加排序键字段用于生成游标，返回前移除
+        cursor_aliases = [f"_cursor_{i}" for i in range(len(order_by))]
+        query_fields = {**fields, **{alias: key.lstrip("-") for alias, key in zip(cursor_aliases, order_by)}}
+
+        offset = (page - 1) * page_size
+        query = queryset.order_by(*order_by)
+        if cursor:
+            state = cls.decode_cursor(cursor, order_by)
+            page, offset = state["p"], state["o"]
+            if state.get("k") is not None:
+                query = query.filter(cls._keyset_filter(order_by, state["k"]))
+            else:
+                query = query.offset(offset)
+        elif offset:
+            query = query.offset(offset)
+
+        rows = await query.limit(page_size + 1).values(**query_fields)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = cls.encode_cursor(
+                order_by,
+                [last[alias] for alias in cursor_aliases],
+                page=page + 1,
+                offset=offset + len(rows),
+            )
+        for row in rows:
+            for alias in cursor_aliases:
+                if alias not in fields:
+                    row.pop(alias, None)
+
+        total, exact = await cls.count(
+            queryset, count_mode, redis, lower_bound=offset + len(rows) + (1 if has_more else 0)
+        )
+        return {
+            "result": rows,
+            "total": total,
+            "page": page,
+            "pageSize": page_size,
+            "nextCursor": next_cursor,
+            "hasMore": has_more,
+            "totalExact": exact,
+        }
+
+    @classmethod
+    async def iterate(
+            cls,
+            queryset: QuerySet,
+            *,
+            order_by: Sequence[str] = DEFAULT_ORDER,
+            values: Union[Dict[str, str], Sequence[str], None] = None,
+            batch_size: int = 1000,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        按排序键分批遍历全部结果（导出等全量读取场景），内存占用只与批大小相关
+
+        先对排序键均非空的行按键集分批遍历；排序键（除最后一个）为空的行无法参与键集比较，
+        在键集遍历结束后按偏移量单独输出，位于结果末尾（与数据库对空值的排序规则无关）
+
+        :param queryset: 已应用过滤条件的查询集
+        :param order_by: 排序键，最后一个键必须唯一且非空（通常为 id）
+        :param values: 返回字段，字典为 {别名: 字段}，列表为字段名
+        :param batch_size: 每批行数
+        :return: 异步迭代器，每次产出一批行
+        """
+        order_by = tuple(order_by)
+        fields = values if isinstance(values, dict) else {name: name for name in (values or ())}
+        cursor_aliases = [f"_cursor_{i}" for i in range(len(order_by))]
+        query_fields = {**fields, **{alias: key.lstrip("-") for alias, key in zip(cursor_aliases, order_by)}}
+        nullable = [key.lstrip("-") for key in order_by[:-1]]
+
+        def strip_cursor(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            for row in rows:
+                for alias in cursor_aliases:
+                    if alias not in fields:
+                        row.pop(alias, None)
+            return rows
+
+        # 键集遍历排序键均非空的行
+        keyset_query = queryset.filter(**{f"{field}__isnull": False for field in nullable})
+        key_values: Optional[List[Any]] = None
+        while True:
+            query = keyset_query.order_by(*order_by)
+            if key_values is not None:
+                query = query.filter(cls._keyset_filter(order_by, key_values))
+            rows = await query.limit(batch_size).values(**query_fields)
+            if not rows:
+                break
+            key_values = [rows[-1][alias] for alias in cursor_aliases]
+            yield strip_cursor(rows)
+            if len(rows) < batch_size:
+                break
+
+        if not nullable:
+            return
+        # 排序键存在空值的行按偏移量遍历
+        null_query = queryset.filter(
+            Q(*[Q(**{f"{field}__isnull": True}) for field in nullable], join_type=Q.OR)
+        ).order_by(*order_by)
+        offset = 0
+        while True:
+            rows = await null_query.offset(offset).limit(batch_size).values(**query_fields)
+            if not rows:
+                return
+            offset += len(rows)
+            yield strip_cursor(rows)
+            if len(rows) < batch_size:
+                return
+
+    # ==================== 游标 ====================
+
+    @classmethod
+    def encode_cursor(cls, order_by: Sequence[str], key_values: List[Any], page: int, offset: int) -> str:
+        """生成不透明游标：排序键取值 + 页码 + 偏移量（排序键有空值时仅用偏移量）"""
+        keys = None if any(v is None for v in key_values) else [cls._dump_value(v) for v in key_values]
+        state = {"s": cls._order_signature(order_by), "k": keys, "p": page, "o": offset}
+        raw = json.dumps(state, separators=(",", ":"), ensure_ascii=False).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode_cursor(cls, cursor: str, order_by: Sequence[str]) -> dict:
+        """解析游标，无效或与当前排序方式不匹配时抛出 ServiceWarning"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            state = json.loads(raw)
+            signature = state["s"]
+            if state.get("k") is not None:
+                state["k"] = [cls._load_value(v) for v in state["k"]]
+            state["p"], state["o"] = max(1, int(state["p"])), max(0, int(state["o"]))
+        except Exception:
+            raise ServiceWarning(message="无效的分页游标，请从第一页重新查询")
+        if signature != cls._order_signature(order_by):
+            raise ServiceWarning(message="分页游标与当前排序方式不匹配，请从第一页重新查询")
+        return state
+
+    @staticmethod
+    def _order_signature(order_by: Sequence[str]) -> str:
+        return ",".join(order_by)
+
+    @staticmethod
+    def _dump_value(value: Any) -> Any:
+        if isinstance(value, datetime):
+            return {"dt": value.isoformat()}
+        if isinstance(value, date):
+            return {"d": value.isoformat()}
+        if isinstance(value, UUID):
+            return str(value)
+        return value
+
+    @staticmethod
+    def _load_value(value: Any) -> Any:
+        if isinstance(value, dict):
+            if "dt" in value:
+                return datetime.fromisoformat(value["dt"])
+            if "d" in value:
+                return date.fromisoformat(value["d"])
+        return value
+
+    @staticmethod
+    def _keyset_filter(order_by: Sequence[str], key_values: List[Any]) -> Q:
+        """
+        构造键集条件，支持混合升降序：
+        k1 >= v1 AND ((k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...)
+        首个排序键的冗余范围条件让数据库可以走索引范围扫描，而不是逐行判断 OR 条件
+        """
+        branches = []
+        for i, key in enumerate(order_by):
+            field = key.lstrip("-")
+            op = "lt" if key.startswith("-") else "gt"
+            conditions = {order_by[j].lstrip("-"): key_values[j] for j in range(i)}
+            conditions[f"{field}__{op}"] = key_values[i]
+            branches.append(Q(**conditions))
+        keyset = Q(*branches, join_type=Q.OR)
+        if len(order_by) == 1:
+            return keyset
+        first = order_by[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": key_values[0]})
+        return Q(bound, keyset)
+
+    # ==================== 总数 ====================
+
+    @classmethod
+    async def count(
+            cls,
+            queryset: QuerySet,
+            count_mode: str,
+            redis: Optional[AsyncRedis] = None,
+            lower_bound: int = 0,
+    ) -> Tuple[int, bool]:
+        """
+        统计总数
+
+        :return: (总数, 是否精确)
+        """
+        if count_mode == COUNT_NONE:
+            return lower_bound, False
+        if count_mode == COUNT_ESTIMATE:
+            estimate = await cls._estimate_count(queryset)
+            if estimate is not None:
+                return max(estimate, lower_bound), False
+            count_mode = COUNT_AUTO
+        if count_mode != COUNT_AUTO or redis is None:
+            return await queryset.count(), True
+
+        # auto：按过滤条件缓存大表的总数
+        count_query = queryset.count()
+        digest = hashlib.sha1(count_query.sql(params_inline=True).encode()).hexdigest()
+        cache_key = f"{RedisKeyConfig.LIST_COUNT.key}:{digest}"
+        cached = await redis.get(cache_key)
+        if cached is not None:
+            return max(int(cached), lower_bound), False
+        total = await count_query
+        app_config = config.app()
+        if total >= app_config.list_exact_count_threshold:
+            await redis.set(cache_key, total, ex=app_config.list_count_cache_seconds)
+        return total, True
+
+    @staticmethod
+    async def _estimate_count(queryset: QuerySet) -> Optional[int]:
+        """读取执行计划中的行数估算（MySQL / PostgreSQL），不支持时返回 None"""
+        count_query = queryset.count()
+        try:
+            sql = count_query.sql(params_inline=True)
+            conn = count_query._db
+            dialect = conn.capabilities.dialect
+            if dialect == "postgres":
+                _, rows = await conn.execute_query(f"EXPLAIN (FORMAT JSON) {sql}")
+                plan = rows[0]["QUERY PLAN"]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                # 聚合节点之下的扫描节点给出过滤后的行数估算
+                node = plan[0]["Plan"]
+                while node.get("Plans"):
+                    node = node["Plans"][0]
+                return int(node.get("Plan Rows", 0))
+            if dialect == "mysql":
+                _, rows = await conn.execute_query(f"EXPLAIN {sql}")
+                if not rows:
+                    return None
+                filtered = float(rows[0].get("filtered") or 100)
+                return int(int(rows[0].get("rows") or 0) * filtered / 100)
+        except Exception as e:
+            logger.warning(f"读取行数估算失败，改用精确统计: {e}")
+        return None
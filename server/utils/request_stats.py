@@ -0,0 +1,96 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : request_stats.py
+# @Comment : 请求级调用统计 - 通过 ContextVar 记录单次请求内的 Redis 命令数与数据库查询数
+
+import logging
+from contextvars import ContextVar
+from typing import Optional
+
+from redis.asyncio import Redis as AsyncRedis
+from redis.asyncio.client import Pipeline
+
+
+class RequestStats:
+    """单次请求内的外部调用计数"""
+
+    __slots__ = ("redis_calls", "db_queries")
+
+    def __init__(self):
+        self.redis_calls = 0
+        self.db_queries = 0
+
+    def to_dict(self) -> dict:
+        return {"redis_calls": self.redis_calls, "db_queries": self.db_queries}
+
+
+# 当前请求的统计对象；中间件在进入请求时设置，子任务复制上下文后仍指向同一对象
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def begin_request_stats() -> RequestStats:
+    """为当前请求开启统计"""
+    stats = RequestStats()
+    _current_stats.set(stats)
+    return stats
+
+
+def get_request_stats() -> Optional[RequestStats]:
+    """获取当前请求的统计对象，不在请求上下文中时返回 None"""
+    return _current_stats.get()
+
+
+class InstrumentedPipeline(Pipeline):
+    """计数的 Redis 管道：无论包含多少命令，一次 execute 计为一次往返"""
+
+    async def execute(self, raise_on_error: bool = True):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.redis_calls += 1
+        return await super().execute(raise_on_error)
+
+
+class InstrumentedRedis(AsyncRedis):
+    """计数的 Redis 客户端，每条命令计一次（订阅连接不计入）"""
+
+    async def execute_command(self, *args, **options):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.redis_calls += 1
+        return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+class _DBQueryCounter(logging.Handler):
+    """挂载在 tortoise.db_client 日志器上，每条 SQL 调试日志计一次查询"""
+
+    def emit(self, record: logging.LogRecord):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+
+
+def install_db_query_counter(echo: bool = False):
+    """
+    启用数据库查询计数
+
+    Tortoise 在 DEBUG 级别为每条 SQL 输出一条日志，这里把日志器调到 DEBUG 并挂载计数处理器；
+    未开启 SQL 日志时禁止向上传播，避免把 SQL 打到根日志器。
+
+    :param echo: 是否同时保留 SQL 日志输出
+    """
+    db_client_logger = logging.getLogger("tortoise.db_client")
+    if any(isinstance(h, _DBQueryCounter) for h in db_client_logger.handlers):
+        return
+    db_client_logger.addHandler(_DBQueryCounter(level=logging.DEBUG))
+    db_client_logger.setLevel(logging.DEBUG)
+    if not echo:
+        db_client_logger.propagate = False
+        for handler in db_client_logger.handlers:
+            if not isinstance(handler, _DBQueryCounter):
+                handler.setLevel(logging.WARNING)
@@ -7,6 +7,7 @@
 # @Comment : 本程序
 from datetime import datetime
 from typing import Any, Dict, Optional
+from urllib.parse import quote
 
 from fastapi import status
 from fastapi.encoders import jsonable_encoder
@@ -293,11 +294,21 @@ class ResponseUtil:
         return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(result))
 
     @classmethod
-    def streaming(cls, data: Any) -> StreamingResponse:
+    def streaming(
+            cls,
+            data: Any,
+            media_type: Optional[str] = None,
+            filename: Optional[str] = None,
+    ) -> StreamingResponse:
         """
         流式响应方法。
 
         :param data: 流式传输的内容
+        :param media_type: 内容类型
+        :param filename: 下载文件名，传入时以附件形式下载
         :return: StreamingResponse 对象
         """
-        return StreamingResponse(content=data, status_code=status.HTTP_200_OK)
+        headers = None
+        if filename:
+            headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+        return StreamingResponse(content=data, status_code=status.HTTP_200_OK, media_type=media_type, headers=headers)
@@ -0,0 +1,141 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : route_index.py
+# @Comment : API 路由权限索引 - 将角色的 API 策略预编译为按方法分桶的前缀树，请求时单次查找
+
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+# 任意方法通配符
+ANY_METHOD = "*"
+
+
+class _TrieNode:
+    """前缀树节点"""
+
+    __slots__ = ("children", "prefix_match", "patterns")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # 以当前节点为前缀的路径全部命中（策略形如 /api/user/*）
+        self.prefix_match: bool = False
+        # 以当前节点为字面前缀、剩余部分仍含通配符的正则（策略形如 /api/*/info/*）
+        self.patterns: List[Pattern] = []
+
+
+class _MethodBucket:
+    """单个 HTTP 方法下的路由集合"""
+
+    __slots__ = ("exact", "root")
+
+    def __init__(self):
+        self.exact: set = set()
+        self.root = _TrieNode()
+
+    def add(self, path: str):
+        """添加一条路径策略"""
+        star = path.find("*")
+        if star < 0:
+            self.exact.add(path)
+            return
+
+        literal, rest = path[:star], path[star:]
+        node = self.root
+        for ch in literal:
+            node = node.children.setdefault(ch, _TrieNode())
+
+        if rest == "*":
+            node.prefix_match = True
+        else:
+            # 剩余部分转换为正则，仅对字面前缀之后的内容做匹配
+            pattern = ".*".join(re.escape(part) for part in rest.split("*"))
+            node.patterns.append(re.compile(f"{pattern}$"))
+
+    def match(self, path: str) -> bool:
+        """判断路径是否命中"""
+        if path in self.exact:
+            return True
+
+        node = self.root
+        index = 0
+        length = len(path)
+        while True:
+            if node.prefix_match:
+                return True
+            for pattern in node.patterns:
+                if pattern.match(path, index):
+                    return True
+            if index >= length:
+                return False
+            node = node.children.get(path[index])
+            if node is None:
+                return False
+            index += 1
+
+
+class ApiRouteIndex:
+    """
+    API 路由权限索引
+
+    由一组 (path, methods) 策略一次性构建：
+    - 无通配符的路径放入按方法分桶的哈希集合，O(1) 命中
+    - 含通配符的路径按首个 * 之前的字面前缀插入前缀树，查找代价与请求路径长度成正比，与策略数量无关
+    - 方法为 * 的策略放入独立分桶，对所有方法生效
+
+    匹配语义与原中间件逐条比对一致：精确匹配，或 * 匹配任意字符（含 /）。
+    """
+
+    __slots__ = ("_buckets", "size")
+
+    def __init__(self, policies: Iterable[Tuple[str, Iterable[str]]] = ()):
+        self._buckets: Dict[str, _MethodBucket] = {}
+        self.size = 0
+        for path, methods in policies:
+            self.add(path, methods)
+
+    @staticmethod
+    def parse_methods(act: str) -> List[str]:
+        """将策略中的方法字段（GET / GET,POST / *）拆分为方法列表"""
+        return [m.strip().upper() for m in act.split(",") if m.strip()]
+
+    def add(self, path: str, methods: Iterable[str]):
+        """添加一条 API 策略"""
+        if not path:
+            return
+        for method in methods:
+            bucket = self._buckets.get(method)
+            if bucket is None:
+                bucket = self._buckets[method] = _MethodBucket()
+            bucket.add(path)
+        self.size += 1
+
+    def match(self, path: str, method: str) -> bool:
+        """判断请求是否被索引中的任意策略放行"""
+        bucket = self._buckets.get(method.upper())
+        if bucket is not None and bucket.match(path):
+            return True
+        any_bucket = self._buckets.get(ANY_METHOD)
+        return any_bucket is not None and any_bucket.match(path)
+
+    @classmethod
+    def from_casbin_policies(
+            cls,
+            policies: Iterable[List[str]],
+            roles: Optional[Iterable[str]] = None
+    ) -> "ApiRouteIndex":
+        """
+        从 Casbin p 策略构建索引
+
+        :param policies: enforcer.get_policy() 返回的策略列表 [sub, obj, act, ...]
+        :param roles: 仅收录这些角色的策略，None 表示全部
+        """
+        role_set = set(roles) if roles is not None else None
+        index = cls()
+        for p in policies:
+            if len(p) < 3 or p[2] in ("menu", "button"):
+                continue
+            if role_set is not None and p[0] not in role_set:
+                continue
+            index.add(p[1], cls.parse_methods(p[2]))
+        return index
@@ -0,0 +1,160 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : single_flight.py
+# @Comment : 单飞（single-flight）工具 - 同一个键的并发缓存重建只执行一次，其余调用方等待并共享结果
+
+import asyncio
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from redis.asyncio import Redis as AsyncRedis
+
+from utils.get_redis import RedisKeyConfig
+from utils.log import logger
+
+# 仅当锁仍属于自己时才释放，避免误删其他进程在锁过期后重新获取的锁
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    单飞工具
+
+    - 进程内：以键维护执行中的任务，同一时刻同一个键只有一个任务在执行，
+      其余调用方 await 同一任务并共享结果或异常
+    - 跨进程（可选）：传入 redis 时，领头任务先获取 Redis 锁再执行重建；未拿到锁的进程
+      轮询 fetch 读取其他进程写回的缓存，锁释放或等待超时后再自行重建
+    - 重建任务与发起请求解耦，发起方被取消不会中断重建，其他等待方仍能拿到结果
+    """
+
+    _calls: Dict[Hashable, asyncio.Task] = {}
+    # 统计：实际执行次数、共享结果次数、跨进程等待后直接读到缓存的次数
+    executions = 0
+    shared = 0
+    lock_waits = 0
+
+    @classmethod
+    async def do(
+            cls,
+            key: Hashable,
+            func: Callable[[], Awaitable[Any]],
+            *,
+            redis: Optional[AsyncRedis] = None,
+            fetch: Optional[Callable[[], Awaitable[Any]]] = None,
+            lock_ttl: float = 10.0,
+            wait_timeout: float = 5.0,
+            poll_interval: float = 0.05,
+    ) -> Any:
+        """
+        执行 func，同一个键的并发调用只执行一次
+
+        :param key: 单飞键，通常为缓存键
+        :param func: 重建函数（无参协程函数），负责计算并写回缓存
+        :param redis: 传入时启用跨进程锁
+        :param fetch: 读取缓存的协程函数，未命中返回 None；跨进程模式下用于拿锁后复查与等待期间轮询
+        :param lock_ttl: Redis 锁过期时间（秒），应大于一次重建的耗时
+        :param wait_timeout: 未拿到锁时的最长等待时间（秒），超时后自行重建
+        :param poll_interval: 等待期间的轮询间隔（秒）
+        :return: func 或 fetch 的结果
+        """
+        task = cls._calls.get(key)
+        if task is not None:
+            cls.shared += 1
+            return await asyncio.shield(task)
+
+        if redis is not None:
+            coro = cls._run_with_lock(key, func, redis, fetch, lock_ttl, wait_timeout, poll_interval)
+        else:
+            coro = cls._run(func)
+        task = asyncio.ensure_future(coro)
+        cls._calls[key] = task
+        task.add_done_callback(lambda t: cls._finish(key, t))
+        return await asyncio.shield(task)
+
+    @classmethod
+    def _finish(cls, key: Hashable, task: asyncio.Task):
+        if cls._calls.get(key) is task:
+            del cls._calls[key]
+        # 所有等待方都已取消时，标记异常已读取，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    @classmethod
+    async def _run(cls, func: Callable[[], Awaitable[Any]]) -> Any:
+        cls.executions += 1
+        return await func()
+
+    @classmethod
+    async def _run_with_lock(
+            cls,
+            key: Hashable,
+            func: Callable[[], Awaitable[Any]],
+            redis: AsyncRedis,
+            fetch: Optional[Callable[[], Awaitable[Any]]],
+            lock_ttl: float,
+            wait_timeout: float,
+            poll_interval: float,
+    ) -> Any:
+        lock_key = f"{RedisKeyConfig.SINGLE_FLIGHT_LOCK.key}:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + wait_timeout
+        while True:
+            try:
+                acquired = await redis.set(lock_key, token, nx=True, px=int(lock_ttl * 1000))
+            except Exception as e:
+                # Redis 不可用时退化为仅进程内单飞
+                logger.warning(f"单飞锁获取失败，退化为进程内单飞: {e}")
+                return await cls._run(func)
+
+            if acquired:
+                try:
+                    # 拿锁前其他进程可能刚完成重建
+                    if fetch is not None:
+                        value = await fetch()
+                        if value is not None:
+                            return value
+                    return await cls._run(func)
+                finally:
+                    await cls._release(redis, lock_key, token)
+
+            if fetch is None:
+                # 无法读取其他进程的结果，只能自行重建
+                return await cls._run(func)
+
+            # 其他进程正在重建，等待其写回缓存
+            while time.monotonic() < deadline:
+                await asyncio.sleep(poll_interval)
+                value = await fetch()
+                if value is not None:
+                    cls.lock_waits += 1
+                    return value
+                if not await redis.exists(lock_key):
+                    # 锁已释放但缓存未写回（重建失败），重新竞争锁
+                    break
+            else:
+                logger.warning(f"等待单飞锁超时，自行重建: {key}")
+                return await cls._run(func)
+
+    @staticmethod
+    async def _release(redis: AsyncRedis, lock_key: str, token: str):
+        try:
+            await redis.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            logger.warning(f"单飞锁释放失败（将在过期后自动释放）: {e}")
+
+    @classmethod
+    def stats(cls) -> dict:
+        """本进程的单飞统计"""
+        return {
+            "in_flight": len(cls._calls),
+            "executions": cls.executions,
+            "shared": cls.shared,
+            "lock_waits": cls.lock_waits,
+        }
@@ -0,0 +1,45 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : sql_functions.py
+# @Comment : 跨数据库的 SQL 函数（MySQL / PostgreSQL / SQLite）
+
+from datetime import date, datetime
+from typing import Any
+
+from pypika_tortoise.context import SqlContext
+from pypika_tortoise.enums import Dialects
+from pypika_tortoise.terms import Function as PypikaFunction
+from tortoise.functions import Function
+
+
+class _TruncDate(PypikaFunction):
+    """按数据库方言生成日期截断 SQL"""
+
+    def __init__(self, term, alias=None):
+        super().__init__("DATE", term, alias=alias)
+
+    def get_function_sql(self, ctx: SqlContext) -> str:
+        arg = self.get_arg_sql(self.args[0], ctx)
+        if ctx.dialect == Dialects.POSTGRESQL:
+            return f"CAST({arg} AS DATE)"
+        # MySQL、SQLite 均支持 DATE()，SQLite 返回 YYYY-MM-DD 字符串
+        return f"DATE({arg})"
+
+
+class TruncDate(Function):
+    """
+    截断到日期，用于按天 GROUP BY
+
+    示例：SystemLoginLog.annotate(day=TruncDate("created_at")).group_by("day").values("day", ...)
+    时间按存储值截断（数据库连接未启用 use_tz，存储的即为本地时间）。
+    """
+
+    database_func = _TruncDate
+
+
+def date_key(value: Any) -> str:
+    """将 TruncDate 的查询结果统一转为 YYYY-MM-DD 字符串（各数据库返回类型不同）"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10]
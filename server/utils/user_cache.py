@@ -0,0 +1,88 @@
+# _*_ coding : UTF-8 _*_
+# @Time : 2026/10/17
+# @Author : sonder
+# @File : user_cache.py
+# @Comment : 用户信息多级缓存 - 进程内 LRU/TTL + Redis，按缓存代数跨进程失效
+
+from typing import List, Optional
+
+from redis.asyncio import Redis as AsyncRedis
+
+from utils.get_redis import CacheGeneration, RedisKeyConfig
+from utils.local_cache import LocalTTLCache
+
+
+class UserInfoCache:
+    """
+    用户信息进程内缓存
+
+    - Redis 中的用户信息键带有代数：user_info:{全局代数}.{用户代数}:{用户ID}（见 CacheGeneration）
+    - 请求鉴权时与会话令牌一次 MGET 读回两个代数；进程内条目的代数一致即直接使用，
+      无需再读取和反序列化 Redis 中的用户信息
+    - 任一进程调用 invalidate / invalidate_all 修改代数后，所有进程的本地条目在下一次请求时即失效
+    - 本地条目另有较短的 TTL，作为兜底
+    """
+
+    _local = LocalTTLCache(maxsize=4096, ttl=60.0)
+    # 本地未命中后的来源统计
+    redis_hits = 0
+    rebuilds = 0
+
+    @classmethod
+    def generation_keys(cls, user_id: str) -> List[str]:
+        """读取用户信息代数所需的键：[全局代数键, 用户代数键]"""
+        return CacheGeneration.generation_keys(
+            RedisKeyConfig.USER_INFO, CacheGeneration.user_scope(user_id)
+        )
+
+    @staticmethod
+    def redis_key(user_id: str, generation: str) -> str:
+        """Redis 中的用户信息键"""
+        return CacheGeneration.cache_key(RedisKeyConfig.USER_INFO, user_id, generation)
+
+    @classmethod
+    async def resolve_redis_key(cls, redis: AsyncRedis, user_id: str) -> str:
+        """读取当前代数并返回 Redis 中的用户信息键"""
+        return await CacheGeneration.resolve_key(
+            redis, RedisKeyConfig.USER_INFO, user_id, CacheGeneration.user_scope(user_id)
+        )
+
+    @classmethod
+    def get_local(cls, user_id: str, generation: str) -> Optional[dict]:
+        """读取本地条目，代数不一致视为未命中"""
+        user_info = cls._local.get(str(user_id), version=generation)
+        # 浅拷贝，避免调用方修改顶层字段污染缓存
+        return dict(user_info) if user_info is not None else None
+
+    @classmethod
+    def set_local(cls, user_id: str, generation: str, user_info: dict):
+        """写入本地条目"""
+        cls._local.set(str(user_id), user_info, version=generation)
+
+    @classmethod
+    def forget_local(cls, user_id: str):
+        """仅丢弃本进程内的条目"""
+        cls._local.pop(str(user_id))
+
+    @classmethod
+    async def invalidate(cls, redis: AsyncRedis, user_id: str):
+        """使单个用户的信息与路由缓存失效（所有进程）"""
+        await CacheGeneration.invalidate_scope(redis, CacheGeneration.user_scope(user_id))
+        cls._local.pop(str(user_id))
+
+    @classmethod
+    async def invalidate_all(cls, redis: AsyncRedis):
+        """使全部用户的信息与路由缓存失效（所有进程）"""
+        await CacheGeneration.invalidate_namespaces(
+            redis, RedisKeyConfig.USER_INFO, RedisKeyConfig.USER_ROUTES
+        )
+        cls._local.clear()
+
+    @classmethod
+    def stats(cls) -> dict:
+        """本进程的缓存命中统计"""
+        return {
+            **cls._local.stats(),
+            "redis_hits": cls.redis_hits,
+            "rebuilds": cls.rebuilds,
+        }
@@ -66,12 +66,14 @@ export interface LoginTrend {
 }
 
 /**
- * 获取登录趋势数据（近7天）
+ * 获取登录趋势数据（默认近7天）
+ * @param days 统计天数，可选 7/30/90
  * @returns 登录趋势数据
  */
-export const fetchLoginTrend = () => {
+export const fetchLoginTrend = (days: 7 | 30 | 90 = 7) => {
   return request.get<LoginTrend>({
-    url: '/api/dashboard/login-trend'
+    url: '/api/dashboard/login-trend',
+    params: { days }
   })
 }
 
@@ -90,11 +92,13 @@ export interface OperationStatistics {
 }
 
 /**
- * 获取操作统计数据（近7天）
+ * 获取操作统计数据（默认近7天）
+ * @param days 统计天数，可选 7/30/90
  * @returns 操作统计数据
  */
-export const fetchOperationStatistics = () => {
+export const fetchOperationStatistics = (days: 7 | 30 | 90 = 7) => {
   return request.get<OperationStatistics>({
-    url: '/api/dashboard/operation-statistics'
+    url: '/api/dashboard/operation-statistics',
+    params: { days }
   })
 }
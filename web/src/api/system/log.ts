@@ -70,8 +70,6 @@ export interface OperationLogInfo {
   department_name: string
   request_method: string
   request_path: string
-  request_params: string
-  response_result: string
   host: string
   location: string
   browser: string
@@ -83,6 +81,15 @@ export interface OperationLogInfo {
   updated_at: string
 }
 
+// 操作日志载荷（请求参数与返回结果，按需加载）
+export interface OperationLogPayload {
+  id: string
+  request_params: string
+  response_result: string
+  request_truncated: boolean
+  response_truncated: boolean
+}
+
 // 操作日志列表响应
 export interface OperationLogListResponse {
   total: number
@@ -103,6 +110,22 @@ export const fetchLoginLogList = (params: LoginLogSearchParams) =>
     params
   })
 
+// 日志导出格式
+export type LogExportFormat = 'csv' | 'xlsx'
+
+/**
+ * 导出登录日志（按搜索条件导出全部记录）
+ * @param params 搜索参数
+ * @param format 导出格式
+ * @returns 文件下载响应
+ */
+export const fetchExportLoginLog = (params: LoginLogSearchParams, format: LogExportFormat = 'csv') =>
+  request.get<Blob>({
+    url: '/api/log/login/export',
+    params: { ...params, page: undefined, pageSize: undefined, format },
+    responseType: 'blob'
+  })
+
 /**
  * 强制注销用户
  * @param sessionId 会话ID
@@ -160,6 +183,32 @@ export const fetchOperationLogList = (params: OperationLogSearchParams) =>
     params
   })
 
+/**
+ * 导出操作日志（按搜索条件导出全部记录，不含请求与响应载荷）
+ * @param params 搜索参数
+ * @param format 导出格式
+ * @returns 文件下载响应
+ */
+export const fetchExportOperationLog = (
+  params: OperationLogSearchParams,
+  format: LogExportFormat = 'csv'
+) =>
+  request.get<Blob>({
+    url: '/api/log/operation/export',
+    params: { ...params, page: undefined, pageSize: undefined, format },
+    responseType: 'blob'
+  })
+
+/**
+ * 获取操作日志载荷
+ * @param id 日志ID
+ * @returns 请求参数与返回结果
+ */
+export const fetchOperationLogPayload = (id: string) =>
+  request.get<OperationLogPayload>({
+    url: `/api/log/operation/payload/${id}`
+  })
+
 /**
  * 删除操作日志
  * @param id 日志ID
@@ -223,3 +272,13 @@ export const fetchPersonalOperationLogList = (params: PersonalOperationLogSearch
     url: '/api/log/personal/operation',
     params
   })
+
+/**
+ * 获取个人操作日志载荷
+ * @param id 日志ID
+ * @returns 请求参数与返回结果
+ */
+export const fetchPersonalOperationLogPayload = (id: string) =>
+  request.get<OperationLogPayload>({
+    url: `/api/log/personal/operation/payload/${id}`
+  })
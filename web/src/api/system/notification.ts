@@ -136,17 +136,40 @@ export const updateNotification = (id: string, data: UpdateNotificationParams) =
   })
 }
 
-/** 发布通知 */
+/** 通知发布进度 */
+export interface NotificationPublishProgress {
+  status: 'running' | 'done' | 'failed'
+  total: number
+  processed: number
+  created: number
+  online_count: number
+  offline_count: number
+  error: string
+  started_at: string
+  finished_at: string
+}
+
+/** 发布通知（目标用户较多时在后台发布，async 为 true） */
 export const publishNotification = (id: string) => {
   return request.post<{
     total_users: number
     online_count: number
     offline_count: number
+    async: boolean
+    progress?: NotificationPublishProgress
   }>({
     url: `/api/notification/publish/${id}`
   })
 }
 
+/** 获取通知发布进度 */
+export const fetchPublishProgress = (id: string) => {
+  return request.get<NotificationPublishProgress>({
+    url: `/api/notification/publish/progress/${id}`,
+    showErrorMessage: false
+  })
+}
+
 /** 撤回通知 */
 export const revokeNotification = (id: string) => {
   return request.post<null>({